@@ -5,12 +5,65 @@ from __future__ import (absolute_import, division,
                         print_function, unicode_literals)
 from builtins import *
 
+import importlib
 import os
 __author__ = 'Chia-Jung, Yang'
 __email__ = 'jeroyang@gmail.com'
 __version__ = '1.0.2'
 
-from ncgocr.concept import *
-from ncgocr.corpus_craft import *
-from ncgocr.pattern_regex import *
-from ncgocr.ncgocr import *
+# The public names are imported from their modules on first use, so that
+# "import ncgocr" does not load scikit-learn, scipy, lxml or acora before
+# a feature needs them. The module __getattr__ needs Python 3.7 (PEP 562)
+_LAZY_NAMES = {
+    'ncgocr.concept': ['Cluster', 'ClusterBook', 'Concept', 'Constraint', 'Entity',
+                       'Evidence', 'GoData', 'Index', 'Pattern', 'Statement', 'Term',
+                       'Trunk', 'evidence_split', 'has_common', 'jaccard', 'sim',
+                       'split_pattern', 'split_trunk'],
+    'ncgocr.pattern_regex': ['regex_in', 'regex_out'],
+    'ncgocr.corpus_craft': ['BASE_URL', 'CRAFT1_URL', 'CRAFT2_URL', 'Craft', 'TarSource',
+                            'files_key', 'parse_knowtator', 'read_goldstandard',
+                            'wanted_members'],
+    'ncgocr.corpus_source': ['DirectorySource'],
+    'ncgocr.ncgocr': ['BUNDLE_FORMAT', 'BUNDLE_VERSION', 'CANDIDATE_BYTES', 'CLASSIFY_BYTES',
+                      'NCGOCR'],
+    'ncgocr.extractor': ['CandidateReconizer', 'JoinExtractor', 'SoftExtractor',
+                         'SolidExtractor'],
+    'ncgocr.learning': ['Cascade', 'LabelMarker', 'MeasurementCache', 'NegativeSampler',
+                        'bulk_measurements', 'evaluate', 'recover'],
+    'ncgocr.cache': ['CandidateCache', 'ResultCache', 'fingerprint'],
+    'ncgocr.instrument': ['Instrument'],
+    'ncgocr.forest': ['FlatForest'],
+    'ncgocr.backends': ['BACKENDS', 'Backend', 'get_backend'],
+    'txttk.corpus': ['Annotation', 'Corpus', 'Sentence'],
+    'txttk.nlptools': ['count_start', 'sent_tokenize'],
+    'acora': ['AcoraBuilder'],
+    'sklearn.feature_extraction': ['FeatureHasher'],
+    'sklearn.ensemble': ['RandomForestClassifier'],
+    'progressbar': ['ProgressBar'],
+    # exported by the star imports of the modules before, they stay public
+    'collections': ['OrderedDict', 'defaultdict', 'namedtuple'],
+    'functools': ['partial'],
+    'copy': ['copy'],
+}
+_LAZY_MODULES = ['backends', 'cache', 'cli', 'concept', 'corpus_craft', 'corpus_source', 'extractor',
+                 'forest', 'gopattern', 'instrument', 'learning', 'ncgocr', 'pattern_regex',
+                 'server', 'shared', 'sweep', 'benchmark']
+
+_name2module = {name: module for module, names in _LAZY_NAMES.items() for name in names}
+
+__all__ = sorted(_name2module)
+
+
+def __getattr__(name):
+    if name in _name2module:
+        value = getattr(importlib.import_module(_name2module[name]), name)
+    elif name in _LAZY_MODULES:
+        value = importlib.import_module('ncgocr.' + name)
+    else:
+        raise AttributeError('module {!r} has no attribute {!r}'.format(__name__, name))
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__) | set(_LAZY_MODULES))
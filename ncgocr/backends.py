@@ -0,0 +1,124 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+The backends make the vectorizer and the classifier of NCGOCR
+"""
+
+from __future__ import (absolute_import, division,
+                        print_function, unicode_literals)
+from builtins import *
+
+import abc
+
+from collections import OrderedDict
+
+from sklearn.feature_extraction import FeatureHasher
+
+
+class Backend(abc.ABC):
+    """
+    Make the vectorizer and the classifier of NCGOCR, the params are
+    passed to the classifier. With dense=True the classifier is given
+    dense feature rows, otherwise the sparse hashed rows.
+    """
+    name = None
+    dense = True
+
+    def __init__(self, **params):
+        self.params = params
+
+    def vectorizer(self, n_features):
+        return FeatureHasher(n_features=n_features)
+
+    @abc.abstractmethod
+    def classifier(self, n):
+        """
+        Return the unfitted classifier, n is the number of trees of the
+        forest backends
+        """
+
+    def _params(self, defaults):
+        params = dict(defaults)
+        params.update(self.params)
+        return params
+
+    def __repr__(self):
+        params = ', '.join('{}={!r}'.format(k, v) for k, v in sorted(self.params.items()))
+        return '{}({})'.format(self.__class__.__name__, params)
+
+
+class RandomForestBackend(Backend):
+    """
+    The random forest of n trees, the default of NCGOCR
+    """
+    name = 'random_forest'
+
+    def classifier(self, n):
+        from sklearn.ensemble import RandomForestClassifier
+        return RandomForestClassifier(**self._params({'n_estimators': n, 'n_jobs': -1}))
+
+
+class LogisticBackend(Backend):
+    """
+    The logistic regression on the sparse rows
+    """
+    name = 'logistic'
+    dense = False
+
+    def classifier(self, n):
+        from sklearn.linear_model import LogisticRegression
+        return LogisticRegression(**self._params({'solver': 'liblinear'}))
+
+
+class SGDBackend(Backend):
+    """
+    The linear model trained by stochastic gradient descent on the sparse
+    rows
+    """
+    name = 'sgd'
+    dense = False
+
+    def classifier(self, n):
+        from sklearn.linear_model import SGDClassifier
+        return SGDClassifier(**self._params({'alpha': 1e-5, 'random_state': 0}))
+
+
+class HistGradientBoostingBackend(Backend):
+    """
+    The histogram gradient boosting, which needs scikit-learn 0.23 or later
+    for the sample weights
+    """
+    name = 'hist_gradient_boosting'
+
+    def classifier(self, n):
+        try:
+            from sklearn.ensemble import HistGradientBoostingClassifier
+        except ImportError:
+            # before scikit-learn 1.0 the estimator is experimental
+            try:
+                from sklearn.experimental import enable_hist_gradient_boosting
+                from sklearn.ensemble import HistGradientBoostingClassifier
+            except ImportError:
+                raise ImportError(
+                    'The hist_gradient_boosting backend needs scikit-learn >= 0.23')
+        return HistGradientBoostingClassifier(**self._params({'random_state': 0}))
+
+
+BACKENDS = OrderedDict((backend.name, backend) for backend in [
+    RandomForestBackend, LogisticBackend, SGDBackend, HistGradientBoostingBackend])
+
+
+def get_backend(backend=None):
+    """
+    Return the backend of the given name or instance, the random forest
+    by default
+    """
+    if backend is None:
+        return RandomForestBackend()
+    if isinstance(backend, Backend):
+        return backend
+    try:
+        return BACKENDS[backend]()
+    except KeyError:
+        template = 'Unknown backend {!r}, choose from {}'
+        raise ValueError(template.format(backend, ', '.join(BACKENDS)))
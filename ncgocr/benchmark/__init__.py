@@ -0,0 +1,19 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Benchmarks of NCGOCR on synthetic ontologies and corpora, run them with
+
+    python -m ncgocr.benchmark --scales tiny small -o results.json
+    python -m ncgocr.benchmark.inference --scale small --batch-sizes 1 16 128
+    python -m ncgocr.benchmark.backends --scale small --backends random_forest sgd
+"""
+
+from __future__ import (absolute_import, division,
+                        print_function, unicode_literals)
+from builtins import *
+
+from ncgocr.benchmark.synthetic import (pattern_phrases, generate_terms,
+                                        write_obo, generate_corpus)
+from ncgocr.benchmark.suite import SCALES, synthetic_data, run_scale, run, compare
+from ncgocr.benchmark.inference import run_inference
+from ncgocr.benchmark.backends import run_backends
@@ -0,0 +1,114 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Compare the classifier backends of NCGOCR on the same cached features:
+the train time, the prediction throughput, the model size and the F1
+"""
+
+from __future__ import (absolute_import, division,
+                        print_function, unicode_literals)
+from builtins import *
+
+import argparse
+import json
+import pickle
+
+from collections import OrderedDict
+
+from ncgocr.ncgocr import NCGOCR
+from ncgocr.backends import BACKENDS, get_backend
+from ncgocr.instrument import clock
+from ncgocr.learning import LabelMarker, evaluate, recover
+from ncgocr.benchmark.suite import SCALES, synthetic_data
+
+
+def run_backends(scale='small', backends=tuple(BACKENDS), n=10, n_features=1024,
+                 threshold=0.5, seed=0):
+    """
+    Featurize the candidates of the synthetic training and testing corpora
+    of the scale once, then fit and predict with each backend.
+
+    Return the OrderedDict of the parameters and, for each backend, the
+    seconds of fitting, the candidates predicted per second, the bytes of
+    the pickled classifier and the F1 on the testing corpus
+    """
+    godata, seconds, training, testing = synthetic_data(*SCALES[scale], seed=seed)
+    godata.compression(threshold)
+    model = NCGOCR(godata, n=n, n_features=n_features)
+    model.build(training[1])
+
+    def candidates(corpus):
+        return model.candidate_recognizer.process(model.extractor.process(corpus))
+
+    training_candidates = candidates(training[0])
+    testing_candidates = candidates(testing[0])
+    training_X = model.sparse_featurize(training_candidates)
+    testing_X = model.sparse_featurize(testing_candidates)
+    training_y = LabelMarker(training[1]).process(training_candidates)
+
+    rows = []
+    for backend in backends:
+        backend = get_backend(backend)
+        classifier = backend.classifier(n)
+        X, Y = training_X, testing_X
+        if backend.dense:
+            X, Y = X.toarray(), Y.toarray()
+        start = clock()
+        classifier.fit(X, training_y)
+        fit_seconds = clock() - start
+        start = clock()
+        system_y = classifier.predict(Y)
+        predict_seconds = clock() - start
+        report = evaluate(recover(testing_candidates, system_y), testing[1], 'synthetic')
+        rows.append(OrderedDict([('backend', backend.name),
+                                 ('fit_seconds', fit_seconds),
+                                 ('per_second', len(testing_candidates) / predict_seconds),
+                                 ('bytes', len(pickle.dumps(classifier, protocol=2))),
+                                 ('f1', report.f1())]))
+
+    params = OrderedDict([('scale', scale),
+                          ('training_candidates', len(training_candidates)),
+                          ('testing_candidates', len(testing_candidates)),
+                          ('n', n), ('n_features', n_features), ('seed', seed)])
+    return OrderedDict([('params', params), ('results', rows)])
+
+
+def format_backends(result):
+    params = result['params']
+    lines = ['{} ({} training and {} testing candidates)'.format(
+                 params['scale'], params['training_candidates'], params['testing_candidates']),
+             '  {:<24}{:>10}{:>14}{:>12}{:>8}'.format('backend', 'fit (s)', 'per second',
+                                                      'bytes', 'F1')]
+    for row in result['results']:
+        lines.append('  {:<24}{:>10.3f}{:>14.0f}{:>12}{:>8.3f}'.format(
+            row['backend'], row['fit_seconds'], row['per_second'], row['bytes'], row['f1']))
+    return '\n'.join(lines)
+
+
+def get_parser():
+    parser = argparse.ArgumentParser(description='Compare the classifier backends of NCGOCR')
+    parser.add_argument('-s', '--scale', choices=list(SCALES), default='small')
+    parser.add_argument('--backends', nargs='+', choices=list(BACKENDS),
+                        default=list(BACKENDS))
+    parser.add_argument('-n', type=int, default=10,
+                        help='the number of trees of the random forest (default: 10)')
+    parser.add_argument('--n-features', type=int, default=1024)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('-o', '--output', default=None, help='write the results as JSON')
+    return parser
+
+
+def main(argv=None):
+    args = get_parser().parse_args(argv)
+    result = run_backends(args.scale, args.backends, n=args.n, n_features=args.n_features,
+                          seed=args.seed)
+    if args.output is not None:
+        with open(args.output, 'w') as f:
+            json.dump(result, f, indent=2)
+    print(format_backends(result))
+    return 0
+
+
+if __name__ == '__main__':
+    import sys
+    sys.exit(main())
@@ -0,0 +1,121 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Compare the latency and the throughput of the classification by the
+RandomForestClassifier and by the FlatForest engine, across batch sizes,
+both through NCGOCR.classify with the classifier as NCGOCR builds it
+"""
+
+from __future__ import (absolute_import, division,
+                        print_function, unicode_literals)
+from builtins import *
+
+import argparse
+import json
+import os
+
+from collections import OrderedDict
+
+import numpy as np
+
+from ncgocr.ncgocr import NCGOCR
+from ncgocr.instrument import clock
+from ncgocr.benchmark.suite import SCALES, synthetic_data
+
+BATCH_SIZES = (1, 16, 128, 1024)
+
+
+def time_batches(predict, X, batch_size, repeat=3):
+    """
+    Predict X batch by batch, return the predictions and the best seconds
+    over repeat runs
+    """
+    best = None
+    for run in range(repeat):
+        start = clock()
+        y = np.concatenate([predict(X[i:i + batch_size])
+                            for i in range(0, X.shape[0], batch_size)])
+        seconds = clock() - start
+        best = seconds if best is None else min(best, seconds)
+    return y, best
+
+
+def run_inference(scale='small', batch_sizes=BATCH_SIZES, n=10, threshold=0.5, seed=0,
+                  repeat=3):
+    """
+    Train a model on the synthetic data of the scale, then classify the
+    features of the testing candidates by NCGOCR.classify, with the forest
+    on the dense rows, as NCGOCR does without flat_forest, and with the
+    FlatForest on the sparse rows. The forest predicts with the n_jobs
+    NCGOCR gives it, which is run on the cpus of this machine.
+
+    Return the OrderedDict of the parameters and, for each batch size and
+    engine, the milliseconds per batch and the candidates per second
+    """
+    godata, seconds, training, testing = synthetic_data(*SCALES[scale], seed=seed)
+    godata.compression(threshold)
+    model = NCGOCR(godata, n=n)
+    model.train(*training)
+    candidates = model.candidate_recognizer.process(model.extractor.process(testing[0]))
+    X = model.sparse_featurize(candidates)
+
+    rows = []
+    for batch_size in batch_sizes:
+        predictions = []
+        for name, flat_forest in [('sklearn', False), ('flat', True)]:
+            model.flat_forest = flat_forest
+            y, seconds = time_batches(model.classify, X, batch_size, repeat)
+            predictions.append(y)
+            batches = -(-X.shape[0] // batch_size)
+            rows.append(OrderedDict([('batch_size', batch_size),
+                                     ('engine', name),
+                                     ('ms_per_batch', 1000 * seconds / batches),
+                                     ('per_second', X.shape[0] / seconds)]))
+        if not all(np.array_equal(predictions[0], y) for y in predictions[1:]):
+            raise AssertionError('The engines disagree at batch size {}'.format(batch_size))
+
+    params = OrderedDict([('scale', scale), ('candidates', X.shape[0]),
+                          ('n', n), ('nodes', model.engine().node_count),
+                          ('n_jobs', model.classifier.n_jobs), ('cpus', os.cpu_count()),
+                          ('seed', seed)])
+    return OrderedDict([('params', params), ('results', rows)])
+
+
+def format_inference(result):
+    params = result['params']
+    lines = ['{} ({} candidates, {} trees, {} nodes, n_jobs={} on {} cpus)'.format(
+                 params['scale'], params['candidates'], params['n'], params['nodes'],
+                 params['n_jobs'], params['cpus']),
+             '  {:>10}  {:<8}{:>14}{:>14}'.format('batch', 'engine', 'ms/batch', 'per second')]
+    for row in result['results']:
+        lines.append('  {:>10}  {:<8}{:>14.3f}{:>14.0f}'.format(
+            row['batch_size'], row['engine'], row['ms_per_batch'], row['per_second']))
+    return '\n'.join(lines)
+
+
+def get_parser():
+    parser = argparse.ArgumentParser(
+        description='Compare the forest engines of NCGOCR across batch sizes')
+    parser.add_argument('-s', '--scale', choices=list(SCALES), default='small')
+    parser.add_argument('--batch-sizes', nargs='+', type=int, default=list(BATCH_SIZES))
+    parser.add_argument('-n', type=int, default=10, help='the number of trees (default: 10)')
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('-o', '--output', default=None, help='write the results as JSON')
+    return parser
+
+
+def main(argv=None):
+    args = get_parser().parse_args(argv)
+    result = run_inference(args.scale, args.batch_sizes, n=args.n, seed=args.seed,
+                           repeat=args.repeat)
+    if args.output is not None:
+        with open(args.output, 'w') as f:
+            json.dump(result, f, indent=2)
+    print(format_inference(result))
+    return 0
+
+
+if __name__ == '__main__':
+    import sys
+    sys.exit(main())
@@ -0,0 +1,227 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Time the stages of NCGOCR on synthetic data of several scales, and
+compare the timings with a stored baseline
+"""
+
+from __future__ import (absolute_import, division,
+                        print_function, unicode_literals)
+from builtins import *
+
+import argparse
+import json
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+
+from collections import OrderedDict
+
+from ncgocr.concept import GoData
+from ncgocr.ncgocr import NCGOCR
+from ncgocr.instrument import Instrument, clock
+from ncgocr.learning import evaluate, NegativeSampler
+from ncgocr.benchmark.synthetic import generate_terms, write_obo, generate_corpus
+
+# name: (terms, depth, training docs, testing docs, sentences per doc)
+SCALES = OrderedDict([
+    ('tiny', (100, 4, 10, 10, 10)),
+    ('small', (1000, 6, 50, 50, 20)),
+    ('medium', (5000, 8, 200, 200, 20)),
+])
+
+
+def synthetic_data(n_terms, depth, n_train, n_test, sentences_per_doc, seed=0,
+                   workdir=None, annotated_rate=1.0):
+    """
+    Return the GoData of a synthetic ontology, the seconds spent to read
+    it, and the training and the testing (corpus, goldstandard), in which
+    the mentions of the annotated_rate share of the terms are annotated
+    """
+    terms = generate_terms(n_terms, depth, seed=seed)
+    training = generate_corpus(terms, n_train, sentences_per_doc,
+                               seed=seed + 1, title='training', annotated_rate=annotated_rate)
+    testing = generate_corpus(terms, n_test, sentences_per_doc,
+                              seed=seed + 2, title='testing', annotated_rate=annotated_rate)
+
+    tempdir = workdir or tempfile.mkdtemp()
+    try:
+        obo_path = os.path.join(tempdir, 'synthetic.obo')
+        write_obo(obo_path, terms)
+        start = clock()
+        godata = GoData(obo_path)
+        seconds = clock() - start
+    finally:
+        if workdir is None:
+            shutil.rmtree(tempdir)
+    return godata, seconds, training, testing
+
+
+def run_scale(n_terms, depth, n_train, n_test, sentences_per_doc,
+              n=10, threshold=0.5, seed=0, workdir=None, longest_match=(),
+              negative_ratio=None, stratify='statement', hard_negatives=False,
+              annotated_rate=1.0):
+    """
+    Generate the synthetic ontology and corpora, then time the pipeline,
+    longest_match names the extractors in leftmost-longest mode, and with
+    negative_ratio the training negatives are sampled by a NegativeSampler.
+    Below 1, annotated_rate leaves the mentions of the other terms out of
+    the goldstandards, so that the negatives dominate.
+
+    Return the OrderedDict of the parameters, the timings in seconds, the
+    volumes, and the F1 on the testing corpus
+    """
+    godata, seconds, training, testing = synthetic_data(n_terms, depth, n_train, n_test,
+                                                        sentences_per_doc, seed, workdir,
+                                                        annotated_rate)
+    training_corpus, training_gold = training
+    testing_corpus, testing_gold = testing
+    timings = OrderedDict([('godata', seconds)])
+
+    start = clock()
+    godata.compression(threshold)
+    timings['compression'] = clock() - start
+
+    instrument = Instrument()
+    sampler = None
+    if negative_ratio is not None:
+        sampler = NegativeSampler(negative_ratio, stratify, hard_negatives, seed=seed)
+    model = NCGOCR(godata, n=n, instrument=instrument, longest_match=longest_match,
+                   sampler=sampler)
+    start = clock()
+    model.train(training_corpus, training_gold)
+    timings['train'] = clock() - start
+    for stage, seconds in instrument.timings.items():
+        timings['train.' + stage] = seconds
+    counts = OrderedDict(('train.' + key, value) for key, value in instrument.counts.items())
+
+    instrument.reset()
+    start = clock()
+    system = model.process(testing_corpus)
+    timings['process'] = clock() - start
+    for stage, seconds in instrument.timings.items():
+        timings['process.' + stage] = seconds
+    counts.update(('process.' + key, value) for key, value in instrument.counts.items())
+
+    params = OrderedDict([('terms', n_terms), ('depth', depth),
+                          ('training_docs', n_train), ('testing_docs', n_test),
+                          ('sentences_per_doc', sentences_per_doc),
+                          ('n', n), ('threshold', threshold), ('seed', seed)])
+    if longest_match:
+        params['longest_match'] = sorted(longest_match)
+    if annotated_rate != 1.0:
+        params['annotated_rate'] = annotated_rate
+    if sampler is not None:
+        params['negative_ratio'] = negative_ratio
+        params['stratify'] = stratify
+        params['hard_negatives'] = hard_negatives
+    report = evaluate(system, testing_gold, 'synthetic')
+    return OrderedDict([('params', params),
+                        ('timings', timings),
+                        ('counts', counts),
+                        ('f1', report.f1())])
+
+
+def run(scales=('tiny', 'small'), **kwargs):
+    """
+    Run the named scales, return the results with the environment
+    """
+    results = OrderedDict([('python', platform.python_version()),
+                           ('machine', platform.machine()),
+                           ('processor', platform.processor()),
+                           ('date', time.strftime('%Y-%m-%dT%H:%M:%S')),
+                           ('scales', OrderedDict())])
+    for name in scales:
+        results['scales'][name] = run_scale(*SCALES[name], **kwargs)
+    return results
+
+
+def compare(results, baseline, tolerance=1.25, min_seconds=0.05):
+    """
+    Return the (scale, stage, baseline seconds, seconds, ratio) of the
+    stages slower than tolerance times the baseline, the stages faster than
+    min_seconds in both are ignored as noise
+    """
+    regressions = []
+    for name, result in results['scales'].items():
+        base = baseline['scales'].get(name)
+        if base is None or base['params'] != result['params']:
+            continue
+        for stage, seconds in result['timings'].items():
+            before = base['timings'].get(stage)
+            if before is None or max(before, seconds) < min_seconds:
+                continue
+            ratio = seconds / before if before > 0 else float('inf')
+            if ratio > tolerance:
+                regressions.append((name, stage, before, seconds, ratio))
+    return regressions
+
+
+def format_results(results, baseline=None):
+    lines = []
+    for name, result in results['scales'].items():
+        base = (baseline or {}).get('scales', {}).get(name, {}).get('timings', {})
+        lines.append('{} ({} terms, F1 {:.3f})'.format(name, result['params']['terms'],
+                                                      result['f1']))
+        for stage, seconds in result['timings'].items():
+            line = '  {:<28}{:>10.3f}s'.format(stage, seconds)
+            if stage in base and base[stage] > 0:
+                line += '{:>8.2f}x'.format(seconds / base[stage])
+            lines.append(line)
+    return '\n'.join(lines)
+
+
+def get_parser():
+    parser = argparse.ArgumentParser(description='Benchmark NCGOCR on synthetic data')
+    parser.add_argument('-s', '--scales', nargs='+', choices=list(SCALES),
+                        default=['tiny', 'small'], help='the scales to run (default: tiny small)')
+    parser.add_argument('-o', '--output', default=None,
+                        help='write the results as JSON')
+    parser.add_argument('-b', '--baseline', default=None,
+                        help='the JSON results to compare with')
+    parser.add_argument('--tolerance', type=float, default=1.25,
+                        help='the slowdown ratio reported as a regression (default: 1.25)')
+    parser.add_argument('--min-seconds', type=float, default=0.05,
+                        help='ignore the stages faster than this (default: 0.05)')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--longest-match', nargs='+', default=[],
+                        choices=['basic', 'boost'],
+                        help='the extractors in leftmost-longest mode')
+    parser.add_argument('--negative-ratio', type=float, default=None,
+                        help='train on this share of the negative candidates')
+    parser.add_argument('--stratify', default='statement',
+                        choices=['statement', 'namespace', 'none'],
+                        help='the strata of the negative sampling (default: statement)')
+    parser.add_argument('--hard-negatives', action='store_true',
+                        help='refit with the negatives left out which the first model accepts')
+    parser.add_argument('--annotated-rate', type=float, default=1.0,
+                        help='annotate the mentions of this share of the terms (default: 1)')
+    return parser
+
+
+def main(argv=None):
+    args = get_parser().parse_args(argv)
+    stratify = None if args.stratify == 'none' else args.stratify
+    results = run(args.scales, seed=args.seed, longest_match=args.longest_match,
+                  negative_ratio=args.negative_ratio, stratify=stratify,
+                  hard_negatives=args.hard_negatives, annotated_rate=args.annotated_rate)
+    if args.output is not None:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+
+    baseline = None
+    if args.baseline is not None:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+    print(format_results(results, baseline))
+
+    if baseline is None:
+        return 0
+    regressions = compare(results, baseline, args.tolerance, args.min_seconds)
+    for name, stage, before, seconds, ratio in regressions:
+        template = 'REGRESSION {} {}: {:.3f}s -> {:.3f}s ({:.2f}x)'
+        print(template.format(name, stage, before, seconds, ratio), file=sys.stderr)
+    return 1 if regressions else 0
@@ -0,0 +1,166 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Generate synthetic GO ontologies and corpora for the benchmarks
+"""
+
+from __future__ import (absolute_import, division,
+                        print_function, unicode_literals)
+from builtins import *
+
+import io
+import random
+import re
+
+from collections import namedtuple
+
+from txttk.corpus import Corpus, Annotation
+
+from ncgocr import pattern_regex
+
+ROOTS = [('GO:0003674', 'molecular_function'),
+         ('GO:0005575', 'cellular_component'),
+         ('GO:0008150', 'biological_process')]
+
+SYLLABLES = ['ka', 'lo', 'mi', 'nu', 'pe', 'ra', 'si', 'to', 'vu', 'ze',
+             'bri', 'cho', 'dra', 'fle', 'gon', 'hex', 'ith', 'jor', 'kel', 'myo']
+
+FILLERS = ['the', 'results', 'show', 'that', 'cells', 'were', 'treated', 'with',
+           'samples', 'was', 'observed', 'under', 'conditions', 'we', 'measured',
+           'levels', 'in', 'mice', 'after', 'exposure', 'data', 'suggest']
+
+SyntheticTerm = namedtuple('SyntheticTerm', 'goid name namespace synonyms parents')
+
+
+def pattern_phrases(regex_out=pattern_regex.regex_out):
+    """
+    Return the plain phrases of the alternatives in regex_out which are
+    recognized by the regex itself, such as 'negative regulat' or 'binding'
+    """
+    phrases = []
+    for group in re.findall(r'\(\?P<\w+>\(\?:(.*?)\)\)', regex_out):
+        for snippet in group.split('|'):
+            phrase = (snippet.replace(r'\S{0,6}', '')
+                             .replace(r'[\ \-]?', ' ')
+                             .replace('?', ''))
+            if re.search(r'[^a-z ]', phrase):
+                continue
+            m = re.match(regex_out, phrase)
+            if m and m.end() == len(phrase):
+                phrases.append(phrase)
+    return sorted(set(phrases))
+
+
+def _word(rng, size=None):
+    size = size or rng.randint(2, 4)
+    return ''.join(rng.choice(SYLLABLES) for i in range(size))
+
+
+def _label(rng, phrases, pattern_rate):
+    entity = ' '.join(_word(rng) for i in range(rng.randint(1, 3)))
+    if rng.random() >= pattern_rate:
+        return entity
+    phrase = rng.choice(phrases)
+    if rng.random() < 0.5:
+        return '{} of {}'.format(phrase, entity)
+    return '{} {}'.format(entity, phrase)
+
+
+def generate_terms(n_terms, depth=6, synonym_rate=0.5, pattern_rate=0.4, seed=0):
+    """
+    Return a list of n_terms SyntheticTerm below the three GO roots,
+    organized in depth levels counting the roots like the depth in GoData,
+    every term has one or two parents in the level above
+    """
+    rng = random.Random(seed)
+    phrases = pattern_phrases()
+    levels = [[(goid, name) for goid, name in ROOTS]]
+    root_of = {goid: goid for goid, name in ROOTS}
+    terms = []
+    labels = set()
+    per_level = max(1, n_terms // max(1, depth - 1))
+    for i in range(n_terms):
+        level = min(1 + i // per_level, depth - 1)
+        if len(levels) <= level:
+            levels.append([])
+        parent_level = levels[level - 1]
+        parents = [rng.choice(parent_level)[0]]
+        if level > 1 and rng.random() < 0.2:
+            candidates = [goid for goid, name in parent_level
+                          if root_of[goid] == root_of[parents[0]]]
+            parents = sorted(set(parents + [rng.choice(candidates)]))
+        root = root_of[parents[0]]
+        namespace = dict(ROOTS)[root]
+
+        while True:
+            name = _label(rng, phrases, pattern_rate)
+            if name not in labels:
+                break
+        labels.add(name)
+        synonyms = []
+        while rng.random() < synonym_rate and len(synonyms) < 3:
+            synonym = _label(rng, phrases, pattern_rate)
+            if synonym not in labels:
+                labels.add(synonym)
+                synonyms.append(synonym)
+
+        goid = 'GO:{:07d}'.format(1000000 + i)
+        root_of[goid] = root
+        levels[level].append((goid, name))
+        terms.append(SyntheticTerm(goid, name, namespace, synonyms, parents))
+    return terms
+
+
+def write_obo(filepath, terms, date='16:01:2017 12:00'):
+    """
+    Write the terms as an OBO file readable by GoData
+    """
+    names = dict(ROOTS)
+    names.update((term.goid, term.name) for term in terms)
+    blocks = ['format-version: 1.2\ndate: {}\nsaved-by: ncgocr.benchmark\n'
+              'default-namespace: gene_ontology'.format(date)]
+    for goid, name in ROOTS:
+        blocks.append('[Term]\nid: {0}\nname: {1}\nnamespace: {1}'.format(goid, name))
+    for term in terms:
+        lines = ['[Term]',
+                 'id: ' + term.goid,
+                 'name: ' + term.name,
+                 'namespace: ' + term.namespace]
+        lines.extend('synonym: "{}" EXACT []'.format(s) for s in term.synonyms)
+        lines.extend('is_a: {} ! {}'.format(p, names[p]) for p in term.parents)
+        blocks.append('\n'.join(lines))
+    with io.open(filepath, 'w', encoding='utf-8') as f:
+        f.write('\n\n'.join(blocks) + '\n')
+
+
+def generate_corpus(terms, n_docs, sentences_per_doc=10, mention_rate=0.6, seed=0,
+                    title='synthetic', annotated_rate=1.0):
+    """
+    Return a Corpus and its goldstandard, the sentences are made of filler
+    words with labels and synonyms of the terms planted in them.
+
+    Only the mentions of the annotated_rate share of the terms, the same
+    terms in every corpus, are in the goldstandard. The mentions of the
+    other terms are negatives, like the concepts left out by CRAFT.
+    """
+    rng = random.Random(seed)
+    annotated = {term.goid for term in terms
+                 if random.Random(term.goid).random() < annotated_rate}
+    corpus = Corpus(title)
+    goldstandard = Annotation()
+    for d in range(n_docs):
+        docid = 'doc{:06d}'.format(d)
+        text = ''
+        for s in range(sentences_per_doc):
+            words = [rng.choice(FILLERS) for i in range(rng.randint(4, 10))]
+            sentence = ' '.join(words)
+            if rng.random() < mention_rate:
+                term = rng.choice(terms)
+                mention = rng.choice([term.name] + term.synonyms)
+                sentence = '{} {} {}'.format(sentence, mention, rng.choice(FILLERS))
+                start = len(text) + sentence.index(mention, len(' '.join(words)))
+                if term.goid in annotated:
+                    goldstandard.add((docid, term.goid, start, start + len(mention), mention))
+            text += sentence[0].upper() + sentence[1:] + '. '
+        corpus += Corpus.from_text(text, docid)
+    return corpus, goldstandard
@@ -0,0 +1,342 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+This module caches the extraction grounds and the candidates on disk, and
+the annotations of the sentences in memory
+"""
+
+from __future__ import (absolute_import, division,
+                        print_function, unicode_literals)
+from builtins import *
+
+import hashlib
+import os
+import pickle
+import tempfile
+
+from collections import OrderedDict
+
+import numpy as np
+
+from txttk.corpus import Candidate
+
+from ncgocr.concept import Entity, Pattern, Constraint, Evidence
+from ncgocr.extractor import Grounds
+
+TERM_CLASSES = {cls.__name__: cls for cls in [Entity, Pattern, Constraint]}
+
+
+def _update_index(digest, index):
+    """
+    Feed the content of an Ie (text -> terms) or Im (term -> statements)
+    index into the hash, in an order independent of the set ordering
+    """
+    keyed = sorted((repr(key), sorted(repr(value) for value in values))
+                   for key, values in index.items() if len(values) > 0)
+    for key, values in keyed:
+        digest.update(key.encode('utf-8'))
+        for value in values:
+            digest.update(b'\x1f')
+            digest.update(value.encode('utf-8'))
+        digest.update(b'\x1e')
+
+
+def fingerprint(corpus, term_indexes, statement_index, regex_out, longest=()):
+    """
+    Return the hex digest of everything the grounds and the candidates
+    depend on: the sentences, the term indexes of the solid extractors,
+    the statement index of the recognizer, the pattern regex and the
+    extractors in leftmost-longest mode
+    """
+    digest = hashlib.sha1()
+    for sentence in corpus:
+        digest.update('{}\x1f{}\x1f'.format(sentence.docid, sentence.offset).encode('utf-8'))
+        digest.update(sentence.text.encode('utf-8'))
+        digest.update(b'\x1e')
+    digest.update(b'\x1d')
+    for index in term_indexes:
+        _update_index(digest, index)
+        digest.update(b'\x1d')
+    _update_index(digest, statement_index)
+    digest.update(b'\x1d')
+    digest.update(regex_out.encode('utf-8'))
+    if longest:
+        digest.update(repr(sorted(longest)).encode('utf-8'))
+    return digest.hexdigest()
+
+
+class _Table(object):
+    """
+    Assign consecutive ids to hashable values
+    """
+    def __init__(self):
+        self.ids = dict()
+        self.values = []
+
+    def __getitem__(self, value):
+        try:
+            return self.ids[value]
+        except KeyError:
+            self.ids[value] = len(self.values)
+            self.values.append(value)
+            return self.ids[value]
+
+
+def _str_array(values):
+    return np.array(values, dtype=str) if len(values) > 0 else np.zeros(0, dtype='U1')
+
+
+class CandidateCache(object):
+    """
+    Store the grounds and the candidates of a corpus in a directory, one
+    compressed npz file of columns per fingerprint. The least recently
+    used files are deleted when the directory grows over max_bytes.
+    """
+    def __init__(self, directory, max_bytes=2**30):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(directory, exist_ok=True)
+
+    def path(self, key):
+        return os.path.join(self.directory, key + '.npz')
+
+    def dump(self, key, corpus, corpus_grounds, corpus_candidates):
+        sentence_ids = {id(sentence): i for i, sentence in enumerate(corpus)}
+        terms = _Table()
+        texts = _Table()
+        statids = _Table()
+        evidence_ids = dict()
+        ev_term, ev_text, ev_start, ev_end = [], [], [], []
+        grounds_indptr = [0]
+        for grounds in corpus_grounds:
+            for evidence in grounds.evidences:
+                evidence_ids[id(evidence)] = len(ev_term)
+                term = evidence.term
+                ev_term.append(terms[(term.__class__.__name__, term.lemma, term.ref)])
+                ev_text.append(texts[evidence.text])
+                ev_start.append(evidence.start)
+                ev_end.append(evidence.end)
+            grounds_indptr.append(len(ev_term))
+
+        cand_statid, cand_sentence, cand_evidences = [], [], []
+        cand_indptr = [0]
+        for candidate in corpus_candidates:
+            cand_statid.append(statids[candidate.statement.statid])
+            cand_sentence.append(sentence_ids[id(candidate.sentence)])
+            cand_evidences.extend(evidence_ids[id(e)] for e in candidate.evidences)
+            cand_indptr.append(len(cand_evidences))
+
+        columns = {
+            'term_class': _str_array([t[0] for t in terms.values]),
+            'term_lemma': _str_array([t[1] for t in terms.values]),
+            'term_ref': _str_array([t[2] for t in terms.values]),
+            'texts': _str_array(texts.values),
+            'statids': _str_array(statids.values),
+            'ev_term': np.array(ev_term, dtype=np.int32),
+            'ev_text': np.array(ev_text, dtype=np.int32),
+            'ev_start': np.array(ev_start, dtype=np.int64),
+            'ev_end': np.array(ev_end, dtype=np.int64),
+            'grounds_indptr': np.array(grounds_indptr, dtype=np.int64),
+            'cand_statid': np.array(cand_statid, dtype=np.int32),
+            'cand_sentence': np.array(cand_sentence, dtype=np.int32),
+            'cand_evidences': np.array(cand_evidences, dtype=np.int64),
+            'cand_indptr': np.array(cand_indptr, dtype=np.int64)}
+
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        with os.fdopen(fd, 'wb') as f:
+            np.savez_compressed(f, **columns)
+        os.replace(tmp_path, self.path(key))
+        self.evict()
+
+    def load(self, key, corpus, statement_index):
+        """
+        Return (corpus_grounds, corpus_candidates) stored under the key, the
+        sentences are taken from the corpus and the statements from the
+        statement index, or None if the key is not cached
+        """
+        path = self.path(key)
+        try:
+            data = np.load(path)
+        except (IOError, OSError):
+            self.misses += 1
+            return None
+        with data:
+            columns = {name: data[name] for name in data.files}
+        os.utime(path, None)
+        self.hits += 1
+
+        terms = [TERM_CLASSES[cls](lemma, ref) for cls, lemma, ref
+                 in zip(columns['term_class'].tolist(),
+                        columns['term_lemma'].tolist(),
+                        columns['term_ref'].tolist())]
+        texts = columns['texts'].tolist()
+        evidences = [Evidence(terms[t], texts[x], s, e) for t, x, s, e
+                     in zip(columns['ev_term'].tolist(),
+                            columns['ev_text'].tolist(),
+                            columns['ev_start'].tolist(),
+                            columns['ev_end'].tolist())]
+
+        indptr = columns['grounds_indptr'].tolist()
+        corpus_grounds = [Grounds(evidences[indptr[i]:indptr[i+1]], sentence)
+                          for i, sentence in enumerate(corpus)]
+
+        statid2statement = {statement.statid: statement
+                            for statements in statement_index.values()
+                            for statement in statements}
+        statements = [statid2statement[statid] for statid in columns['statids'].tolist()]
+        cand_evidences = columns['cand_evidences'].tolist()
+        indptr = columns['cand_indptr'].tolist()
+        corpus_candidates = []
+        for i, (s, sentence_id) in enumerate(zip(columns['cand_statid'].tolist(),
+                                                 columns['cand_sentence'].tolist())):
+            found_evidences = [evidences[j] for j in cand_evidences[indptr[i]:indptr[i+1]]]
+            candidate = Candidate(statements[s], found_evidences, corpus[sentence_id])
+            corpus_candidates.append(candidate)
+        return corpus_grounds, corpus_candidates
+
+    def evict(self):
+        """
+        Delete the least recently used files until the cache fits max_bytes
+        """
+        entries = []
+        for filename in os.listdir(self.directory):
+            if not filename.endswith('.npz'):
+                continue
+            stat = os.stat(os.path.join(self.directory, filename))
+            entries.append((stat.st_mtime, stat.st_size, filename))
+        entries.sort()
+        total = sum(size for mtime, size, filename in entries)
+        for mtime, size, filename in entries:
+            if total <= self.max_bytes:
+                break
+            os.remove(os.path.join(self.directory, filename))
+            total -= size
+
+    def process(self, corpus, extractor, recognizer, term_indexes, regex_out,
+                instrument=None):
+        """
+        Return (corpus_grounds, corpus_candidates) of the corpus, from the
+        cache if the same corpus, indexes and regex were processed before.
+
+        With an instrument, the lookup and the store are timed as the
+        candidate_cache stage, and on a miss the instrument is passed on
+        to the extractor and the recognizer.
+        """
+        key = fingerprint(corpus, term_indexes, recognizer.Im, regex_out,
+                          getattr(extractor, 'longest', ()))
+        if instrument is None:
+            cached = self.load(key, corpus, recognizer.Im)
+        else:
+            with instrument.stage('candidate_cache'):
+                cached = self.load(key, corpus, recognizer.Im)
+            instrument.count('candidate_cache.hits' if cached is not None
+                             else 'candidate_cache.misses')
+        if cached is not None:
+            return cached
+        corpus_grounds = extractor.process(corpus, instrument)
+        corpus_candidates = recognizer.process(corpus_grounds, instrument)
+        if instrument is None:
+            self.dump(key, corpus, corpus_grounds, corpus_candidates)
+        else:
+            with instrument.stage('candidate_cache'):
+                self.dump(key, corpus, corpus_grounds, corpus_candidates)
+        return corpus_grounds, corpus_candidates
+
+
+class ResultCache(object):
+    """
+    Keep the annotations of the sentences, keyed by the hash of the model
+    fingerprint and the sentence text, as (goid, start, end, text) relative
+    to the sentence. The least recently used sentences are evicted when the
+    estimated size grows over max_bytes.
+
+    If path is given, the cache is loaded from it when it exists, and
+    written to it by save.
+    """
+    FORMAT = 'ncgocr-result-cache'
+    ENTRY_BYTES = 200
+    ROW_BYTES = 100
+
+    def __init__(self, max_bytes=2**26, path=None):
+        self.max_bytes = max_bytes
+        self.path = path
+        self.entries = OrderedDict()
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        if path is not None and os.path.exists(path):
+            self.load(path)
+
+    def __repr__(self):
+        template = '{}<{} sentences, {} bytes>'
+        return template.format(self.__class__.__name__, len(self.entries), self.nbytes)
+
+    def __len__(self):
+        return len(self.entries)
+
+    @staticmethod
+    def key(model_fingerprint, text):
+        digest = hashlib.sha1(model_fingerprint.encode('utf-8'))
+        digest.update(b'\x1e')
+        digest.update(text.encode('utf-8'))
+        return digest.hexdigest()
+
+    def _size(self, rows):
+        return self.ENTRY_BYTES + sum(self.ROW_BYTES + 2 * len(row[3]) for row in rows)
+
+    def get(self, key):
+        """
+        Return the rows of the key, or None
+        """
+        try:
+            rows = self.entries[key]
+        except KeyError:
+            self.misses += 1
+            return None
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return rows
+
+    def put(self, key, rows):
+        rows = tuple(rows)
+        if key in self.entries:
+            self.nbytes -= self._size(self.entries.pop(key))
+        self.entries[key] = rows
+        self.nbytes += self._size(rows)
+        while self.nbytes > self.max_bytes and self.entries:
+            old_key, old_rows = self.entries.popitem(last=False)
+            self.nbytes -= self._size(old_rows)
+
+    def clear(self):
+        self.entries.clear()
+        self.nbytes = 0
+
+    @property
+    def hit_rate(self):
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups > 0 else 0.0
+
+    def stats(self):
+        return OrderedDict([('sentences', len(self.entries)),
+                            ('bytes', self.nbytes),
+                            ('hits', self.hits),
+                            ('misses', self.misses),
+                            ('hit_rate', self.hit_rate)])
+
+    def save(self, path=None):
+        path = path or self.path
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            pickle.dump({'format': self.FORMAT, 'entries': list(self.entries.items())},
+                        f, protocol=2)
+        os.replace(tmp_path, path)
+
+    def load(self, path):
+        with open(path, 'rb') as f:
+            data = pickle.load(f)
+        if not isinstance(data, dict) or data.get('format') != self.FORMAT:
+            raise ValueError('{} is not a result cache'.format(path))
+        for key, rows in data['entries']:
+            self.put(key, rows)
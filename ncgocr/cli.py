@@ -0,0 +1,266 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+The command-line interface of NCGOCR
+"""
+
+from __future__ import (absolute_import, division,
+                        print_function, unicode_literals)
+from builtins import *
+
+import argparse
+import io
+import itertools
+import json
+import multiprocessing
+import os
+import sys
+import time
+
+from collections import deque
+
+from txttk.corpus import Corpus
+
+from ncgocr.corpus_source import DirectorySource
+
+DESCRIPTION = r"""
+__    _   ___    ___     ___     ___  .___
+ |\   |  .'   \ .'   \  .'   `. .'   \ /   \
+ | \  |  |      |       |     | |      |__-'
+ |  \ |  |      |    _  |     | |      |  \
+ |   \|   `.__,  `.___|  `.__.'  `.__, /   \
+
+Named Concept Gene Ontology Concept Recognizer """
+
+FIELDS = ('docid', 'goid', 'start', 'end', 'text')
+
+
+def read_documents(inputs, stdin, extension='.txt'):
+    """
+    Yield (docid, text) from the given directories and files, or from
+    stdin with one document per line if no input is given or the input is
+    '-'. A line of stdin is either "docid<TAB>text" or the text only, in
+    which case the line number is the docid.
+    """
+    for path in inputs or ['-']:
+        if path == '-':
+            for i, line in enumerate(stdin, 1):
+                line = line.rstrip('\r\n')
+                docid, sep, text = line.partition('\t')
+                if not sep:
+                    docid, text = str(i), line
+                yield docid, text
+        elif os.path.isdir(path):
+            for filename in sorted(os.listdir(path)):
+                if filename.endswith(extension):
+                    filepath = os.path.join(path, filename)
+                    with io.open(filepath, encoding='utf-8') as f:
+                        yield filename[:-len(extension)], f.read()
+        else:
+            filename = os.path.basename(path)
+            docid = filename[:-len(extension)] if filename.endswith(extension) else filename
+            with io.open(path, encoding='utf-8') as f:
+                yield docid, f.read()
+
+
+def batched(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        batch = list(itertools.islice(iterator, size))
+        if not batch:
+            return
+        yield batch
+
+
+def read_batches(inputs, stdin, size, extension='.txt'):
+    """
+    Yield a Corpus of at most size documents from the inputs of
+    read_documents, the directories are read lazily and in parallel by a
+    DirectorySource. A batch never spans two inputs.
+    """
+    for path in inputs or ['-']:
+        if path != '-' and os.path.isdir(path):
+            source = DirectorySource(path, path, extension)
+            for corpus in source.batches(size):
+                yield corpus
+            continue
+        for batch in batched(read_documents([path], stdin, extension), size):
+            corpus = Corpus(path)
+            for docid, text in batch:
+                corpus.extend(Corpus.from_text(text, docid))
+            yield corpus
+
+
+def annotate_batch(model, batch):
+    """
+    Return (sentence count, sorted annotations) of a Corpus batch
+    """
+    return len(batch), model.process(batch).sorted_results()
+
+
+def load_model(path):
+    """
+    Load a bundle saved by NCGOCR.save, or attach a directory written by
+    ncgocr.shared.export_shared
+    """
+    if os.path.isdir(path):
+        from ncgocr.shared import attach_shared
+        return attach_shared(path)
+    from ncgocr.ncgocr import NCGOCR
+    return NCGOCR.load(path)
+
+
+_worker = dict()
+
+def _init_worker(model_path):
+    _worker['model'] = load_model(model_path)
+
+def _annotate_in_worker(batch):
+    return annotate_batch(_worker['model'], batch)
+
+def _annotate_inherited(batch):
+    from ncgocr.shared import inherited_model
+    return annotate_batch(inherited_model(), batch)
+
+
+def format_row(row, output_format):
+    if output_format == 'jsonl':
+        return json.dumps(dict(zip(FIELDS, row)), ensure_ascii=False)
+    return '\t'.join(str(value) for value in row)
+
+
+def annotate(args, stdin, stdout, stderr):
+    start = time.time()
+    # the forked workers inherit the model loaded here with its automata
+    inherit = args.workers == 1 or 'fork' in multiprocessing.get_all_start_methods()
+    if inherit:
+        model = load_model(args.model)
+        print('Model loaded in {:.3f}s'.format(model.load_time), file=stderr)
+
+    batches = read_batches(args.inputs, stdin, args.batch_size)
+
+    if args.workers == 1:
+        results = ((len(batch.doc_set()), (len(batch), annotations.sorted_results()))
+                   for batch, annotations in model.process_batches(batches))
+        pool = None
+    else:
+        if inherit:
+            from ncgocr.shared import inherit_pool
+            pool = inherit_pool(model, args.workers)
+            work = _annotate_inherited
+        else:
+            pool = multiprocessing.Pool(args.workers, _init_worker, (args.model,))
+            work = _annotate_in_worker
+
+        def _results():
+            pending = deque()
+            for batch in batches:
+                pending.append((len(batch.doc_set()), pool.apply_async(work, (batch,))))
+                if len(pending) >= 2 * args.workers:
+                    size, result = pending.popleft()
+                    yield size, result.get()
+            while pending:
+                size, result = pending.popleft()
+                yield size, result.get()
+        results = _results()
+
+    docs = sentences = annotations = 0
+    first = None
+    try:
+        for i, (size, (sentence_count, rows)) in enumerate(results, 1):
+            for row in rows:
+                print(format_row(row, args.format), file=stdout)
+            stdout.flush()
+            if first is None:
+                first = time.time() - start
+            docs += size
+            sentences += sentence_count
+            annotations += len(rows)
+            if not args.quiet:
+                elapsed = time.time() - start
+                template = 'batch {}: {} docs, {} sentences, {} annotations, {:.1f} docs/s'
+                print(template.format(i, docs, sentences, annotations, docs / elapsed),
+                      file=stderr)
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+
+    elapsed = time.time() - start
+    template = ('Annotated {} docs ({} sentences) into {} annotations in {:.3f}s, '
+                '{:.1f} docs/s, {:.1f} sentences/s, first batch after {:.3f}s')
+    print(template.format(docs, sentences, annotations, elapsed,
+                          docs / elapsed, sentences / elapsed, first or 0.0),
+          file=stderr)
+
+
+def serve(args, stdin, stdout, stderr):
+    from ncgocr.server import serve as run_server
+
+    model = load_model(args.model)
+    where = args.socket or '{}:{}'.format(args.host, args.port)
+    print('Model loaded in {:.3f}s, serving on {}'.format(model.load_time, where), file=stderr)
+    run_server(model, args.host, args.port, args.socket, args.max_batch_size, args.max_wait,
+               args.max_body_size)
+
+
+def get_parser():
+    parser = argparse.ArgumentParser(description=DESCRIPTION,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    subparsers = parser.add_subparsers(dest='command')
+
+    annotate_parser = subparsers.add_parser('annotate',
+                                            help='annotate documents with a saved model')
+    annotate_parser.add_argument('inputs', nargs='*', metavar='INPUT',
+                                 help='directories of .txt files, files, or - for stdin '
+                                      'with one document per line (default: stdin)')
+    annotate_parser.add_argument('-m', '--model', default='data/ncgocr.bundle',
+                                 help='the bundle saved by NCGOCR.save, or a directory '
+                                      'written by export_shared, shared by the workers')
+    annotate_parser.add_argument('-b', '--batch-size', type=int, default=64,
+                                 help='documents per batch (default: 64)')
+    annotate_parser.add_argument('-w', '--workers', type=int, default=1,
+                                 help='worker processes, forked with the model loaded once '
+                                      'where fork is available (default: 1)')
+    annotate_parser.add_argument('-f', '--format', choices=['tsv', 'jsonl'], default='tsv',
+                                 help='output format (default: tsv)')
+    annotate_parser.add_argument('-q', '--quiet', action='store_true',
+                                 help='only print the final throughput to stderr')
+    annotate_parser.set_defaults(func=annotate)
+
+    serve_parser = subparsers.add_parser('serve',
+                                         help='serve a saved model over HTTP')
+    serve_parser.add_argument('-m', '--model', default='data/ncgocr.bundle',
+                              help='the bundle saved by NCGOCR.save, or a directory '
+                                   'written by export_shared')
+    serve_parser.add_argument('--host', default='127.0.0.1',
+                              help='the host to bind (default: 127.0.0.1)')
+    serve_parser.add_argument('-p', '--port', type=int, default=8000,
+                              help='the port to bind (default: 8000)')
+    serve_parser.add_argument('--socket', default=None,
+                              help='bind a Unix socket instead of a TCP port')
+    serve_parser.add_argument('--max-batch-size', type=int, default=32,
+                              help='documents per micro-batch (default: 32)')
+    serve_parser.add_argument('--max-wait', type=float, default=0.01,
+                              help='seconds to wait for a micro-batch to fill (default: 0.01)')
+    serve_parser.add_argument('--max-body-size', type=int, default=2**20,
+                              help='larger request bodies are refused with 413 '
+                                   '(default: 1048576)')
+    serve_parser.set_defaults(func=serve)
+    return parser
+
+
+def main(argv=None):
+    parser = get_parser()
+    args = parser.parse_args(argv)
+    if args.command is None:
+        parser.print_help()
+        return 2
+    if getattr(args, 'batch_size', 1) < 1 or getattr(args, 'workers', 1) < 1:
+        parser.error('--batch-size and --workers must be positive')
+    args.func(args, sys.stdin, sys.stdout, sys.stderr)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
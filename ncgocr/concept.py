@@ -557,6 +557,17 @@ class GoData(dict):
                             Im[term].add(statement)
         return Im
 
+    def get_goid2terms(self):
+        """
+        Return the terms of the single-evidence statements of each concept
+        """
+        goid2terms = dict()
+        for goid, concept in self.items():
+            goid2terms[goid] = [statement.evidences[0].term
+                                for statement in concept.statements
+                                if len(statement.evidences) == 1]
+        return goid2terms
+
     def save(self, filepath):
         with open(filepath, 'wb') as f:
             pickle.dump(self, f, protocol=2)
@@ -8,20 +8,241 @@ from __future__ import (absolute_import, division,
                         print_function, unicode_literals)
 from builtins import *
 
-import urllib.request
+import hashlib
+import json
+import multiprocessing
 import tarfile
 import os
 import re
 
-from lxml import etree
 from progressbar import ProgressBar
 
 from txttk import corpus as c
 
+from ncgocr.corpus_source import DirectorySource
+
 BASE_URL = 'https://sourceforge.net/projects/bionlp-corpora/files/CRAFT/'
 CRAFT1_URL = BASE_URL + 'v1.0/craft-1.0.tar.gz/download'
 CRAFT2_URL = BASE_URL + 'v2.0/craft-2.0.tar.gz/download'
 
+def parse_knowtator(source, pmid):
+    """
+    Return the (pmid, goid, start, end, text) of the GO mentions in a
+    knowtator XML file or file object, the elements are parsed
+    incrementally and cleared as soon as they are read
+    """
+    from lxml import etree
+
+    mentionid2goid = dict()
+    mentionid2span = dict()
+    for event, element in etree.iterparse(source, events=('end',),
+                                          tag=('annotation', 'classMention')):
+        if element.tag == 'classMention':
+            mention_class = element.find('mentionClass')
+            goid = '' if mention_class is None else mention_class.get('id', '')
+            mentionid2goid[element.get('id', '')] = goid
+        else:
+            mention = element.find('mention')
+            mentionid = '' if mention is None else mention.get('id', '')
+            spans = element.findall('span')
+            start = int(''.join(span.get('start', '') for span in spans))
+            end = int(''.join(span.get('end', '') for span in spans))
+            spannedtext = element.findtext('spannedText') or ''
+            mentionid2span[mentionid] = (start, end, spannedtext)
+        element.clear()
+        while element.getprevious() is not None:
+            del element.getparent()[0]
+
+    result = []
+    for mentionid, goid in mentionid2goid.items():
+        if goid.startswith('GO:'):
+            start, end, spannedtext = mentionid2span[mentionid]
+            result.append((pmid, goid, start, end, spannedtext))
+    return result
+
+
+def _pmid(filepath):
+    return re.findall(r'(\d+)\.txt\.knowtator\.xml', os.path.basename(filepath))[0]
+
+
+def _read_text(f):
+    """
+    Read a binary file object as text, with the newlines translated like
+    the files opened in text mode
+    """
+    return f.read().decode('utf-8').replace('\r\n', '\n').replace('\r', '\n')
+
+
+def _parse_files(filepaths):
+    result = []
+    for filepath in filepaths:
+        result.extend(parse_knowtator(filepath, _pmid(filepath)))
+    return result
+
+
+def files_key(filepaths):
+    """
+    Return the hex digest of the names, the mtimes and the sizes of the files
+    """
+    digest = hashlib.sha1()
+    for filepath in sorted(filepaths):
+        stat = os.stat(filepath)
+        digest.update('{}\x1f{}\x1f{}\x1e'.format(filepath, stat.st_mtime_ns,
+                                                  stat.st_size).encode('utf-8'))
+    return digest.hexdigest()
+
+
+def read_goldstandard(filepaths, workers=None, chunk_size=8, cache_path=None):
+    """
+    Read the GO mentions of the knowtator XML files into an Annotation.
+
+    The files are parsed in a pool of workers, chunk_size files per task,
+    with workers=1 they are parsed in this process. If cache_path is given,
+    the mentions are stored there as npz columns, and read back as long
+    as the names, the mtimes and the sizes of the files are unchanged.
+    """
+    import numpy as np
+
+    filepaths = sorted(filepaths)
+    key = files_key(filepaths) if cache_path is not None else None
+    if cache_path is not None and os.path.isfile(cache_path):
+        with np.load(cache_path) as data:
+            if str(data['key']) == key:
+                rows = zip(data['pmid'].tolist(), data['goid'].tolist(),
+                           data['start'].tolist(), data['end'].tolist(),
+                           data['text'].tolist())
+                return c.Annotation(rows)
+
+    chunks = [filepaths[i:i+chunk_size] for i in range(0, len(filepaths), chunk_size)]
+    workers = workers or os.cpu_count() or 1
+    if workers == 1 or len(chunks) <= 1:
+        results = map(_parse_files, chunks)
+    else:
+        with multiprocessing.Pool(workers) as pool:
+            results = pool.map(_parse_files, chunks)
+    goldstandard = c.Annotation()
+    for rows in results:
+        goldstandard.update(rows)
+
+    if cache_path is not None:
+        rows = sorted(goldstandard)
+        columns = list(zip(*rows)) if rows else [[]] * 5
+        tmp_path = cache_path + '.tmp.npz'
+        np.savez_compressed(tmp_path, key=np.array(key),
+                            pmid=np.array(columns[0], dtype=str),
+                            goid=np.array(columns[1], dtype=str),
+                            start=np.array(columns[2], dtype=np.int64),
+                            end=np.array(columns[3], dtype=np.int64),
+                            text=np.array(columns[4], dtype=str))
+        os.replace(tmp_path, cache_path)
+    return goldstandard
+
+
+class TarSource(object):
+    """
+    Read the CRAFT articles and GO annotations straight out of the
+    tarball, in one sequential pass and without extracting it.
+
+    The index maps the member names to the offsets of their data, it is
+    built by build_index and saved next to the tarball, so that read can
+    fetch a single member without scanning the headers; in a compressed
+    tarball the data before the member still has to be decompressed.
+    """
+    TXT_DIR = '/articles/txt/'
+    XML_DIRS = ('/knowtator-xml/go_bpmf/', '/knowtator-xml/go_cc/')
+
+    def __init__(self, tarball_path, index_path=None):
+        self.tarball_path = tarball_path
+        self.index_path = index_path or tarball_path + '.index.json'
+        self._index = None
+
+    def __repr__(self):
+        return '{}<{}>'.format(self.__class__.__name__, repr(self.tarball_path))
+
+    def kind(self, name):
+        if self.TXT_DIR in name and name.endswith('.txt'):
+            return 'txt'
+        if any(d in name for d in self.XML_DIRS) and name.endswith('.knowtator.xml'):
+            return 'xml'
+        return None
+
+    def members(self, kinds=('txt', 'xml')):
+        """
+        Yield (kind, name, file object) of the wanted members in the order
+        of the archive, each file object is only valid until the next one
+        """
+        with tarfile.open(self.tarball_path, 'r|*') as tar:
+            for tarinfo in tar:
+                kind = self.kind(tarinfo.name)
+                if kind in kinds and tarinfo.isfile():
+                    yield kind, tarinfo.name, tar.extractfile(tarinfo)
+
+    @staticmethod
+    def _docid(name):
+        return os.path.basename(name)[:-len('.txt')]
+
+    def read_all(self, title='CRAFT', sent_toker=None):
+        """
+        Return the corpus and the goldstandard in one pass
+        """
+        corpus = c.Corpus(title)
+        goldstandard = c.Annotation()
+        for kind, name, f in self.members():
+            if kind == 'txt':
+                text = _read_text(f)
+                corpus += c.Corpus.from_text(text, self._docid(name), sent_toker)
+            else:
+                goldstandard.update(parse_knowtator(f, _pmid(name)))
+        return corpus, goldstandard
+
+    def get_corpus(self, title='CRAFT', sent_toker=None):
+        corpus = c.Corpus(title)
+        for kind, name, f in self.members(('txt',)):
+            text = _read_text(f)
+            corpus += c.Corpus.from_text(text, self._docid(name), sent_toker)
+        return corpus
+
+    def get_goldstandard(self):
+        goldstandard = c.Annotation()
+        for kind, name, f in self.members(('xml',)):
+            goldstandard.update(parse_knowtator(f, _pmid(name)))
+        return goldstandard
+
+    def build_index(self):
+        """
+        Index the offsets and the sizes of the wanted members, and save it
+        """
+        index = dict()
+        with tarfile.open(self.tarball_path, 'r|*') as tar:
+            for tarinfo in tar:
+                if self.kind(tarinfo.name) is not None and tarinfo.isfile():
+                    index[tarinfo.name] = (tarinfo.offset_data, tarinfo.size)
+        with open(self.index_path, 'w') as f:
+            json.dump(index, f)
+        self._index = index
+        return index
+
+    @property
+    def index(self):
+        if self._index is None:
+            if os.path.isfile(self.index_path):
+                with open(self.index_path) as f:
+                    self._index = {name: tuple(value) for name, value in json.load(f).items()}
+            else:
+                self.build_index()
+        return self._index
+
+    def read(self, name):
+        """
+        Return the bytes of one member, located by the index
+        """
+        offset, size = self.index[name]
+        with tarfile.open(self.tarball_path, 'r:*') as tar:
+            fileobj = tar.fileobj
+            fileobj.seek(offset)
+            return fileobj.read(size)
+
+
 def wanted_members(members):
     for tarinfo in members:
         filepath = tarinfo.name
@@ -33,7 +254,11 @@ def wanted_members(members):
 
 
 class Craft(object):
-    def __init__(self, local_path, version='1.0'):
+    def __init__(self, local_path, version='1.0', extract=True):
+        """
+        With extract=False the corpus and the goldstandard are read from
+        the tarball unless they were already extracted
+        """
         if version=='1.0':
             self.url = CRAFT1_URL
             self.filename = 'craft-1.0.tar.gz'
@@ -44,6 +269,7 @@ class Craft(object):
             raise ValueError('Unsupport CRAFT version')
 
         self.version = version
+        self.extract = extract
         self.local_path = local_path
         self.tarball_path = os.path.join(self.local_path, self.filename)
         self.craft_path = os.path.join(self.local_path, 'craft-'+version)
@@ -51,6 +277,8 @@ class Craft(object):
         os.makedirs(self.local_path, exist_ok=True)
 
     def download(self):
+        import urllib.request
+
         pbar = ProgressBar()
         def dlProgress(count, blockSize, totalSize):
             pbar.update(int(count * blockSize * 100 / totalSize))
@@ -67,51 +295,50 @@ class Craft(object):
             tar.extractall(path=self.local_path,
                            members=wanted_members(tar))
 
+    def get_tar_source(self):
+        if not os.path.isfile(self.tarball_path):
+            self.download()
+        return TarSource(self.tarball_path)
+
     def get_corpus(self):
         txtdir = os.path.join(self.craft_path, 'articles', 'txt')
         if not os.path.isdir(txtdir):
+            if not self.extract:
+                print('Reading the corpus from the tarball...')
+                return self.get_tar_source().get_corpus('CRAFT')
             self.slim_extract()
         print('Reading the corpus...')
         corpus = c.Corpus.from_dir(txtdir, 'CRAFT')
         return corpus
 
-    def get_goldstandard(self):
+    def get_source(self, workers=None, chunk_size=16):
+        """
+        Return the corpus as a DirectorySource, which yields the sentences
+        while the articles are read in parallel
+        """
+        txtdir = os.path.join(self.craft_path, 'articles', 'txt')
+        if not os.path.isdir(txtdir):
+            self.slim_extract()
+        return DirectorySource(txtdir, 'CRAFT', workers=workers, chunk_size=chunk_size)
+
+    def get_goldstandard(self, workers=None, use_cache=True):
+        """
+        Return the GO goldstandard, the knowtator XML files are parsed in
+        parallel and the result is cached next to them
+        """
         xmldir = os.path.join(self.craft_path, 'knowtator-xml')
         if not os.path.isdir(xmldir):
+            if not self.extract:
+                print('Reading the goldstandard of GO from the tarball...')
+                return self.get_tar_source().get_goldstandard()
             self.slim_extract()
 
-        craft_path = self.craft_path
-
-        print('Reading the goldstandard of GO...')
-        goldstandard = c.Annotation()
+        filepaths = []
         for xml_folder in ['go_bpmf', 'go_cc']:
-            xml_dir = os.path.join(craft_path, 'knowtator-xml', xml_folder)
-            for filename in os.listdir(xml_dir):
-                filepath = os.path.join(xml_dir, filename)
-                pmid = re.findall(r'/(\d+)\.txt\.knowtator\.xml', filepath)[0]
-                t = etree.parse(filepath)
-                mentionid2goid = dict()
-                mentionid2span = dict()
-
-                for classmention in t.xpath('//classMention'):
-                    mentionid = ''.join(classmention.xpath('@id'))
-                    goid = ''.join(classmention.xpath('mentionClass/@id'))
-                    mentionid2goid[mentionid] = goid
-
-                for annotation in t.xpath('//annotation'):
-                    mentionid = ''.join(annotation.xpath('mention/@id'))
-                    spannedtext = ''.join(annotation.xpath('spannedText/text()'))
-                    start = int(''.join(annotation.xpath('span/@start')))
-                    end = int(''.join(annotation.xpath('span/@end')))
-                    mentionid2span[mentionid] = (start, end, spannedtext)
-
-                key_left = mentionid2goid.keys()
-                key_right = mentionid2span.keys()
-
-                for mentionid in key_left:
-                    goid = mentionid2goid[mentionid]
-                    if goid.startswith('GO:'):
-                        start, end, spannedtext = mentionid2span[mentionid]
-                        goldstandard.add((pmid, goid, start, end, spannedtext))
+            xml_dir = os.path.join(xmldir, xml_folder)
+            filepaths.extend(os.path.join(xml_dir, filename)
+                             for filename in os.listdir(xml_dir))
+        cache_path = os.path.join(xmldir, 'goldstandard.npz') if use_cache else None
 
-        return goldstandard
+        print('Reading the goldstandard of GO...')
+        return read_goldstandard(filepaths, workers, cache_path=cache_path)
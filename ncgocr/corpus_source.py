@@ -0,0 +1,121 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+This module reads large corpus directories lazily and in parallel
+"""
+
+from __future__ import (absolute_import, division,
+                        print_function, unicode_literals)
+from builtins import *
+
+import io
+import itertools
+import multiprocessing
+import os
+
+from collections import deque
+
+from txttk.corpus import Corpus
+
+
+def read_documents(paths, sent_toker=None, encoding='utf-8'):
+    """
+    Read and segment the (filepath, docid) files, return one Corpus per file
+    """
+    result = []
+    for filepath, docid in paths:
+        with io.open(filepath, encoding=encoding) as f:
+            text = f.read()
+        result.append(Corpus.from_text(text, docid, sent_toker))
+    return result
+
+
+class DirectorySource(object):
+    """
+    Iterate over the sentences of the files in a directory, like the
+    Corpus from Corpus.from_dir, without reading the whole directory first.
+
+    The files are listed lazily, then read and segmented in a pool of
+    workers, at most read_ahead chunks of chunk_size files are in flight,
+    so that the reading overlaps the consumption of the sentences. The
+    documents come in the order of the directory listing. With workers=1
+    the files are read in this process. The sent_toker must be picklable
+    if workers are used.
+    """
+    def __init__(self, dirpath, title='', filename_extension='.txt',
+                 workers=None, chunk_size=16, read_ahead=None,
+                 sent_toker=None, encoding='utf-8'):
+        self.dirpath = dirpath
+        self.title = title
+        self.filename_extension = filename_extension
+        self.workers = workers or os.cpu_count() or 1
+        self.chunk_size = chunk_size
+        self.read_ahead = read_ahead or 2 * self.workers
+        self.sent_toker = sent_toker
+        self.encoding = encoding
+
+    def __repr__(self):
+        template = '{}<{} {}>'
+        return template.format(self.__class__.__name__, repr(self.dirpath), repr(self.title))
+
+    def __iter__(self):
+        for document in self.documents():
+            for sentence in document:
+                yield sentence
+
+    def paths(self):
+        """
+        Yield (filepath, docid) of the files in the directory, lazily
+        """
+        extension = self.filename_extension
+        for entry in os.scandir(self.dirpath):
+            if entry.name.endswith(extension) and entry.is_file():
+                yield entry.path, entry.name[:-len(extension)]
+
+    def _chunks(self):
+        paths = self.paths()
+        while True:
+            chunk = list(itertools.islice(paths, self.chunk_size))
+            if not chunk:
+                return
+            yield chunk
+
+    def documents(self):
+        """
+        Yield a Corpus for every file as soon as it is read and segmented
+        """
+        if self.workers == 1:
+            for chunk in self._chunks():
+                for document in read_documents(chunk, self.sent_toker, self.encoding):
+                    yield document
+            return
+
+        pool = multiprocessing.Pool(self.workers)
+        try:
+            pending = deque()
+            for chunk in self._chunks():
+                pending.append(pool.apply_async(read_documents,
+                                                (chunk, self.sent_toker, self.encoding)))
+                if len(pending) >= self.read_ahead:
+                    for document in pending.popleft().get():
+                        yield document
+            while pending:
+                for document in pending.popleft().get():
+                    yield document
+        finally:
+            pool.terminate()
+            pool.join()
+
+    def batches(self, size):
+        """
+        Yield a Corpus of every size documents
+        """
+        documents = self.documents()
+        for i in itertools.count(1):
+            batch = list(itertools.islice(documents, size))
+            if not batch:
+                return
+            yield Corpus.join('{} {}'.format(self.title, i), batch)
+
+    def to_corpus(self):
+        return Corpus(self.title, self)
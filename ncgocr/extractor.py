@@ -6,6 +6,7 @@ from __future__ import (absolute_import, division,
 from builtins import *
 from collections import defaultdict, namedtuple
 import re
+import time
 
 from acora import AcoraBuilder
 
@@ -22,22 +23,56 @@ def _fit_border(text, span):
     return all([judge(left_border),
                 judge(right_border)])
 
+def _leftmost_longest(matches):
+    """
+    Keep the leftmost, then longest, of the overlapping (text, start)
+    matches, scanning from left to right
+    """
+    result = []
+    end = -1
+    for text, start in sorted(matches, key=lambda m: (m[1], -len(m[0]))):
+        if start >= end:
+            result.append((text, start))
+            end = start + len(text)
+    return result
+
+
 class SolidExtractor(object):
-    def __init__(self, term_index):
+    """
+    Find the texts of the term index in the sentences. By default every
+    hit is kept, even if it overlaps another one, with longest=True only
+    the leftmost-longest hits are kept.
+    """
+    def __init__(self, term_index, longest=False):
         self.term_index = term_index
+        self.longest = longest
 
         builder = AcoraBuilder()
         for text in term_index:
             builder.add(text)
         self.ac = builder.build()
 
-    def findall(self, sentence):
+    def scan(self, sentence, longest=None):
+        """
+        Return the evidences and the number of raw automaton hits, the
+        longest argument overrides the mode of the extractor
+        """
+        if longest is None:
+            longest = self.longest
         ac = self.ac
         term_index = self.term_index
         result = []
+        hits = 0
         offset = sentence.offset
         try:
-            for text, raw_start in ac.findall(sentence.text):
+            matches = ac.findall(sentence.text)
+            hits = len(matches)
+            if longest:
+                matches = _leftmost_longest(
+                    [(text, raw_start) for text, raw_start in matches
+                     if term_index[text] and
+                     _fit_border(sentence.text, (raw_start, raw_start + len(text)))])
+            for text, raw_start in matches:
                 for primary_term in term_index[text]:
                     start = raw_start + offset
                     raw_end = raw_start + len(text)
@@ -46,8 +81,11 @@ class SolidExtractor(object):
                         evidence = Evidence(primary_term, text, start, end)
                         result.append(evidence)
         except TypeError: # caused by empty ac
-            return []
-        return result
+            return [], 0
+        return result, hits
+
+    def findall(self, sentence, longest=None):
+        return self.scan(sentence, longest)[0]
 
     def to_grounds(self, sentence):
         evidences = self.findall(sentence)
@@ -78,13 +116,31 @@ class SoftExtractor(object):
         return grounds
 
 class JoinExtractor(object):
-    def __init__(self, extractors):
+    """
+    Join the evidences of the extractors. The solid extractors named in
+    longest keep only their leftmost-longest hits, the other ones use
+    their own mode.
+    """
+    def __init__(self, extractors, names=None, longest=()):
         self.extractors = extractors
+        if names is None:
+            names = ['{}{}'.format(e.__class__.__name__, i) for i, e in enumerate(extractors)]
+        self.names = names
+        self.longest = set(longest)
+        unknown = self.longest - set(names)
+        if unknown:
+            raise ValueError('Unknown extractors: {}'.format(', '.join(sorted(unknown))))
+
+    def _modes(self):
+        return [True if name in self.longest else None for name in self.names]
 
     def findall(self, sentence):
         result = []
-        for extractor in self.extractors:
-            result.extend(extractor.findall(sentence))
+        for extractor, longest in zip(self.extractors, self._modes()):
+            if isinstance(extractor, SolidExtractor):
+                result.extend(extractor.findall(sentence, longest))
+            else:
+                result.extend(extractor.findall(sentence))
         result.sort(key=lambda e: e.start)
         return result
 
@@ -93,12 +149,37 @@ class JoinExtractor(object):
         grounds = Grounds(evidences, sentence)
         return grounds
 
-    def process(self, corpus):
+    def process(self, corpus, instrument=None):
+        if instrument is not None:
+            return self._process_instrumented(corpus, instrument)
         corpus_grounds = []
         for sentence in corpus:
             corpus_grounds.append(self.to_grounds(sentence))
         return corpus_grounds
 
+    def _process_instrumented(self, corpus, instrument):
+        clock = time.perf_counter
+        named_extractors = list(zip(self.names, self.extractors, self._modes()))
+        corpus_grounds = []
+        for sentence in corpus:
+            sentence_start = clock()
+            result = []
+            for name, extractor, longest in named_extractors:
+                start = clock()
+                if isinstance(extractor, SolidExtractor):
+                    evidences, hits = extractor.scan(sentence, longest)
+                    instrument.count(name + '.hits', hits)
+                else:
+                    evidences = extractor.findall(sentence)
+                instrument.add('extract.' + name, clock() - start)
+                instrument.count(name + '.evidences', len(evidences))
+                result.extend(evidences)
+            result.sort(key=lambda e: e.start)
+            corpus_grounds.append(Grounds(result, sentence))
+            instrument.sentence(sentence, clock() - sentence_start)
+        instrument.count('sentences', len(corpus_grounds))
+        return corpus_grounds
+
 
 def nearest_evidences(current_position, wanted_terms, position_index):
     found_evidences = []
@@ -133,12 +214,14 @@ class CandidateReconizer(object):
         self.Im = Im
 
     def generate(self, grounds):
+        return list(self.iter_generate(grounds))
+
+    def iter_generate(self, grounds):
         """
         This function looks so complex because I only want to report the nearest evidence
         Maybe there is a more elegant way, but I have no idea, currently.
         """
         stat_index = self.Im
-        result_candidates = []
 
         positional_evidences = list(enumerate(grounds.evidences))
 
@@ -153,15 +236,25 @@ class CandidateReconizer(object):
             for statement in statements:
                 wanted_terms = statement.terms()
                 found_evidences = nearest_evidences(position, wanted_terms, position_index)
-                candidate = Candidate(statement, found_evidences, grounds.sentence)
-                result_candidates.append(candidate)
-        return result_candidates
+                yield Candidate(statement, found_evidences, grounds.sentence)
 
-    def process(self, corpus_grounds):
+    def process(self, corpus_grounds, instrument=None):
         corpus_candidates = []
+        if instrument is None:
+            for grounds in corpus_grounds:
+                candidates = self.generate(grounds)
+                corpus_candidates.extend(candidates)
+            return corpus_candidates
+
+        clock = time.perf_counter
         for grounds in corpus_grounds:
+            start = clock()
             candidates = self.generate(grounds)
+            seconds = clock() - start
+            instrument.add('generate', seconds)
+            instrument.sentence(grounds.sentence, seconds)
             corpus_candidates.extend(candidates)
+        instrument.count('candidates', len(corpus_candidates))
         return corpus_candidates
 
 
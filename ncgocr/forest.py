@@ -0,0 +1,149 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Predict like a fitted RandomForestClassifier from flat node arrays. The
+arrays are compiled into the Cython trees of scikit-learn, which read the
+sparse features in place, without the validation and the dispatch of the
+forest on every call
+"""
+
+from __future__ import (absolute_import, division,
+                        print_function, unicode_literals)
+from builtins import *
+
+import numpy as np
+import scipy.sparse as sp
+
+FOREST_ARRAYS = ['classes', 'roots', 'feature', 'threshold', 'left', 'right', 'proba']
+
+
+class FlatForest(object):
+    """
+    The trees of a forest concatenated into node arrays, the children are
+    absolute positions and -1 at the leaves, proba holds the class
+    fractions of every node
+    """
+    def __init__(self, classes, roots, feature, threshold, left, right, proba):
+        self.classes_ = classes
+        self.roots = roots
+        self.feature = feature
+        self.threshold = threshold
+        self.left = left
+        self.right = right
+        self.proba = proba
+        self._compiled = None
+
+    @classmethod
+    def from_classifier(cls, classifier):
+        if getattr(classifier, 'n_outputs_', 1) != 1:
+            raise ValueError('Only single output forests can be flattened')
+        roots, feature, threshold, left, right, proba = [], [], [], [], [], []
+        start = 0
+        for estimator in classifier.estimators_:
+            tree = estimator.tree_
+            leaf = tree.children_left == -1
+            roots.append(start)
+            feature.append(tree.feature)
+            threshold.append(tree.threshold)
+            left.append(np.where(leaf, -1, tree.children_left + start))
+            right.append(np.where(leaf, -1, tree.children_right + start))
+            value = tree.value[:, 0, :].astype(np.float64)
+            normalizer = value.sum(axis=1, keepdims=True)
+            normalizer[normalizer == 0.0] = 1.0
+            proba.append(value / normalizer)
+            start += tree.node_count
+        return cls(np.asarray(classifier.classes_),
+                   np.array(roots, dtype=np.int64),
+                   np.concatenate(feature).astype(np.int64),
+                   np.concatenate(threshold),
+                   np.concatenate(left).astype(np.int64),
+                   np.concatenate(right).astype(np.int64),
+                   np.concatenate(proba))
+
+    @classmethod
+    def from_arrays(cls, arrays, prefix='forest_'):
+        return cls(*[arrays[prefix + name] for name in FOREST_ARRAYS])
+
+    def to_arrays(self, prefix='forest_'):
+        values = [self.classes_, self.roots, self.feature, self.threshold,
+                  self.left, self.right, self.proba]
+        return {prefix + name: value for name, value in zip(FOREST_ARRAYS, values)}
+
+    @property
+    def n_estimators(self):
+        return len(self.roots)
+
+    @property
+    def node_count(self):
+        return len(self.feature)
+
+    def compile(self, n_features):
+        """
+        Return the scikit-learn trees of the node arrays, for the rows of
+        n_features columns, built once per process
+        """
+        if self._compiled is None or self._compiled[0] != n_features:
+            from sklearn.tree._tree import Tree, NODE_DTYPE
+
+            if n_features <= self.feature.max():
+                template = 'The forest splits on feature {}, the rows have {} features'
+                raise ValueError(template.format(self.feature.max(), n_features))
+            n_classes = np.array([len(self.classes_)], dtype=np.intp)
+            ends = np.append(self.roots[1:], self.node_count)
+            trees = []
+            for start, end in zip(self.roots.tolist(), ends.tolist()):
+                leaf = self.left[start:end] == -1
+                nodes = np.zeros(end - start, dtype=NODE_DTYPE)
+                nodes['left_child'] = np.where(leaf, -1, self.left[start:end] - start)
+                nodes['right_child'] = np.where(leaf, -1, self.right[start:end] - start)
+                nodes['feature'] = np.where(leaf, -2, self.feature[start:end])
+                nodes['threshold'] = np.where(leaf, -2.0, self.threshold[start:end])
+                tree = Tree(n_features, n_classes, 1)
+                tree.__setstate__({'max_depth': _depth(nodes, leaf),
+                                   'node_count': end - start,
+                                   'nodes': nodes,
+                                   'values': np.ascontiguousarray(
+                                       self.proba[start:end, np.newaxis, :])})
+                trees.append(tree)
+            self._compiled = (n_features, trees)
+        return self._compiled[1]
+
+    def apply(self, X):
+        """
+        Return the leaf of every tree for every sample, as an array of
+        shape (samples, trees), the sparse rows are read in place
+        """
+        if sp.issparse(X):
+            X = sp.csr_matrix(X, dtype=np.float32)
+            if not X.has_sorted_indices:
+                X = X.sorted_indices()
+        else:
+            X = np.ascontiguousarray(X, dtype=np.float32)
+        leaves = np.empty((X.shape[0], len(self.roots)), dtype=np.int64)
+        for column, (root, tree) in enumerate(zip(self.roots, self.compile(X.shape[1]))):
+            leaves[:, column] = tree.apply(X) + root
+        return leaves
+
+    def predict_proba(self, X):
+        leaves = self.apply(X)
+        result = np.zeros((leaves.shape[0], self.proba.shape[1]))
+        for column in range(leaves.shape[1]):
+            result += self.proba[leaves[:, column]]
+        return result / len(self.roots)
+
+    def predict(self, X):
+        return self.classes_.take(np.argmax(self.predict_proba(X), axis=1), axis=0)
+
+
+def _depth(nodes, leaf):
+    """
+    Return the depth of the tree of the nodes, the root is at 0
+    """
+    depth = 0
+    level = np.array([0])
+    while True:
+        level = level[~leaf[level]]
+        if len(level) == 0:
+            return depth
+        level = np.concatenate([nodes['left_child'][level], nodes['right_child'][level]])
+        depth += 1
@@ -0,0 +1,101 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+This module records the wall time and the volume of each stage of the
+recognition pipeline
+"""
+
+from __future__ import (absolute_import, division,
+                        print_function, unicode_literals)
+from builtins import *
+
+import heapq
+import json
+import time
+
+from collections import OrderedDict
+from contextlib import contextmanager
+
+clock = time.perf_counter
+
+
+class Instrument(object):
+    """
+    Accumulate the seconds spent in each stage and the counts of the items
+    passing through it. Give it to NCGOCR(instrument=...) to record the
+    train and process calls, nothing is recorded without it.
+
+    With top_n > 0 the time spent on each sentence is also kept to report
+    the top_n slowest sentences. The callback, if given, is called with the
+    stats after every train or process call.
+    """
+    def __init__(self, top_n=0, callback=None):
+        self.top_n = top_n
+        self.callback = callback
+        self.reset()
+
+    def reset(self):
+        self.timings = OrderedDict()
+        self.counts = OrderedDict()
+        self.calls = OrderedDict()
+        self.sentence_times = dict()
+
+    def add(self, stage, seconds):
+        self.timings[stage] = self.timings.get(stage, 0.0) + seconds
+
+    def count(self, name, n=1):
+        self.counts[name] = self.counts.get(name, 0) + n
+
+    @contextmanager
+    def stage(self, stage):
+        start = clock()
+        try:
+            yield
+        finally:
+            self.add(stage, clock() - start)
+
+    def sentence(self, sentence, seconds):
+        if self.top_n <= 0:
+            return
+        key = (sentence.docid, sentence.offset)
+        try:
+            self.sentence_times[key][0] += seconds
+        except KeyError:
+            self.sentence_times[key] = [seconds, sentence.original_text]
+
+    def slowest(self):
+        """
+        Return the top_n slowest sentences as (seconds, docid, offset, text)
+        """
+        items = ((seconds, key[0], key[1], text)
+                 for key, (seconds, text) in self.sentence_times.items())
+        return heapq.nlargest(self.top_n, items, key=lambda item: item[0])
+
+    def finish(self, call):
+        self.calls[call] = self.calls.get(call, 0) + 1
+        if self.callback is not None:
+            self.callback(self.stats())
+
+    def stats(self):
+        stats = OrderedDict([('calls', OrderedDict(self.calls)),
+                             ('timings', OrderedDict(self.timings)),
+                             ('counts', OrderedDict(self.counts))])
+        if self.top_n > 0:
+            stats['slowest'] = [OrderedDict(zip(('seconds', 'docid', 'offset', 'text'), item))
+                                for item in self.slowest()]
+        return stats
+
+    def to_json(self, filepath=None, **kwargs):
+        """
+        Return the stats as a JSON string, and write it if filepath is given
+        """
+        text = json.dumps(self.stats(), **kwargs)
+        if filepath is not None:
+            with open(filepath, 'w') as f:
+                f.write(text)
+        return text
+
+    def __repr__(self):
+        template = '{}<{:.3f}s in {} stages>'
+        return template.format(self.__class__.__name__,
+                               sum(self.timings.values()), len(self.timings))
@@ -5,13 +5,17 @@ from __future__ import (absolute_import, division,
                         print_function, unicode_literals)
 from builtins import *
 
-from collections import OrderedDict, defaultdict, ChainMap
+from collections import OrderedDict, defaultdict, ChainMap, namedtuple
 from intervaltree import Interval, IntervalTree
 import numpy as np
+import scipy.sparse as sp
+from sklearn.utils import murmurhash3_32
 
 from txttk.report import Report
 from txttk.corpus import Annotation
 
+from ncgocr.concept import Entity, Pattern
+
 """
 The measurements of features
 """
@@ -86,17 +90,175 @@ def bulk_measurements(candidates, godata):
     return result
 
 
+def hash_measurements(measurements, n_features=1024, alternate_sign=True):
+    """
+    Hash the measurements into a list of (index, value), exactly the way
+    sklearn.feature_extraction.FeatureHasher hashes a dict
+    """
+    result = []
+    for key, value in measurements.items():
+        if isinstance(value, str):
+            key = '{}={}'.format(key, value)
+            value = 1
+        value = float(value)
+        if value == 0:
+            continue
+        h = murmurhash3_32(key, seed=0)
+        if h == -2147483648:
+            index = (2147483647 - (n_features - 1)) % n_features
+        else:
+            index = abs(h) % n_features
+        if alternate_sign and h < 0:
+            value = -value
+        result.append((index, value))
+    return result
+
+
+CacheInfo = namedtuple('CacheInfo', 'hits misses maxsize currsize')
+
+class _BoundedCache(OrderedDict):
+    """
+    A least-recently-used mapping with hit and miss counters
+    """
+    def __init__(self, maxsize):
+        super(_BoundedCache, self).__init__()
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+
+    def lookup(self, key, compute):
+        try:
+            value = self[key]
+        except KeyError:
+            self.misses += 1
+            value = compute()
+            self[key] = value
+            if len(self) > self.maxsize:
+                self.popitem(last=False)
+            return value
+        self.hits += 1
+        self.move_to_end(key)
+        return value
+
+    def info(self):
+        return CacheInfo(self.hits, self.misses, self.maxsize, len(self))
+
+
+class MeasurementCache(object):
+    """
+    Memoize the hashed concept and bias measurements of the candidates.
+
+    The concept measurements only depend on the statement, and the bias
+    measurements only depend on the statement and which of its terms were
+    found, so both are hashed once and reused, while the evidence
+    measurements are hashed for every candidate.
+    """
+    def __init__(self, godata, n_features=1024, alternate_sign=True, maxsize=65536):
+        self.godata = godata
+        self.n_features = n_features
+        self.alternate_sign = alternate_sign
+        self.concept_cache = _BoundedCache(maxsize)
+        self.bias_cache = _BoundedCache(maxsize)
+
+    @classmethod
+    def from_hasher(cls, godata, hasher, maxsize=65536):
+        return cls(godata, hasher.n_features,
+                   getattr(hasher, 'alternate_sign', True), maxsize)
+
+    def _hash(self, measurements):
+        return hash_measurements(measurements, self.n_features, self.alternate_sign)
+
+    def concept_features(self, candidate):
+        statid = candidate.statement.statid
+        compute = lambda: self._hash(concept_measurements(candidate, self.godata))
+        return self.concept_cache.lookup(statid, compute)
+
+    def bias_features(self, candidate):
+        statement = candidate.statement
+        found_terms = {e.term for e in candidate.evidences}
+        mask = tuple(term in found_terms for term in statement.terms())
+        key = (statement.statid, mask, len(candidate.evidences))
+        compute = lambda: self._hash(bias_measurements(candidate))
+        return self.bias_cache.lookup(key, compute)
+
+    def features(self, candidate):
+        result = []
+        result.extend(self.concept_features(candidate))
+        result.extend(self._hash(evidence_measurements(candidate)))
+        result.extend(self.bias_features(candidate))
+        return result
+
+    def transform(self, candidates):
+        """
+        Return the same sparse matrix as FeatureHasher.transform over the
+        bulk_measurements of the candidates
+        """
+        indices = []
+        values = []
+        indptr = [0]
+        for candidate in candidates:
+            for index, value in self.features(candidate):
+                indices.append(index)
+                values.append(value)
+            indptr.append(len(indices))
+        X = sp.csr_matrix((np.array(values, dtype=np.float64),
+                           np.array(indices, dtype=np.int32),
+                           np.array(indptr, dtype=np.int32)),
+                          shape=(len(indptr) - 1, self.n_features))
+        X.sum_duplicates()
+        return X
+
+    def cache_info(self):
+        return {'concept': self.concept_cache.info(),
+                'bias': self.bias_cache.info()}
+
+    def hit_rate(self):
+        hits = self.concept_cache.hits + self.bias_cache.hits
+        total = hits + self.concept_cache.misses + self.bias_cache.misses
+        try:
+            return hits / total
+        except ZeroDivisionError:
+            return 0.0
+
+
 class LabelMarker(object):
     """
     Handeling the labels from given goldstandard
     """
     def __init__(self, goldstandard):
         self.goldstandard = goldstandard
-        forest = defaultdict(IntervalTree)
-        for pmid, goid, start, end, text in goldstandard:
-            t = forest[pmid]
-            t[start:end] = (goid, text)
-        self.forest = dict(forest)
+        self._forest = None
+        self._spans = None
+
+    @property
+    def forest(self):
+        if self._forest is None:
+            forest = defaultdict(IntervalTree)
+            for pmid, goid, start, end, text in self.goldstandard:
+                t = forest[pmid]
+                t[start:end] = (goid, text)
+            self._forest = dict(forest)
+        return self._forest
+
+    @property
+    def spans(self):
+        """
+        The gold spans grouped by (pmid, goid), as the sorted starts and the
+        running maximum of the ends
+        """
+        if self._spans is None:
+            grouped = defaultdict(list)
+            for pmid, goid, start, end, text in self.goldstandard:
+                if start < end:
+                    grouped[(pmid, goid)].append((start, end))
+            spans = dict()
+            for key, pairs in grouped.items():
+                pairs.sort()
+                starts = np.array([start for start, end in pairs], dtype=np.int64)
+                ends = np.array([end for start, end in pairs], dtype=np.int64)
+                spans[key] = (starts, np.maximum.accumulate(ends))
+            self._spans = spans
+        return self._spans
 
     def mark(self, candidate):
         pmid = candidate.sentence.docid
@@ -108,6 +270,8 @@ class LabelMarker(object):
         start = min(starts)
         end = max(ends)
         span = (start, end)
+        if pmid not in self.forest:
+            return 0
         gold_goids = {iv.data[0] for iv in self.forest[pmid][slice(*span)]}
         if goid in gold_goids:
             return 1
@@ -119,24 +283,257 @@ class LabelMarker(object):
             labels.append(self.mark(candidate))
         return labels
 
+    def batch_mark(self, candidates):
+        """
+        Label the candidates in batch, the result is the same as markall.
+
+        A candidate is positive if any gold span of the same document and
+        GO id overlaps it. Because the gold starts are sorted, the spans
+        starting before the end of the candidate are a prefix, and they
+        overlap the candidate if the farthest end of the prefix passes the
+        start of the candidate.
+        """
+        size = len(candidates)
+        labels = np.zeros(size, dtype=int)
+        starts = np.empty(size, dtype=np.int64)
+        ends = np.empty(size, dtype=np.int64)
+        groups = defaultdict(list)
+        for i, candidate in enumerate(candidates):
+            goid = candidate.statement.statid.partition('%')[0]
+            groups[(candidate.sentence.docid, goid)].append(i)
+            starts[i] = min([e.start for e in candidate.evidences])
+            ends[i] = max([e.end for e in candidate.evidences])
+
+        spans = self.spans
+        for key, indices in groups.items():
+            if key not in spans:
+                continue
+            gold_starts, gold_reaches = spans[key]
+            indices = np.array(indices)
+            start, end = starts[indices], ends[indices]
+            position = np.searchsorted(gold_starts, end, side='left')
+            reach = gold_reaches[np.maximum(position - 1, 0)]
+            labels[indices] = (position > 0) & (reach > start) & (start < end)
+        return labels
+
     def process(self, candidates):
-        return np.array(self.markall(candidates))
+        return self.batch_mark(candidates)
+
+
+def saturation(candidate):
+    return len(candidate.evidences) / len(candidate.statement.evidences)
+
+
+class Cascade(object):
+    """
+    Resolve the trivially decidable candidates before the classifier.
+
+    Two rules are learned from the training candidates, each of them is
+    only used if it reaches the given precision on the training data:
+    accept the exact matches of a single entity from the basic index, and
+    reject the candidates made only of patterns whose saturation is not
+    greater than a learned threshold.
+    """
+    ACCEPT = 1
+    REJECT = 0
+    UNDECIDED = -1
+
+    def __init__(self, precision=0.95, min_support=10, boost_refs=('boost', 'boost2')):
+        self.precision = precision
+        self.min_support = min_support
+        self.boost_refs = set(boost_refs)
+        self.use_accept = False
+        self.reject_below = None
+        self.stats = dict()
+
+    def is_exact(self, candidate):
+        evidences = candidate.evidences
+        if len(evidences) != 1 or len(candidate.statement.evidences) != 1:
+            return False
+        term = evidences[0].term
+        return isinstance(term, Entity) and term.ref not in self.boost_refs
+
+    def is_pattern_only(self, candidate):
+        return all([isinstance(e.term, Pattern) for e in candidate.evidences])
+
+    def fit(self, candidates, y):
+        y = np.asarray(y)
+        exact = np.array([self.is_exact(c) for c in candidates], dtype=bool)
+        accept_support = int(exact.sum())
+        accept_precision = y[exact].mean() if accept_support > 0 else 0.0
+        self.use_accept = all([accept_support >= self.min_support,
+                               accept_precision >= self.precision])
+
+        self.reject_below = None
+        pattern_only = [(saturation(c), label) for c, label
+                        in zip(candidates, y) if self.is_pattern_only(c)]
+        pattern_only.sort(key=lambda item: item[0])
+        negatives = 0
+        for i, (value, label) in enumerate(pattern_only):
+            negatives += (label == 0)
+            support = i + 1
+            if i + 1 < len(pattern_only) and pattern_only[i+1][0] == value:
+                continue
+            if negatives / support < self.precision:
+                break
+            if support >= self.min_support:
+                self.reject_below = value
+
+        self.stats = OrderedDict([('accept_support', accept_support),
+                                  ('accept_precision', float(accept_precision)),
+                                  ('use_accept', self.use_accept),
+                                  ('reject_below', self.reject_below)])
+        return self
+
+    def decide(self, candidates):
+        """
+        Return an array of ACCEPT, REJECT or UNDECIDED for the candidates
+        """
+        result = np.full(len(candidates), self.UNDECIDED, dtype=int)
+        for i, candidate in enumerate(candidates):
+            if self.use_accept and self.is_exact(candidate):
+                result[i] = self.ACCEPT
+            elif (self.reject_below is not None and
+                  self.is_pattern_only(candidate) and
+                  saturation(candidate) <= self.reject_below):
+                result[i] = self.REJECT
+        return result
+
+    def effect(self, decisions, y_forest, y_true):
+        """
+        Compare the candidate-level precision and recall of the forest
+        alone with the forest behind the cascade
+        """
+        decided = decisions != self.UNDECIDED
+        y_cascade = np.where(decided, decisions, y_forest)
+        y_true = np.asarray(y_true)
+
+        def _pr(y_pred):
+            tp = int(((y_pred == 1) & (y_true == 1)).sum())
+            try:
+                precision = tp / int((y_pred == 1).sum())
+            except ZeroDivisionError:
+                precision = 0.0
+            try:
+                recall = tp / int((y_true == 1).sum())
+            except ZeroDivisionError:
+                recall = 0.0
+            return precision, recall
 
+        forest_p, forest_r = _pr(np.asarray(y_forest))
+        cascade_p, cascade_r = _pr(y_cascade)
+        bypass = decided.mean() if len(decisions) > 0 else 0.0
+        return OrderedDict([('bypass', float(bypass)),
+                            ('forest_precision', forest_p),
+                            ('forest_recall', forest_r),
+                            ('cascade_precision', cascade_p),
+                            ('cascade_recall', cascade_r)])
+
+
+class NegativeSampler(object):
+    """
+    Subsample the negative training candidates before they are featurized.
+
+    In each stratum, the candidates of a statement or of a namespace, or
+    all of them with stratify=None, ratio of the negatives are kept, at
+    least one, and weighted so that they stand for the negatives left out.
+    With hard_negatives=True, the negatives left out which the first
+    classifier accepts are added back for a second fit.
+    """
+    STRATIFY = ('statement', 'namespace', None)
+
+    def __init__(self, ratio=0.1, stratify='statement', hard_negatives=False,
+                 reweight=True, seed=0):
+        if not 0 < ratio <= 1:
+            raise ValueError('The ratio must be in (0, 1], got {}'.format(ratio))
+        if stratify not in self.STRATIFY:
+            raise ValueError('Unknown stratify: {}'.format(stratify))
+        self.ratio = ratio
+        self.stratify = stratify
+        self.hard_negatives = hard_negatives
+        self.reweight = reweight
+        self.seed = seed
+        self.stats = dict()
+        self._strata = None
+
+    def stratum(self, candidate, godata):
+        if self.stratify is None:
+            return None
+        statid = candidate.statement.statid
+        if self.stratify == 'statement':
+            return statid
+        return godata[statid.partition('%')[0]].namespace
+
+    def sample(self, candidates, y, godata):
+        """
+        Return the sorted indices of the kept candidates, which are the
+        positives and the sampled negatives, and of the negatives left out
+        """
+        y = np.asarray(y)
+        rng = np.random.RandomState(self.seed)
+        strata = OrderedDict()
+        for i in np.flatnonzero(y == 0):
+            strata.setdefault(self.stratum(candidates[i], godata), []).append(i)
+        codes = np.full(len(y), -1, dtype=np.int64)
+        sampled = []
+        for code, members in enumerate(strata.values()):
+            codes[members] = code
+            size = max(1, int(np.ceil(self.ratio * len(members))))
+            sampled.extend(rng.choice(members, size, replace=False))
+        mask = y != 0
+        mask[np.asarray(sampled, dtype=np.int64)] = True
+        self._strata = codes
+        self.stats = OrderedDict([('candidates', len(y)),
+                                  ('negatives', int(np.sum(codes >= 0))),
+                                  ('strata', len(strata)),
+                                  ('sampled', len(sampled)),
+                                  ('hard', 0)])
+        return np.flatnonzero(mask), np.flatnonzero(~mask)
+
+    def weights(self, y, kept, hard=()):
+        """
+        Return the sample weights of the kept and the hard candidates: one
+        for the positives and the hard negatives, and for the sampled
+        negatives of a stratum, the negatives of the stratum which are not
+        hard divided by the sampled ones; None without reweight
+        """
+        hard = np.asarray(hard, dtype=np.int64)
+        self.stats['hard'] = len(hard)
+        if not self.reweight:
+            return None
+        codes = self._strata
+        n_strata = max(0, int(codes.max()) + 1) if len(codes) else 0
+        negative = np.asarray(y)[kept] == 0
+        sampled = kept[negative]
+        total = np.bincount(codes[codes >= 0], minlength=n_strata)
+        picked = np.bincount(codes[sampled], minlength=n_strata)
+        found = np.bincount(codes[hard], minlength=n_strata)
+        scale = (total - found) / np.maximum(picked, 1)
+        weights = np.ones(len(kept) + len(hard))
+        weights[np.flatnonzero(negative)] = scale[codes[sampled]]
+        return weights
+
+
+def candidate_annotation(candidate):
+    """
+    Return the (pmid, goid, start, end, text) annotated by the candidate
+    """
+    pmid = candidate.sentence.docid
+    statid = candidate.statement.statid
+    goid = statid.partition('%')[0]
+    start = min([e.start for e in candidate.evidences])
+    end = max([e.end for e in candidate.evidences])
+    raw_start = start - candidate.sentence.offset
+    raw_end = end - candidate.sentence.offset
+    text = candidate.sentence.text[raw_start:raw_end]
+    return (pmid, goid, start, end, text)
 
 def recover(candidates, y):
     result = Annotation()
     for candidate, label in zip(candidates, y):
         if label == 0:
             continue
-        pmid = candidate.sentence.docid
-        statid = candidate.statement.statid
-        goid = statid.partition('%')[0]
-        start = min([e.start for e in candidate.evidences])
-        end = max([e.end for e in candidate.evidences])
-        raw_start = start - candidate.sentence.offset
-        raw_end = end - candidate.sentence.offset
-        text = candidate.sentence.text[raw_start:raw_end]
-        result.add((pmid, goid, start, end, text))
+        result.add(candidate_annotation(candidate))
     return result
 
 
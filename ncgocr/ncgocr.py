@@ -4,123 +4,736 @@
 from __future__ import (absolute_import, division,
                         print_function, unicode_literals)
 from builtins import *
-import logging
+import gc
+import hashlib
+import itertools
+import time
 
-import argparse
+from collections import OrderedDict
 
-from txttk.corpus import Corpus
+import joblib
+from acora import AcoraBuilder
+import numpy as np
+import scipy.sparse as sp
+
+from txttk.corpus import Corpus, Sentence, Annotation
+from txttk.nlptools import sent_tokenize, count_start
 from ncgocr.pattern_regex import regex_out
-from ncgocr.concept import GoData, Index, Entity, Evidence, Statement
+from ncgocr.concept import GoData, Index, Entity, Pattern, Evidence, Statement
 from ncgocr.extractor import SoftExtractor, SolidExtractor, JoinExtractor, CandidateReconizer
-from ncgocr.learning import bulk_measurements, LabelMarker, recover, evaluate
+from ncgocr.learning import (bulk_measurements, LabelMarker, MeasurementCache,
+                             Cascade, recover, evaluate)
+from ncgocr.cache import fingerprint
+from ncgocr.forest import FlatForest
+from ncgocr.backends import get_backend
 
-from sklearn.feature_extraction import FeatureHasher
 from sklearn.ensemble import RandomForestClassifier
 
+BUNDLE_FORMAT = 'ncgocr-bundle'
+BUNDLE_VERSION = 2
+
+# the approximate bytes of a buffered candidate with its measurements and
+# sparse features, the dense feature row is counted apart
+CANDIDATE_BYTES = 2048
+
+# the bytes taken by the classification of a chunk besides its rows, as
+# measured with tracemalloc on the forest
+CLASSIFY_BYTES = 2**18
+
+_sent_toker = count_start(sent_tokenize)
+
+def _update_classifier(digest, classifier):
+    """
+    Update the digest with the parameters and the fitted arrays of the
+    classifier, which, unlike its pickle, are the same in every process
+    """
+    if hasattr(classifier, 'get_params'):
+        params = [(name, value if isinstance(value, (str, int, float, type(None)))
+                   else type(value).__name__)
+                  for name, value in sorted(classifier.get_params().items())]
+        digest.update(repr(params).encode('utf-8'))
+    if isinstance(classifier, RandomForestClassifier) and hasattr(classifier, 'estimators_'):
+        classifier = FlatForest.from_classifier(classifier)
+    if isinstance(classifier, FlatForest):
+        arrays = classifier.to_arrays()
+    else:
+        arrays = {name: value for name, value in vars(classifier).items()
+                  if name.endswith('_') and isinstance(value, np.ndarray)}
+        for i, predictors in enumerate(getattr(classifier, '_predictors', [])):
+            for j, predictor in enumerate(predictors):
+                arrays['_predictors{}_{}'.format(i, j)] = predictor.nodes
+    for name in sorted(arrays):
+        array = np.ascontiguousarray(arrays[name])
+        digest.update('{}{}{}'.format(name, array.dtype.str, array.shape).encode('utf-8'))
+        digest.update(array.tobytes())
+
 class NCGOCR(object):
-    def __init__(self, godata, measure=bulk_measurements, use_boost=True, n=10):
+    def __init__(self, godata, measure=bulk_measurements, use_boost=True, n=10,
+                 cache_size=None, cascade=None, candidate_cache=None, n_features=1024,
+                 instrument=None, memory_budget=None, result_cache=None, longest_match=(),
+                 sampler=None, flat_forest=False, backend=None):
         self.godata = godata
         self.basic_Ie = godata.get_Ie()
         self.basic_Im = godata.get_Im()
         self.e0 = SolidExtractor(self.basic_Ie)
         self.e1 = SoftExtractor(regex_out)
         self.measure = measure
-        self.vectorizer = FeatureHasher(n_features=1024)
-        self.classifier = RandomForestClassifier(n_estimators=n, n_jobs=-1)
+        self.backend = get_backend(backend)
+        self.vectorizer = self.backend.vectorizer(n_features)
+        self.classifier = self.backend.classifier(n)
+        params = self.classifier.get_params()
+        if cascade is not None and params.get('bootstrap') and 'oob_score' in params:
+            # the effect of the cascade is measured on the out-of-bag votes
+            self.classifier.set_params(oob_score=True)
         self.use_boost = use_boost
         self.boost_Ie = Index()
         self.boost_Im = Index()
+        self.goid2terms = None
+        self.cascade = cascade
+        self.candidate_cache = candidate_cache
+        self.instrument = instrument
+        self.memory_budget = memory_budget
+        self.memory_stats = None
+        self.reprocess_stats = None
+        self.result_cache = result_cache
+        self.longest_match = tuple(longest_match)
+        self.sampler = sampler
+        self.flat_forest = flat_forest
+        self._engine = None
+        self._fingerprint = None
+        self.training_X = None
+        self.training_y = None
+        self.training_w = None
+        self._sentence_buffer = []
+        self.measurement_cache = None
+        if cache_size and measure is bulk_measurements:
+            self.measurement_cache = MeasurementCache.from_hasher(godata,
+                                                                  self.vectorizer,
+                                                                  cache_size)
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state.pop('load_time', None)
+        state.pop('_sentence_buffer', None)
+        state.pop('_engine', None)
+        state.pop('_fingerprint', None)
+        # the automata are rebuilt by __setstate__, which is faster and
+        # takes less memory than unpickling them
+        state['built'] = 'extractor' in state
+        for name in ['e0', 'e2', 'extractor']:
+            state.pop(name, None)
+        state['instrument'] = None
+        state['result_cache'] = None
+        cache = state.pop('measurement_cache')
+        state['cache_size'] = None if cache is None else cache.concept_cache.maxsize
+        return state
 
-    def boost(self, training_gold):
+    def __setstate__(self, state):
+        state = dict(state)
+        cache_size = state.pop('cache_size')
+        built = state.pop('built')
+        self.__dict__.update(state)
+        self._sentence_buffer = []
+        self._engine = None
+        self._fingerprint = None
+        if self.basic_Ie is not None:
+            self.e0 = SolidExtractor(self.basic_Ie)
+            if built:
+                self.e2 = SolidExtractor(self.boost_Ie)
+                self.extractor = self.join_extractors()
+        self.measurement_cache = None
+        if cache_size:
+            self.measurement_cache = MeasurementCache.from_hasher(self.godata,
+                                                                  self.vectorizer,
+                                                                  cache_size)
+
+    def save(self, filepath):
+        """
+        Save the model into one versioned bundle, including the GO data,
+        the basic and boost indexes, the hasher and the forest, the forest
+        arrays are stored uncompressed so that they can be memory-mapped
+        by load. The Acora automata are rebuilt from the indexes by load.
+        """
+        bundle = {'format': BUNDLE_FORMAT,
+                  'version': BUNDLE_VERSION,
+                  'model': self}
+        joblib.dump(bundle, filepath)
+
+    @classmethod
+    def load(cls, filepath, mmap_mode='r'):
+        """
+        Load a model saved by save, the time spent is kept in load_time
+        """
+        start = time.time()
+        bundle = joblib.load(filepath, mmap_mode=mmap_mode)
+        if not isinstance(bundle, dict) or bundle.get('format') != BUNDLE_FORMAT:
+            raise ValueError('{} is not an NCGOCR bundle'.format(filepath))
+        if bundle['version'] != BUNDLE_VERSION:
+            template = 'Unsupported bundle version {} (expected {})'
+            raise ValueError(template.format(bundle['version'], BUNDLE_VERSION))
+        ncgocr = bundle['model']
+        ncgocr.load_time = time.time() - start
+        return ncgocr
+
+    def boost(self, training_gold, boost_Ie=None, boost_Im=None):
+        """
+        Add the gold texts into the boost indexes, which are self.boost_Ie
+        and self.boost_Im unless other indexes are given.
+
+        Each (goid, text) pair is boosted once: the text is linked to the
+        terms of the single-evidence statements of the concept, and a
+        one-word text also becomes a boost entity with its own statement.
+        Return the counts of the gold rows, the pairs and the added entries
+        """
+        if boost_Ie is None:
+            boost_Ie = self.boost_Ie
+        if boost_Im is None:
+            boost_Im = self.boost_Im
+        if self.goid2terms is None:
+            self.goid2terms = self.godata.get_goid2terms()
+
+        rows = 0
+        pairs = set()
         for pmid, goid, start, end, text in training_gold:
-            for statement in self.godata[goid].statements:
-                if len(statement.evidences) == 1:
-                    term = statement.evidences[0].term
-                    lemma = term.lemma
-                    if text!=lemma:
-                        self.boost_Ie[text].add(term)
-            else:
-                if ' ' not in text:
-                    cm = Entity(text, 'boost')
-                    null = Entity('NULL#' + goid, 'boost')
-                    evidences = [Evidence(null, '', 0, 0), Evidence(cm, text, 0, len(text))]
-                    new_statement = Statement('%'.join([goid, text]), evidences)
-                    self.boost_Ie[text].add(cm)
-                    self.boost_Im[cm].add(new_statement)
-
-    def train(self, training_corpus, training_gold):
+            rows += 1
+            pairs.add((goid, text))
+
+        Ie_size = sum(len(terms) for terms in boost_Ie.values())
+        Im_size = sum(len(statements) for statements in boost_Im.values())
+        entities = dict()
+        nulls = dict()
+        for goid, text in pairs:
+            for term in self.goid2terms[goid]:
+                if text != term.lemma:
+                    boost_Ie[text].add(term)
+            if ' ' not in text:
+                try:
+                    cm = entities[text]
+                except KeyError:
+                    cm = entities[text] = Entity(text, 'boost')
+                try:
+                    null = nulls[goid]
+                except KeyError:
+                    null = nulls[goid] = Entity('NULL#' + goid, 'boost')
+                evidences = [Evidence(null, '', 0, 0), Evidence(cm, text, 0, len(text))]
+                new_statement = Statement('%'.join([goid, text]), evidences)
+                boost_Ie[text].add(cm)
+                boost_Im[cm].add(new_statement)
+
+        return OrderedDict([
+            ('rows', rows),
+            ('pairs', len(pairs)),
+            ('Ie', sum(len(terms) for terms in boost_Ie.values()) - Ie_size),
+            ('Im', sum(len(statements) for statements in boost_Im.values()) - Im_size)])
+
+    def sparse_featurize(self, candidates):
+        instrument = self.instrument
+        if instrument is None:
+            if self.measurement_cache is not None:
+                return self.measurement_cache.transform(candidates)
+            measurements = self.measure(candidates, self.godata)
+            return self.vectorizer.transform(measurements)
+
+        if self.measurement_cache is not None:
+            with instrument.stage('featurize'):
+                X = self.measurement_cache.transform(candidates)
+        else:
+            with instrument.stage('measure'):
+                measurements = self.measure(candidates, self.godata)
+            with instrument.stage('hash'):
+                X = self.vectorizer.transform(measurements)
+        instrument.count('nonzeros', X.nnz)
+        return X
+
+    def featurize(self, candidates):
+        return self.sparse_featurize(candidates).toarray()
+
+    def join_extractors(self):
+        return JoinExtractor([self.e0, self.e1, self.e2], ['basic', 'pattern', 'boost'],
+                             self.longest_match)
+
+    def build(self, training_gold):
+        """
+        Boost the indexes with the training gold, and build the extractor
+        and the candidate recognizer
+        """
         if self.use_boost:
             self.boost(training_gold)
         self.e2 = SolidExtractor(self.boost_Ie)
-        self.extractor = JoinExtractor([self.e0, self.e1, self.e2])
+        self.extractor = self.join_extractors()
         self.candidate_recognizer = CandidateReconizer(self.basic_Im + self.boost_Im)
+        self._fingerprint = None
 
-        label_marker = LabelMarker(training_gold)
-        training_grounds = self.extractor.process(training_corpus)
-        training_candidates = self.candidate_recognizer.process(training_grounds)
-        training_measurements = self.measure(training_candidates, self.godata)
+    def add_gold(self, annotations, corpus=None):
+        """
+        Boost the model with new gold annotations without rebuilding the
+        basic indexes: the boost indexes and the index of the candidate
+        recognizer are patched, and only the small boost automaton is
+        rebuilt, if new texts are boosted.
+
+        If the corpus of the new annotations is given and the model was
+        trained with keep_features=True, the classifier is refitted on the
+        kept features plus the features of the new corpus.
+
+        Return the counts of the changes, with the changed keys of the
+        boost indexes in Ie_keys and Im_keys, for reprocess
+        """
+        if corpus is not None and self.training_X is None:
+            raise ValueError('The model was not trained with keep_features=True')
+        self._fingerprint = None
+        delta_Ie = Index()
+        delta_Im = Index()
+        if self.use_boost:
+            self.boost(annotations, delta_Ie, delta_Im)
+
+        new_texts = 0
+        for text, terms in delta_Ie.items():
+            if text not in self.boost_Ie:
+                new_texts += 1
+            self.boost_Ie[text] |= terms
+
+        Im = self.candidate_recognizer.Im
+        new_statements = 0
+        for term, statements in delta_Im.items():
+            new_statements += len(statements - self.boost_Im.get(term, set()))
+            self.boost_Im[term] |= statements
+            Im[term] = Im.get(term, set()) | statements
+
+        if new_texts > 0:
+            self.e2 = SolidExtractor(self.boost_Ie)
+            self.extractor = self.join_extractors()
 
-        training_X = self.vectorizer.fit_transform(training_measurements).toarray()
+        counts = OrderedDict([('texts', new_texts),
+                              ('statements', new_statements),
+                              ('refitted', 0),
+                              ('Ie_keys', set(delta_Ie)),
+                              ('Im_keys', set(delta_Im))])
+        if corpus is not None:
+            candidates = self.candidate_recognizer.process(self.extractor.process(corpus))
+            X = self.sparse_featurize(candidates)
+            y = LabelMarker(annotations).process(candidates)
+            self.training_X = sp.vstack([self.training_X, X], format='csr')
+            self.training_y = np.concatenate([self.training_y, y])
+            if self.training_w is not None:
+                self.training_w = np.concatenate([self.training_w, np.ones(len(y))])
+            self._fit(self._features(self.training_X), self.training_y, self.training_w)
+            counts['refitted'] = self.training_X.shape[0]
+        return counts
+
+    def train(self, training_corpus, training_gold, keep_features=False):
+        """
+        Train the model, with keep_features=True the sparse training
+        features are kept for refitting in add_gold. With a sampler, only
+        the positives and the sampled negatives are featurized and fitted.
+        """
+        self.build(training_gold)
+
+        instrument = self.instrument
+        label_marker = LabelMarker(training_gold)
+        if self.candidate_cache is None:
+            training_grounds = self.extractor.process(training_corpus, instrument)
+            training_candidates = self.candidate_recognizer.process(training_grounds, instrument)
+        else:
+            training_grounds, training_candidates = self.candidate_cache.process(
+                training_corpus, self.extractor, self.candidate_recognizer,
+                [self.basic_Ie, self.boost_Ie], regex_out, instrument)
         training_y = label_marker.process(training_candidates)
+        self.fit_candidates(training_candidates, training_y, keep_features)
+        if instrument is not None:
+            instrument.finish('train')
+
+    def fit_candidates(self, training_candidates, training_y, keep_features=False):
+        """
+        Fit the classifier, and the cascade if any, on the labeled
+        candidates of a built model, as train does after the extraction
+        """
+        instrument = self.instrument
+        if self.sampler is None:
+            rows = None
+            training_X = self.sparse_featurize(training_candidates)
+            training_w = None
+            self._fit(self._features(training_X), training_y)
+        else:
+            rows, training_X, training_w = self._fit_sampled(training_candidates, training_y)
+        fitted_y = training_y if rows is None else training_y[rows]
+        if keep_features:
+            self.training_X = training_X
+            self.training_y = fitted_y
+            self.training_w = training_w
+        if instrument is not None:
+            instrument.count('positive_labels', int(np.sum(training_y)))
+
+        if self.cascade is not None:
+            self.cascade.fit(training_candidates, training_y)
+            if rows is not None:
+                training_candidates = [training_candidates[i] for i in rows]
+            decisions = self.cascade.decide(training_candidates)
+            held, forest_y = self._held_out_predict(training_X, fitted_y, training_w)
+            self.cascade.stats.update(self.cascade.effect(decisions[held], forest_y,
+                                                          np.asarray(fitted_y)[held]))
+            self.cascade.stats['held_out'] = int(held.sum())
+            self.cascade.stats['processed'] = 0
+            self.cascade.stats['bypassed'] = 0
+        self._fingerprint = None
 
-        self.classifier.fit(training_X, training_y)
+    def _held_out_predict(self, X, y, sample_weight=None, k=3):
+        """
+        Predict the fitted rows without their own labels, from the out-of-bag
+        votes of a forest fitted with oob_score=True, otherwise from the
+        classifiers fitted on the other folds of k stratified folds.
+
+        Return the mask of the predicted rows and their predictions, the
+        rows out of no bag are left out
+        """
+        from sklearn.base import clone
+        from sklearn.model_selection import StratifiedKFold
 
-    def process(self, testing_corpus, testing_gold=None):
-        testing_grounds = self.extractor.process(testing_corpus)
-        testing_candidates = self.candidate_recognizer.process(testing_grounds)
-        testing_measurements = self.measure(testing_candidates, self.godata)
-        testing_X = self.vectorizer.transform(testing_measurements).toarray()
-        system_y = self.classifier.predict(testing_X)
+        y = np.asarray(y)
+        votes = getattr(self.classifier, 'oob_decision_function_', None)
+        if votes is not None:
+            held = ~np.isnan(votes).any(axis=1)
+            return held, self.classifier.classes_[votes[held].argmax(axis=1)]
+
+        held = np.zeros(len(y), dtype=bool)
+        y_pred = np.zeros(len(y), dtype=y.dtype)
+        k = min(k, np.bincount(y.astype(int), minlength=2).min())
+        if k < 2:
+            return held, y_pred[held]
+        folds = StratifiedKFold(n_splits=k, shuffle=True, random_state=0)
+        for train, test in folds.split(np.zeros(len(y)), y):
+            classifier = clone(self.classifier)
+            kwargs = {} if sample_weight is None else {'sample_weight': sample_weight[train]}
+            classifier.fit(self._features(X[train]), y[train], **kwargs)
+            y_pred[test] = classifier.predict(self._features(X[test]))
+            held[test] = True
+        return held, y_pred[held]
+
+    def _features(self, X):
+        """
+        Return the sparse features as the classifier of the backend takes them
+        """
+        if self.backend.dense and sp.issparse(X):
+            return X.toarray()
+        return X
+
+    def _fit(self, X, y, sample_weight=None):
+        self._engine = None
+        # the sample weights are only passed when there are some, so that
+        # the classifiers without them in fit still train unsampled
+        kwargs = {} if sample_weight is None else {'sample_weight': sample_weight}
+        if self.instrument is None:
+            self.classifier.fit(X, y, **kwargs)
+        else:
+            with self.instrument.stage('fit'):
+                self.classifier.fit(X, y, **kwargs)
+
+    def _fit_sampled(self, candidates, y):
+        """
+        Fit the classifier on the positives and the sampled negatives,
+        then, for hard negative mining, featurize the negatives left out
+        and fit again with the ones the first classifier accepts.
+
+        Return the indices of the fitted candidates, their sparse features
+        and their sample weights
+        """
+        sampler = self.sampler
+        instrument = self.instrument
+        if instrument is None:
+            kept, left_out = sampler.sample(candidates, y, self.godata)
+        else:
+            with instrument.stage('sample'):
+                kept, left_out = sampler.sample(candidates, y, self.godata)
+        X = self.sparse_featurize([candidates[i] for i in kept])
+        weights = sampler.weights(y, kept)
+        self._fit(self._features(X), y[kept], weights)
+        rows = kept
+
+        if sampler.hard_negatives and len(left_out) > 0:
+            left_X = self.sparse_featurize([candidates[i] for i in left_out])
+            accepted = np.flatnonzero(self.classify(left_X) == 1)
+            if len(accepted) > 0:
+                hard = left_out[accepted]
+                rows = np.concatenate([kept, hard])
+                X = sp.vstack([X, left_X[accepted]], format='csr')
+                weights = sampler.weights(y, kept, hard)
+                self._fit(self._features(X), y[rows], weights)
+        if instrument is not None:
+            instrument.count('sampled_negatives', sampler.stats['sampled'])
+            instrument.count('hard_negatives', sampler.stats['hard'])
+        return rows, X, weights
+
+    def engine(self):
+        """
+        Return the FlatForest of the classifier if flat_forest is set,
+        it is flattened once after each fit
+        """
+        if not self.flat_forest or not isinstance(self.classifier, (RandomForestClassifier,
+                                                                     FlatForest)):
+            return None
+        if self._engine is None:
+            if isinstance(self.classifier, FlatForest):
+                self._engine = self.classifier
+            else:
+                self._engine = FlatForest.from_classifier(self.classifier)
+        return self._engine
+
+    def classify(self, X):
+        """
+        Return the labels of the sparse features, the FlatForest engine
+        reads them in place, the classifier gets them dense
+        """
+        classifier = self.engine()
+        if classifier is None:
+            classifier = self.classifier
+            X = self._features(X)
+        if self.instrument is None:
+            return classifier.predict(X)
+        with self.instrument.stage('classify'):
+            return classifier.predict(X)
+
+    def predict(self, candidates):
+        """
+        Return the predicted labels of the candidates, the candidates
+        resolved by the cascade skip the classifier
+        """
+        y = np.zeros(len(candidates), dtype=int)
+        if len(candidates) == 0:
+            return y
+        if self.cascade is None:
+            return self.classify(self.sparse_featurize(candidates))
+
+        decisions = self.cascade.decide(candidates)
+        undecided = np.flatnonzero(decisions == Cascade.UNDECIDED)
+        y[:] = decisions
+        if len(undecided) > 0:
+            X = self.sparse_featurize([candidates[i] for i in undecided])
+            y[undecided] = self.classify(X)
+        self.cascade.stats['processed'] += len(candidates)
+        self.cascade.stats['bypassed'] += len(candidates) - len(undecided)
+        return y
+
+    def fingerprint(self):
+        """
+        Return the hex digest of everything the results depend on: the
+        indexes, the pattern regex, the features and the classifiers
+        """
+        if self._fingerprint is None:
+            digest = hashlib.sha1()
+            digest.update(fingerprint([], [self.basic_Ie, self.boost_Ie],
+                                      self.candidate_recognizer.Im, regex_out).encode('utf-8'))
+            digest.update(repr((self.measure.__name__,
+                                self.vectorizer.n_features,
+                                sorted(self.longest_match))).encode('utf-8'))
+            _update_classifier(digest, self.classifier)
+            if self.cascade is not None:
+                cascade = self.cascade
+                digest.update(repr((cascade.use_accept, cascade.reject_below,
+                                    sorted(cascade.boost_refs))).encode('utf-8'))
+            self._fingerprint = digest.hexdigest()
+        return self._fingerprint
+
+    def process(self, testing_corpus, testing_gold=None, batch_size=64):
+        """
+        Annotate the corpus. A source with batches, like DirectorySource, is
+        processed batch_size documents at a time with process_batches, so
+        that the grounds of one batch only are held
+        """
+        if hasattr(testing_corpus, 'batches'):
+            system_results = Annotation()
+            for batch, results in self.process_batches(testing_corpus.batches(batch_size)):
+                system_results.update(results)
+            return system_results
+        if self.result_cache is not None:
+            return self._process_cached(testing_corpus)
+        return self._process(testing_corpus)
+
+    def process_batches(self, batches):
+        """
+        Yield (batch, results) for every Corpus of the batches as soon as it
+        is annotated
+        """
+        for batch in batches:
+            yield batch, self.process(batch)
+
+    def _process_cached(self, testing_corpus):
+        """
+        Look up the sentences in the result cache and process only the
+        missing ones, each distinct text once, with the sentences keyed by
+        their position and offset 0 so that the results are relative
+        """
+        cache = self.result_cache
+        model_fingerprint = self.fingerprint()
+        sentences = list(testing_corpus)
+        keys = [cache.key(model_fingerprint, sentence.text) for sentence in sentences]
+        found = dict()
+        missing = []
+        for i, key in enumerate(keys):
+            if key in found:
+                continue
+            rows = cache.get(key)
+            if rows is None:
+                found[key] = []
+                missing.append(Sentence(sentences[i].original_text, 0, len(missing)))
+            else:
+                found[key] = rows
+
+        if missing:
+            missing_keys = [cache.key(model_fingerprint, sentence.text) for sentence in missing]
+            for i, goid, start, end, text in self._process(missing):
+                found[missing_keys[i]].append((goid, start, end, text))
+            for key in missing_keys:
+                cache.put(key, found[key])
+
+        system_results = Annotation()
+        for sentence, key in zip(sentences, keys):
+            offset = sentence.offset
+            for goid, start, end, text in found[key]:
+                system_results.add((sentence.docid, goid, start + offset, end + offset, text))
+        return system_results
+
+    def _process(self, testing_corpus):
+        if self.memory_budget is not None:
+            return self._process_bounded(testing_corpus)
+        instrument = self.instrument
+        testing_grounds = self.extractor.process(testing_corpus, instrument)
+        testing_candidates = self.candidate_recognizer.process(testing_grounds, instrument)
+        system_y = self.predict(testing_candidates)
         system_results = recover(testing_candidates, system_y)
+        if instrument is not None:
+            instrument.count('positives', int(np.sum(system_y)))
+            instrument.finish('process')
         return system_results
 
+    def affected_documents(self, corpus, changed_Ie=(), changed_Im=()):
+        """
+        Return the docids of the corpus whose sentences contain a changed
+        text of the term indexes, or a text of a term whose statements
+        changed. The texts are scanned with one automaton built from the
+        changed texts only, the changed patterns with the pattern regex.
+        """
+        changed_Im = set(changed_Im)
+        texts = set(changed_Ie)
+        if changed_Im:
+            for Ie in (self.basic_Ie, self.boost_Ie):
+                for text, terms in Ie.items():
+                    if not changed_Im.isdisjoint(terms):
+                        texts.add(text)
+        patterns = {term for term in changed_Im if isinstance(term, Pattern)}
 
-if __name__ == '__main__':
+        ac = None
+        if texts:
+            builder = AcoraBuilder()
+            for text in texts:
+                builder.add(text)
+            ac = builder.build()
 
-    description = """
-__    _   ___    ___     ___     ___  .___
- |\   |  .'   \ .'   \  .'   `. .'   \ /   \
- | \  |  |      |       |     | |      |__-'
- |  \ |  |      |    _  |     | |      |  \
- |   \|   `.__,  `.___|  `.__.'  `.__, /   \
+        affected = set()
+        for sentence in corpus:
+            if sentence.docid in affected:
+                continue
+            if ac is not None and next(iter(ac.finditer(sentence.text)), None) is not None:
+                affected.add(sentence.docid)
+            elif patterns and any(e.term in patterns for e in self.e1.findall(sentence)):
+                affected.add(sentence.docid)
+        return affected
 
-Named Concept Gene Ontology Concept Recognizer """
-    parser = argparse.ArgumentParser(description=description)
-    parser.add_argument('command', type=str, nargs=1,
-                        help='command')
-    parser.add_argument('--output', dest='accumulate', action='store_const',
-                        const=sum, default=max,
-                        help='sum the integers (default: find the max)')
+    def reprocess(self, corpus, previous, changed_Ie=(), changed_Im=()):
+        """
+        Update the previous results of the corpus after changes of the
+        indexes, as by add_gold without refitting: only the documents
+        affected by the changed keys are processed again. The counts are
+        kept in reprocess_stats.
+        """
+        affected = self.affected_documents(corpus, changed_Ie, changed_Im)
+        sentences = [sentence for sentence in corpus if sentence.docid in affected]
+        system_results = Annotation(row for row in previous if row[0] not in affected)
+        if sentences:
+            system_results.update(self.process(sentences))
+        self.reprocess_stats = OrderedDict([
+            ('documents', len({sentence.docid for sentence in corpus})),
+            ('affected', len(affected)),
+            ('sentences', len(sentences))])
+        return system_results
 
-    args = parser.parse_args()
+    def row_bytes(self):
+        """
+        Return the estimated bytes of a buffered candidate. A classifier
+        which takes dense rows adds the float64 row and the float32 copy
+        the forest makes of it.
+        """
+        if self.engine() is None and self.backend.dense:
+            return CANDIDATE_BYTES + 12 * self.vectorizer.n_features
+        return CANDIDATE_BYTES
 
-    def load_components():
+    def _process_bounded(self, testing_corpus):
         """
-        Load the components from pickle files,
-        If the file is defined in the 'data/', load it
-        else, load the default file from 'data/default/'
-        return tuple (Ie, Im, feature_hasher, classifier)
+        Process the corpus sentence by sentence, the candidates are
+        buffered and flushed through the classification whenever their
+        estimated memory, with the classification itself, reaches the
+        budget. A budget smaller than one candidate raises ValueError.
         """
-        def _load_pickle(item):
-            path = 'data/{}.pickle'.format(item)
+        instrument = self.instrument
+        row_bytes = self.row_bytes()
+        chunk_size = (self.memory_budget - CLASSIFY_BYTES) // row_bytes
+        if chunk_size < 1:
+            template = 'The memory budget of {} bytes is smaller than one candidate of {} bytes'
+            raise ValueError(template.format(self.memory_budget, CLASSIFY_BYTES + row_bytes))
+        stats = OrderedDict([('candidates', 0), ('flushes', 0), ('peak_bytes', 0)])
+        self.memory_stats = stats
+        system_results = Annotation()
+        buffer = []
 
-            try:
-                logging.info('Loading the {}...'.format(item))
-                with open(path) as f:
-                    return pickle.load(f)
-            except:
-                path = 'data/default/{}.pickle'.format(item)
-                with open(path) as f:
-                    return pickle.load(f)
+        def flush():
+            system_y = self.predict(buffer)
+            system_results.update(recover(buffer, system_y))
+            stats['candidates'] += len(buffer)
+            stats['flushes'] += 1
+            stats['peak_bytes'] = max(stats['peak_bytes'],
+                                      CLASSIFY_BYTES + len(buffer) * row_bytes)
+            if instrument is not None:
+                instrument.count('positives', int(np.sum(system_y)))
+            del buffer[:]
+            # the forest leaves reference cycles behind on every call, they
+            # would pile up between the runs of the garbage collector
+            gc.collect(1)
 
-        Ie = _load_pickle('index_Ie')
-        Im = _load_pickle('index_Im')
-        Ie_boost = _load_pickle('index_Ie_boost')
+        for sentence in testing_corpus:
+            grounds = self.extractor.process([sentence], instrument)[0]
+            for candidate in self.candidate_recognizer.iter_generate(grounds):
+                buffer.append(candidate)
+                if len(buffer) >= chunk_size:
+                    flush()
+        if buffer:
+            flush()
+        if instrument is not None:
+            instrument.count('candidates', stats['candidates'])
+            instrument.count('flushes', stats['flushes'])
+            instrument.finish('process')
+        return system_results
 
-        feature_hasher = _load_pickle('feature_hasher')
-        classifier = _load_pickle('classifier')
+    def process_texts(self, documents, batch_size=64):
+        """
+        Annotate the (docid, text) documents without building a Corpus,
+        yield (docid, Annotation) for every document in the given order.
 
-    Ie, Im, Ie_boost, feature_hasher, classifier = load_components()
-    recognizer = MCGOCR(Ie, Im, Ie_boost, feature_hasher, classifier)
-    corpus = corpus.Corpus.from_dir('input')
-    annotation = recognizer.scan(corpus)
+        The documents are segmented into sentences and recognized in
+        batches of batch_size documents, reusing the same sentence buffer
+        """
+        sentences = self._sentence_buffer
+        documents = iter(documents)
+        while True:
+            batch = list(itertools.islice(documents, batch_size))
+            if not batch:
+                return
+            del sentences[:]
+            # the sentences are keyed by the position in the batch, so that
+            # the repeated docids are annotated separately
+            for i, (docid, text) in enumerate(batch):
+                for sentence_text, offset in _sent_toker(text, 0):
+                    sentences.append(Sentence(sentence_text, offset, i))
+            results = [Annotation() for document in batch]
+            for i, goid, start, end, text in self.process(sentences):
+                results[i].add((batch[i][0], goid, start, end, text))
+            del sentences[:]
+            for (docid, text), annotation in zip(batch, results):
+                yield docid, annotation
@@ -0,0 +1,279 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+This module serves a loaded NCGOCR over HTTP, the concurrent requests are
+gathered into micro-batches before the recognition
+"""
+
+from __future__ import (absolute_import, division,
+                        print_function, unicode_literals)
+from builtins import *
+
+import asyncio
+import json
+import time
+
+from collections import deque, OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+REASONS = {200: 'OK', 400: 'Bad Request', 404: 'Not Found',
+           405: 'Method Not Allowed', 413: 'Payload Too Large',
+           500: 'Internal Server Error'}
+
+MAX_BODY_SIZE = 2**20
+
+
+class HTTPError(Exception):
+    """
+    A request which is answered with the status and closes the connection
+    """
+    def __init__(self, status, message):
+        super(HTTPError, self).__init__(message)
+        self.status = status
+
+
+class MicroBatcher(object):
+    """
+    Queue the documents and annotate them in batches of at most
+    max_batch_size documents, a batch is started when it is full or when
+    its first document has waited max_wait seconds
+    """
+    def __init__(self, model, max_batch_size=32, max_wait=0.01, history=10000):
+        self.model = model
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self.queue = None
+        self.executor = ThreadPoolExecutor(max_workers=1)
+        self.latencies = deque(maxlen=history)
+        self.batch_sizes = deque(maxlen=history)
+        self.requests = 0
+        self._task = None
+
+    def start(self):
+        self.queue = asyncio.Queue()
+        self._task = asyncio.ensure_future(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        self.executor.shutdown(wait=True)
+
+    async def annotate(self, docid, text):
+        """
+        Return the annotations of one document as a list of
+        (docid, goid, start, end, text)
+        """
+        future = asyncio.get_event_loop().create_future()
+        self.requests += 1
+        await self.queue.put((docid, text, future, time.time()))
+        return await future
+
+    async def _gather(self):
+        batch = [await self.queue.get()]
+        deadline = time.time() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            timeout = deadline - time.time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self.queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _run(self):
+        loop = asyncio.get_event_loop()
+        while True:
+            batch = await self._gather()
+            documents = [(docid, text) for docid, text, future, start in batch]
+            try:
+                results = await loop.run_in_executor(
+                    self.executor, self._annotate, documents)
+            except Exception:
+                # annotate the documents one by one, so that only the
+                # failing ones fail
+                results = await loop.run_in_executor(
+                    self.executor, self._annotate_each, documents)
+
+            now = time.time()
+            self.batch_sizes.append(len(batch))
+            for (docid, text, future, start), result in zip(batch, results):
+                self.latencies.append(now - start)
+                if future.done():
+                    continue
+                if isinstance(result, Exception):
+                    future.set_exception(result)
+                else:
+                    future.set_result(result[1].sorted_results())
+
+    def _annotate(self, documents):
+        return list(self.model.process_texts(documents, len(documents)))
+
+    def _annotate_each(self, documents):
+        results = []
+        for document in documents:
+            try:
+                results.extend(self._annotate([document]))
+            except Exception as e:
+                results.append(e)
+        return results
+
+    def stats(self):
+        latencies = np.array(self.latencies) * 1000
+        stats = OrderedDict([('queue_depth', self.queue.qsize() if self.queue else 0),
+                             ('requests', self.requests),
+                             ('batches', len(self.batch_sizes)),
+                             ('mean_batch_size', float(np.mean(self.batch_sizes))
+                                                 if self.batch_sizes else 0.0)])
+        for p in (50, 90, 99):
+            key = 'latency_p{}_ms'.format(p)
+            stats[key] = float(np.percentile(latencies, p)) if len(latencies) else 0.0
+        return stats
+
+
+class AnnotationServer(object):
+    """
+    A minimal HTTP/1.1 server on a TCP port or a Unix socket.
+
+    POST /annotate with {"docid": ..., "text": ...} returns
+    {"docid": ..., "annotations": [[goid, start, end, text], ...]},
+    and GET /stats returns the statistics of the micro-batcher. A
+    malformed request is answered with 400, a body of more than
+    max_body_size bytes with 413, and the connection is closed.
+    """
+    def __init__(self, model, max_batch_size=32, max_wait=0.01, max_body_size=MAX_BODY_SIZE):
+        self.batcher = MicroBatcher(model, max_batch_size, max_wait)
+        self.max_body_size = max_body_size
+        self.server = None
+
+    async def start(self, host='127.0.0.1', port=8000, path=None):
+        self.batcher.start()
+        if path is not None:
+            self.server = await asyncio.start_unix_server(self.handle, path=path)
+        else:
+            self.server = await asyncio.start_server(self.handle, host, port)
+        return self.server
+
+    @property
+    def port(self):
+        return self.server.sockets[0].getsockname()[1]
+
+    async def close(self):
+        self.server.close()
+        await self.server.wait_closed()
+        await self.batcher.stop()
+
+    async def respond(self, method, target, body):
+        if target == '/annotate':
+            if method != 'POST':
+                return 405, {'error': 'use POST'}
+            try:
+                request = json.loads(body.decode('utf-8'))
+                docid = str(request.get('docid', ''))
+                text = request['text']
+                if not isinstance(text, str):
+                    raise TypeError('text is not a string')
+            except (ValueError, KeyError, TypeError, AttributeError):
+                return 400, {'error': 'expect {"docid": ..., "text": ...}'}
+            rows = await self.batcher.annotate(docid, text)
+            return 200, {'docid': docid, 'annotations': [list(row[1:]) for row in rows]}
+        elif target == '/stats':
+            return 200, self.batcher.stats()
+        return 404, {'error': 'unknown path {}'.format(target)}
+
+    async def read_request(self, reader):
+        """
+        Return (method, target, headers, body) of the next request, or None
+        at the end of the connection
+        """
+        try:
+            request_line = await reader.readline()
+            if not request_line.strip():
+                return None
+            parts = request_line.decode('latin-1').split()
+            if len(parts) != 3 or not parts[2].startswith('HTTP/'):
+                raise HTTPError(400, 'malformed request line')
+            method, target, version = parts
+            headers = dict()
+            while True:
+                line = await reader.readline()
+                if line in (b'\r\n', b'\n', b''):
+                    break
+                key, sep, value = line.decode('latin-1').partition(':')
+                if not sep:
+                    raise HTTPError(400, 'malformed header')
+                headers[key.strip().lower()] = value.strip()
+        except ValueError:
+            # a line longer than the limit of the reader
+            raise HTTPError(400, 'line too long')
+        try:
+            length = int(headers.get('content-length', 0))
+        except ValueError:
+            length = -1
+        if length < 0:
+            raise HTTPError(400, 'invalid Content-Length')
+        if length > self.max_body_size:
+            template = 'the body is larger than {} bytes'
+            raise HTTPError(413, template.format(self.max_body_size))
+        body = await reader.readexactly(length) if length else b''
+        return method, target, headers, body
+
+    async def write_response(self, writer, status, payload, keep_alive):
+        content = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+        head = ('HTTP/1.1 {} {}\r\n'
+                'Content-Type: application/json\r\n'
+                'Content-Length: {}\r\n'
+                'Connection: {}\r\n\r\n').format(status, REASONS[status], len(content),
+                                                 'keep-alive' if keep_alive else 'close')
+        writer.write(head.encode('latin-1') + content)
+        await writer.drain()
+
+    async def handle(self, reader, writer):
+        try:
+            while True:
+                try:
+                    request = await self.read_request(reader)
+                except HTTPError as e:
+                    await self.write_response(writer, e.status, {'error': str(e)}, False)
+                    break
+                if request is None:
+                    break
+                method, target, headers, body = request
+
+                try:
+                    status, payload = await self.respond(method, target, body)
+                except Exception as e:
+                    status, payload = 500, {'error': str(e)}
+                keep_alive = headers.get('connection', '').lower() != 'close'
+                await self.write_response(writer, status, payload, keep_alive)
+                if not keep_alive:
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+
+def serve(model, host='127.0.0.1', port=8000, path=None, max_batch_size=32, max_wait=0.01,
+          max_body_size=MAX_BODY_SIZE):
+    """
+    Serve the model until interrupted
+    """
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    server = AnnotationServer(model, max_batch_size, max_wait, max_body_size)
+    loop.run_until_complete(server.start(host, port, path))
+    try:
+        loop.run_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        loop.run_until_complete(server.close())
+        loop.close()
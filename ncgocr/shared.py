@@ -0,0 +1,458 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+This module exports the large read-only state of a trained NCGOCR into
+memory-mapped arrays, so that the worker processes share one copy of it
+"""
+
+from __future__ import (absolute_import, division,
+                        print_function, unicode_literals)
+from builtins import *
+
+import glob
+import multiprocessing
+import os
+import time
+
+from collections import namedtuple
+from collections.abc import Mapping
+from functools import partial
+
+import joblib
+import numpy as np
+from sklearn.ensemble import RandomForestClassifier
+
+from ncgocr.concept import Entity, Pattern, Constraint, Evidence, Statement
+from ncgocr.extractor import SolidExtractor, CandidateReconizer
+from ncgocr.forest import FlatForest, FOREST_ARRAYS
+from ncgocr.learning import _BoundedCache
+
+SHARED_FORMAT = 'ncgocr-shared'
+SHARED_VERSION = 1
+
+TERM_CLASSES = [Entity, Pattern, Constraint]
+
+SharedConcept = namedtuple('SharedConcept', 'goid namespace')
+
+
+class StringTable(object):
+    """
+    The sorted distinct strings, stored as one UTF-8 blob and the offsets
+    of the strings in it
+    """
+    def __init__(self, blob, offsets):
+        self.blob = blob
+        self.offsets = offsets
+
+    @classmethod
+    def build(cls, strings):
+        encoded = sorted({s.encode('utf-8') for s in strings})
+        blob = np.frombuffer(b''.join(encoded), dtype=np.uint8)
+        offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        np.cumsum([len(s) for s in encoded], out=offsets[1:])
+        ids = {s.decode('utf-8'): i for i, s in enumerate(encoded)}
+        return cls(blob, offsets), ids
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def _bytes(self, i):
+        return self.blob[self.offsets[i]:self.offsets[i+1]].tobytes()
+
+    def __getitem__(self, i):
+        return self._bytes(i).decode('utf-8')
+
+    def find(self, text):
+        """
+        Return the id of the text, or -1
+        """
+        target = text.encode('utf-8')
+        lo, hi = 0, len(self)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._bytes(mid) < target:
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo < len(self) and self._bytes(lo) == target:
+            return lo
+        return -1
+
+
+class SharedIndex(Mapping):
+    """
+    A read-only Index of which the sorted key ids, the offsets and the
+    value ids are arrays, the values of a key are decoded when it is looked
+    up and the recently used ones are kept. A missing key has no values.
+    """
+    def __init__(self, keys, indptr, values, key_id, key_of, value_of, maxsize=65536):
+        self.keys_ = keys
+        self.indptr = indptr
+        self.values_ = values
+        self.key_id = key_id
+        self.key_of = key_of
+        self.value_of = value_of
+        self.cache = _BoundedCache(maxsize)
+
+    def __repr__(self):
+        template = '{}<{} key(s)>'
+        return template.format(self.__class__.__name__, len(self))
+
+    def _position(self, key):
+        i = self.key_id(key)
+        if i < 0:
+            return -1
+        position = int(np.searchsorted(self.keys_, i))
+        if position < len(self.keys_) and self.keys_[position] == i:
+            return position
+        return -1
+
+    def _decode(self, position):
+        start, end = self.indptr[position], self.indptr[position+1]
+        return frozenset(self.value_of(int(i)) for i in self.values_[start:end])
+
+    def __getitem__(self, key):
+        position = self._position(key)
+        if position < 0:
+            return frozenset()
+        return self.cache.lookup(position, partial(self._decode, position))
+
+    def __contains__(self, key):
+        return self._position(key) >= 0
+
+    def get(self, key, default=None):
+        return self[key] if key in self else default
+
+    def __iter__(self):
+        for i in self.keys_:
+            yield self.key_of(int(i))
+
+    def __len__(self):
+        return len(self.keys_)
+
+
+class SharedGoData(Mapping):
+    """
+    The namespaces of the GO concepts, enough for the measurements
+    """
+    def __init__(self, strings, goids, namespaces):
+        self.strings = strings
+        self.goids = goids
+        self.namespaces = namespaces
+
+    def __getitem__(self, goid):
+        i = self.strings.find(goid)
+        position = int(np.searchsorted(self.goids, i))
+        if i < 0 or position >= len(self.goids) or self.goids[position] != i:
+            raise KeyError(goid)
+        return SharedConcept(goid, self.strings[int(self.namespaces[position])])
+
+    def __iter__(self):
+        for i in self.goids:
+            yield self.strings[int(i)]
+
+    def __len__(self):
+        return len(self.goids)
+
+
+class SharedForest(FlatForest):
+    """
+    The FlatForest of the forest arrays of an export
+    """
+    def __init__(self, arrays):
+        super(SharedForest, self).__init__(*[arrays['forest_' + name]
+                                             for name in FOREST_ARRAYS])
+
+    @staticmethod
+    def export(classifier):
+        return FlatForest.from_classifier(classifier).to_arrays()
+
+
+class _Tables(object):
+    """
+    Collect the strings, the terms and the statements while exporting
+    """
+    def __init__(self, indexes, statements, godata):
+        terms = set()
+        strings = set()
+        for name, index in indexes.items():
+            for key, values in index.items():
+                if name.endswith('_ie'):
+                    strings.add(key)
+                    terms.update(values)
+                else:
+                    terms.add(key)
+        for statement in statements:
+            strings.add(statement.statid)
+            for evidence in statement.evidences:
+                terms.add(evidence.term)
+                strings.add(evidence.text)
+        for term in terms:
+            strings.add(term.lemma)
+            strings.add(term.ref)
+        for goid, concept in godata.items():
+            strings.add(goid)
+            strings.add(concept.namespace)
+
+        self.strings, self.string_ids = StringTable.build(strings)
+        n = len(self.strings)
+        keyed = sorted((self.term_key(term, n), term) for term in terms)
+        self.term_ids = {term: i for i, (key, term) in enumerate(keyed)}
+        self.term_keys = np.array([key for key, term in keyed], dtype=np.int64)
+        self.terms = [term for key, term in keyed]
+        self.statements = sorted(statements, key=lambda s: s.statid)
+        self.statement_ids = {id(s): i for i, s in enumerate(self.statements)}
+
+    def term_key(self, term, n):
+        kind = TERM_CLASSES.index(type(term))
+        return (kind * n + self.string_ids[term.lemma]) * n + self.string_ids[term.ref]
+
+    def arrays(self, indexes, godata):
+        s = self.string_ids
+        arrays = {'strings_blob': self.strings.blob,
+                  'strings_offsets': self.strings.offsets,
+                  'term_keys': self.term_keys,
+                  'term_kind': np.array([TERM_CLASSES.index(type(t)) for t in self.terms],
+                                        dtype=np.int8),
+                  'term_lemma': np.array([s[t.lemma] for t in self.terms], dtype=np.int64),
+                  'term_ref': np.array([s[t.ref] for t in self.terms], dtype=np.int64)}
+
+        statid, indptr = [], [0]
+        ev_term, ev_text, ev_start, ev_end = [], [], [], []
+        for statement in self.statements:
+            statid.append(s[statement.statid])
+            for evidence in statement.evidences:
+                ev_term.append(self.term_ids[evidence.term])
+                ev_text.append(s[evidence.text])
+                ev_start.append(evidence.start)
+                ev_end.append(evidence.end)
+            indptr.append(len(ev_term))
+        arrays.update({'statement_statid': np.array(statid, dtype=np.int64),
+                       'statement_indptr': np.array(indptr, dtype=np.int64),
+                       'evidence_term': np.array(ev_term, dtype=np.int64),
+                       'evidence_text': np.array(ev_text, dtype=np.int64),
+                       'evidence_start': np.array(ev_start, dtype=np.int64),
+                       'evidence_end': np.array(ev_end, dtype=np.int64)})
+
+        for name, index in indexes.items():
+            if name.endswith('_ie'):
+                rows = sorted((s[key], sorted(self.term_ids[v] for v in values))
+                              for key, values in index.items() if len(values) > 0)
+            else:
+                rows = sorted((self.term_ids[key], sorted(self.statement_ids[id(v)]
+                                                          for v in values))
+                              for key, values in index.items() if len(values) > 0)
+            keys = np.array([key for key, values in rows], dtype=np.int64)
+            indptr = np.zeros(len(rows) + 1, dtype=np.int64)
+            np.cumsum([len(values) for key, values in rows], out=indptr[1:])
+            values = np.array([v for key, values in rows for v in values], dtype=np.int64)
+            arrays.update({name + '_keys': keys, name + '_indptr': indptr,
+                           name + '_values': values})
+
+        go_rows = sorted((s[goid], s[concept.namespace]) for goid, concept in godata.items())
+        arrays['go_ids'] = np.array([goid for goid, namespace in go_rows], dtype=np.int64)
+        arrays['go_namespaces'] = np.array([namespace for goid, namespace in go_rows],
+                                           dtype=np.int64)
+        return arrays
+
+
+class SharedState(object):
+    """
+    Decode the terms and the statements from the memory-mapped arrays,
+    each process keeps the recently decoded ones
+    """
+    def __init__(self, arrays, maxsize=65536):
+        self.arrays = arrays
+        self.strings = StringTable(arrays['strings_blob'], arrays['strings_offsets'])
+        self.n = len(self.strings)
+        self.term_cache = _BoundedCache(maxsize)
+        self.statement_cache = _BoundedCache(maxsize)
+        self.maxsize = maxsize
+
+    def term(self, i):
+        def compute():
+            a = self.arrays
+            cls = TERM_CLASSES[int(a['term_kind'][i])]
+            return cls(self.strings[int(a['term_lemma'][i])], self.strings[int(a['term_ref'][i])])
+        return self.term_cache.lookup(i, compute)
+
+    def term_id(self, term):
+        lemma = self.strings.find(term.lemma)
+        ref = self.strings.find(term.ref)
+        if lemma < 0 or ref < 0 or type(term) not in TERM_CLASSES:
+            return -1
+        key = (TERM_CLASSES.index(type(term)) * self.n + lemma) * self.n + ref
+        keys = self.arrays['term_keys']
+        position = int(np.searchsorted(keys, key))
+        if position < len(keys) and keys[position] == key:
+            return position
+        return -1
+
+    def statement(self, i):
+        def compute():
+            a = self.arrays
+            evidences = []
+            for j in range(a['statement_indptr'][i], a['statement_indptr'][i+1]):
+                evidences.append(Evidence(self.term(int(a['evidence_term'][j])),
+                                          self.strings[int(a['evidence_text'][j])],
+                                          int(a['evidence_start'][j]),
+                                          int(a['evidence_end'][j])))
+            return Statement(self.strings[int(a['statement_statid'][i])], evidences)
+        return self.statement_cache.lookup(i, compute)
+
+    def term_index(self, name):
+        a = self.arrays
+        return SharedIndex(a[name + '_keys'], a[name + '_indptr'], a[name + '_values'],
+                           self.strings.find, self.strings.__getitem__, self.term,
+                           self.maxsize)
+
+    def statement_index(self, name):
+        a = self.arrays
+        return SharedIndex(a[name + '_keys'], a[name + '_indptr'], a[name + '_values'],
+                           self.term_id, self.term, self.statement, self.maxsize)
+
+    def godata(self):
+        return SharedGoData(self.strings, self.arrays['go_ids'], self.arrays['go_namespaces'])
+
+
+def export_shared(model, directory):
+    """
+    Write the indexes, the statements, the GO namespaces and the forest of
+    a trained model as .npy files into the directory, with the rest of the
+    model, including a classifier of another backend, in a small bundle
+    """
+    os.makedirs(directory, exist_ok=True)
+    indexes = {'basic_ie': model.basic_Ie,
+               'boost_ie': model.boost_Ie,
+               'im': model.candidate_recognizer.Im}
+    statements = {statement for values in indexes['im'].values() for statement in values}
+    tables = _Tables(indexes, statements, model.godata)
+    arrays = tables.arrays(indexes, model.godata)
+    shared_forest = isinstance(model.classifier, RandomForestClassifier)
+    if shared_forest:
+        arrays.update(SharedForest.export(model.classifier))
+    else:
+        for filepath in glob.glob(os.path.join(directory, 'forest_*.npy')):
+            os.remove(filepath)
+    for name, array in arrays.items():
+        np.save(os.path.join(directory, name + '.npy'), np.ascontiguousarray(array))
+
+    state = model.__getstate__()
+    state['cache_size'] = None
+    for name in ['godata', 'basic_Ie', 'boost_Ie', 'basic_Im', 'boost_Im', 'goid2terms',
+                 'training_X', 'training_y', 'training_w', 'result_cache', 'candidate_cache',
+                 'candidate_recognizer']:
+        state[name] = None
+    # the other classifiers are small, they stay in the bundle
+    if shared_forest:
+        state['classifier'] = None
+    # without the indexes, the automata are not rebuilt here but by
+    # attach_shared
+    skeleton = object.__new__(type(model))
+    skeleton.__setstate__(state)
+    bundle = {'format': SHARED_FORMAT, 'version': SHARED_VERSION, 'model': skeleton}
+    joblib.dump(bundle, os.path.join(directory, 'model.bundle'))
+
+
+def attach_shared(directory, maxsize=65536):
+    """
+    Return the model exported into the directory, with its arrays
+    memory-mapped instead of copied. The model can process, but not be
+    trained nor boosted.
+    """
+    start = time.time()
+    bundle = joblib.load(os.path.join(directory, 'model.bundle'))
+    if not isinstance(bundle, dict) or bundle.get('format') != SHARED_FORMAT:
+        raise ValueError('{} is not an exported NCGOCR'.format(directory))
+    if bundle['version'] != SHARED_VERSION:
+        template = 'Unsupported version {} (expected {})'
+        raise ValueError(template.format(bundle['version'], SHARED_VERSION))
+    arrays = dict()
+    for filepath in glob.glob(os.path.join(directory, '*.npy')):
+        name = os.path.basename(filepath)[:-len('.npy')]
+        arrays[name] = np.load(filepath, mmap_mode='r')
+
+    state = SharedState(arrays, maxsize)
+    model = bundle['model']
+    model.godata = state.godata()
+    model.basic_Ie = state.term_index('basic_ie')
+    model.boost_Ie = state.term_index('boost_ie')
+    model.e0 = SolidExtractor(model.basic_Ie)
+    model.e2 = SolidExtractor(model.boost_Ie)
+    model.extractor = model.join_extractors()
+    model.candidate_recognizer = CandidateReconizer(state.statement_index('im'))
+    if 'forest_roots' in arrays:
+        model.classifier = SharedForest(arrays)
+    model.load_time = time.time() - start
+    return model
+
+
+_inherited = dict()
+
+
+def inherited_model():
+    """
+    Return the model of the pool made by inherit_pool, in one of its workers
+    """
+    return _inherited['model']
+
+
+def inherit_pool(model, processes):
+    """
+    Return a pool of processes forked from this one with the model, the
+    workers inherit its built automata and its memory-mapped arrays
+    copy-on-write instead of attaching the model and building the automata
+    again. The start method must support fork.
+    """
+    _inherited['model'] = model
+    return multiprocessing.get_context('fork').Pool(processes)
+
+
+def memory_usage():
+    """
+    Return the private and the file-backed resident bytes of this process,
+    the file-backed pages of the memory-mapped arrays are shared
+    """
+    usage = {'RssAnon': 0, 'RssFile': 0}
+    with open('/proc/self/status') as f:
+        for line in f:
+            key, sep, value = line.partition(':')
+            if key in usage:
+                usage[key] = int(value.split()[0]) * 1024
+    return usage['RssAnon'], usage['RssFile']
+
+
+def _load_and_measure(loader, path, corpus):
+    import ncgocr.ncgocr
+    before = memory_usage()
+    model = loader(path)
+    if corpus is not None:
+        model.process(corpus)
+    after = memory_usage()
+    return after[0] - before[0], after[1] - before[1]
+
+
+def _process_and_measure(corpus):
+    before = memory_usage()
+    if corpus is not None:
+        inherited_model().process(corpus)
+    after = memory_usage()
+    return after[0] - before[0], after[1] - before[1]
+
+
+def rss_increase(loader, path, corpus=None, inherit=False):
+    """
+    Return the (private, file-backed) resident bytes added to a fresh
+    process by loader(path), and by processing the corpus if given. With
+    inherit=True the model is loaded here and the process is a worker of
+    inherit_pool, only the processing is measured.
+    """
+    if inherit:
+        try:
+            with inherit_pool(loader(path), 1) as pool:
+                return tuple(pool.apply(_process_and_measure, (corpus,)))
+        finally:
+            _inherited.pop('model', None)
+    context = multiprocessing.get_context('spawn')
+    with context.Pool(1) as pool:
+        return tuple(pool.apply(_load_and_measure, (loader, path, corpus)))
@@ -0,0 +1,183 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+This module runs the document-grouped cross-validation of NCGOCR
+over a grid of settings
+"""
+
+from __future__ import (absolute_import, division,
+                        print_function, unicode_literals)
+from builtins import *
+
+import copy
+import itertools
+import multiprocessing
+import pickle
+import random
+
+from collections import namedtuple, OrderedDict
+
+from txttk.corpus import Annotation, Corpus
+from txttk.report import Report
+
+from ncgocr.backends import RandomForestBackend
+from ncgocr.learning import LabelMarker, evaluate, recover
+from ncgocr.ncgocr import NCGOCR
+
+DEFAULTS = OrderedDict([('n', 10),
+                        ('use_boost', True),
+                        ('n_features', 1024),
+                        ('compression', None)])
+
+Fold = namedtuple('Fold', 'training_corpus training_gold testing_corpus testing_gold')
+SweepResult = namedtuple('SweepResult', 'config report fold_reports')
+
+
+def grid(**choices):
+    """
+    Return the configs of every combination of the given choices, the
+    settings not given take the values in DEFAULTS
+    """
+    unknown = set(choices) - set(DEFAULTS)
+    if unknown:
+        raise KeyError('Unknown settings: {}'.format(', '.join(sorted(unknown))))
+    keys = list(choices)
+    configs = []
+    for values in itertools.product(*[choices[key] for key in keys]):
+        config = OrderedDict(DEFAULTS)
+        config.update(zip(keys, values))
+        configs.append(config)
+    return configs
+
+
+def document_folds(corpus, goldstandard, k=5, seed=0):
+    """
+    Split the corpus and the goldstandard into k folds, the sentences and
+    the annotations of a document always go to the same fold. The
+    annotations of the documents not in the corpus are left out.
+    """
+    docids = sorted(corpus.doc_set())
+    if not k <= len(docids):
+        raise ValueError('The k should be lesser equal than the document size of the corpus ({}).'.format(len(docids)))
+    random.Random(seed).shuffle(docids)
+    doc2fold = {docid: i % k for i, docid in enumerate(docids)}
+
+    folds = []
+    for i in range(k):
+        title = '{} {}/{}'.format(corpus.title, i+1, k)
+        training_corpus = Corpus('{} Training'.format(title),
+                                 [s for s in corpus if doc2fold[s.docid] != i])
+        testing_corpus = Corpus('{} Testing'.format(title),
+                                [s for s in corpus if doc2fold[s.docid] == i])
+        training_gold = Annotation(item for item in goldstandard
+                                   if doc2fold.get(item[0], i) != i)
+        testing_gold = Annotation(item for item in goldstandard
+                                  if doc2fold.get(item[0]) == i)
+        folds.append(Fold(training_corpus, training_gold, testing_corpus, testing_gold))
+    return folds
+
+
+_shared = dict()
+
+def _init_worker(godatas, folds, configs, options):
+    _shared['godatas'] = godatas
+    _shared['folds'] = folds
+    _shared['configs'] = configs
+    _shared['options'] = options
+
+def _evaluate(task):
+    """
+    Extract the candidates of one fold once for the configs sharing the
+    compression and use_boost settings, then train and evaluate the NCGOCR
+    of each config on them
+    """
+    fold_id, compression, use_boost, config_ids = task
+    godata = _shared['godatas'][compression]
+    fold = _shared['folds'][fold_id]
+    options = _shared['options']
+
+    model = NCGOCR(godata, use_boost=use_boost, **copy.deepcopy(options))
+    model.build(fold.training_gold)
+    training_candidates = model.candidate_recognizer.process(
+        model.extractor.process(fold.training_corpus))
+    testing_candidates = model.candidate_recognizer.process(
+        model.extractor.process(fold.testing_corpus))
+    training_y = LabelMarker(fold.training_gold).process(training_candidates)
+
+    title = 'fold {}/{}'.format(fold_id+1, len(_shared['folds']))
+    results = []
+    for config_id in config_ids:
+        config = _shared['configs'][config_id]
+        system = Annotation()
+        if len(testing_candidates) > 0 and len(training_candidates) > 0:
+            model = NCGOCR(godata, n=config['n'], use_boost=use_boost,
+                           n_features=config['n_features'], **copy.deepcopy(options))
+            model.fit_candidates(training_candidates, training_y)
+            system = recover(testing_candidates, model.predict(testing_candidates))
+        results.append((config_id, fold_id, evaluate(system, fold.testing_gold, title)))
+    return results
+
+
+def _map(pool, func, tasks):
+    if pool is None:
+        return [func(task) for task in tasks]
+    return pool.imap_unordered(func, tasks)
+
+
+def sweep(godata, corpus, goldstandard, configs, k=5, seed=0, processes=None, **options):
+    """
+    Cross-validate every config on the document-grouped folds of the
+    corpus, return a list of SweepResult, the best F-score first.
+
+    Every config is trained and evaluated as an NCGOCR, the options, such
+    as the backend, the sampler or the cascade, are passed to all of them.
+    The default backend is a random forest of one job seeded by seed.
+
+    The candidates are extracted once per fold for all the configs sharing
+    the compression and use_boost settings, the folds x settings run in a
+    process pool. With processes=1 everything runs in this process.
+    """
+    configs = [OrderedDict(DEFAULTS, **config) for config in configs]
+    folds = document_folds(corpus, goldstandard, k, seed)
+    options.setdefault('backend', RandomForestBackend(n_jobs=1, random_state=seed))
+
+    godatas = dict()
+    for compression in {config['compression'] for config in configs}:
+        if compression is None:
+            godatas[compression] = godata
+        else:
+            compressed = pickle.loads(pickle.dumps(godata, protocol=2))
+            compressed.compression(compression)
+            godatas[compression] = compressed
+
+    groups = OrderedDict()
+    for config_id, config in enumerate(configs):
+        key = (config['compression'], config['use_boost'])
+        groups.setdefault(key, []).append(config_id)
+    tasks = [(fold_id, compression, use_boost, tuple(config_ids))
+             for fold_id in range(k)
+             for (compression, use_boost), config_ids in groups.items()]
+
+    if processes == 1:
+        pool = None
+        _init_worker(godatas, folds, configs, options)
+    else:
+        pool = multiprocessing.Pool(processes, _init_worker, (godatas, folds, configs, options))
+
+    try:
+        fold_reports = [[None] * k for config in configs]
+        for results in _map(pool, _evaluate, tasks):
+            for config_id, fold_id, report in results:
+                fold_reports[config_id][fold_id] = report
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+
+    results = []
+    for config, reports in zip(configs, fold_reports):
+        title = ' '.join('{}={}'.format(key, value) for key, value in config.items())
+        report = Report.from_reports(reports, title)
+        results.append(SweepResult(config, report, reports))
+    results.sort(key=lambda result: result.report.f1(), reverse=True)
+    return results
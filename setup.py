@@ -30,12 +30,19 @@ setup(
     author_email='jeroyang@gmail.com',
     url='https://github.com/jeroyang/ncgocr',
     packages=[
-        'ncgocr'
+        'ncgocr',
+        'ncgocr.benchmark',
     ],
     package_dir={'ncgocr': 'ncgocr'},
     data_files=[('input', input_fns)],
     include_package_data=True,
     install_requires=requirements,
+    python_requires='>=3.7',
+    entry_points={
+        'console_scripts': [
+            'ncgocr=ncgocr.cli:main',
+        ],
+    },
     license="MIT",
     zip_safe=False,
     keywords='ncgocr',
@@ -45,8 +52,8 @@ setup(
         'License :: OSI Approved :: MIT License',
         'Natural Language :: English',
         'Programming Language :: Python :: 3',
-        'Programming Language :: Python :: 3.5',
-        'Programming Language :: Python :: 3.6',
+        'Programming Language :: Python :: 3.7',
+        'Programming Language :: Python :: 3.8',
     ],
     test_suite='tests',
     tests_require=test_requirements
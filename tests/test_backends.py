@@ -0,0 +1,98 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from __future__ import (absolute_import, division,
+                        print_function, unicode_literals)
+from builtins import *
+
+"""
+test_backends
+----------------------------------
+
+Tests for `backends` module.
+"""
+
+import shutil
+import tempfile
+import unittest
+
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.linear_model import LogisticRegression, SGDClassifier
+from sklearn.neighbors import KNeighborsClassifier
+
+from ncgocr import GoData, NCGOCR
+from ncgocr.backends import (BACKENDS, Backend, RandomForestBackend, LogisticBackend,
+                             get_backend)
+from ncgocr.learning import evaluate, NegativeSampler
+from ncgocr.shared import export_shared, attach_shared
+from tests.test_ncgocr import GO_PATH, get_corpus, get_goldstandard
+
+
+class NeighborsBackend(Backend):
+    name = 'neighbors'
+
+    def classifier(self, n):
+        # KNeighborsClassifier.fit takes no sample_weight
+        return KNeighborsClassifier(n_neighbors=1)
+
+
+class TestBackends(unittest.TestCase):
+
+    def test_get_backend(self):
+        self.assertIsInstance(get_backend(), RandomForestBackend)
+        self.assertIsInstance(get_backend('logistic'), LogisticBackend)
+        backend = LogisticBackend(C=0.5)
+        self.assertIs(get_backend(backend), backend)
+        with self.assertRaises(ValueError):
+            get_backend('naive_bayes')
+        self.assertEqual(list(BACKENDS), ['random_forest', 'logistic', 'sgd',
+                                          'hist_gradient_boosting'])
+
+    def test_classifier(self):
+        forest = RandomForestBackend(max_depth=3).classifier(7)
+        self.assertIsInstance(forest, RandomForestClassifier)
+        self.assertEqual((forest.n_estimators, forest.max_depth), (7, 3))
+        self.assertIsInstance(get_backend('sgd').classifier(7), SGDClassifier)
+        self.assertFalse(get_backend('sgd').dense)
+        self.assertEqual(get_backend('logistic').vectorizer(64).n_features, 64)
+        with self.assertRaises(TypeError):
+            Backend()
+
+
+class TestNcgocrBackends(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.godata = GoData(GO_PATH)
+        cls.corpus = get_corpus()
+        cls.goldstandard = get_goldstandard()
+
+    def test_train_process(self):
+        for name in ['logistic', 'sgd', 'hist_gradient_boosting']:
+            ncgocr = NCGOCR(self.godata, backend=name, flat_forest=True,
+                            sampler=NegativeSampler(ratio=0.5))
+            ncgocr.train(self.corpus, self.goldstandard, keep_features=True)
+            self.assertIsNone(ncgocr.engine())
+            result = ncgocr.process(self.corpus)
+            report = evaluate(result, self.goldstandard, 'training')
+            self.assertGreater(report.f1(), 0.5, name)
+            ncgocr.add_gold(self.goldstandard, self.corpus)
+
+    def test_shared(self):
+        ncgocr = NCGOCR(self.godata, backend='logistic')
+        ncgocr.train(self.corpus, self.goldstandard)
+        expected = ncgocr.process(self.corpus)
+        directory = tempfile.mkdtemp()
+        try:
+            export_shared(ncgocr, directory)
+            attached = attach_shared(directory)
+            self.assertIsInstance(attached.classifier, LogisticRegression)
+            self.assertEqual(attached.process(self.corpus), expected)
+        finally:
+            shutil.rmtree(directory)
+
+    def test_no_sample_weight(self):
+        ncgocr = NCGOCR(self.godata, backend=NeighborsBackend())
+        ncgocr.train(self.corpus, self.goldstandard)
+        report = evaluate(ncgocr.process(self.corpus), self.goldstandard, 'training')
+        self.assertGreater(report.f1(), 0.5)
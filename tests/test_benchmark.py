@@ -0,0 +1,121 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from __future__ import (absolute_import, division,
+                        print_function, unicode_literals)
+from builtins import *
+
+"""
+test_benchmark
+----------------------------------
+
+Tests for `ncgocr.benchmark` module.
+"""
+
+import copy
+import os
+import re
+import shutil
+import tempfile
+import unittest
+
+from ncgocr.concept import GoData, Pattern
+from ncgocr.pattern_regex import regex_out
+from ncgocr.benchmark import (pattern_phrases, generate_terms, write_obo,
+                              generate_corpus, run_scale, compare, run_inference,
+                              run_backends)
+
+
+class TestSynthetic(unittest.TestCase):
+
+    def setUp(self):
+        self.terms = generate_terms(60, depth=4, seed=1)
+        self.tempdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tempdir)
+
+    def test_pattern_phrases(self):
+        phrases = pattern_phrases()
+        self.assertGreater(len(phrases), 20)
+        for phrase in phrases:
+            self.assertTrue(re.match(regex_out, phrase))
+
+    def test_generate_terms(self):
+        self.assertEqual(len(self.terms), 60)
+        self.assertEqual(generate_terms(60, depth=4, seed=1), self.terms)
+        names = [t.name for t in self.terms] + [s for t in self.terms for s in t.synonyms]
+        self.assertEqual(len(names), len(set(names)))
+
+    def test_write_obo(self):
+        obo_path = os.path.join(self.tempdir, 'synthetic.obo')
+        write_obo(obo_path, self.terms)
+        godata = GoData(obo_path)
+        self.assertEqual(len(godata), 63)
+        self.assertEqual(max(godata.goid2maxdepth.values()), 4)
+        patterns = [term for concept in godata.values()
+                    for statement in concept.statements
+                    for term in statement.terms() if isinstance(term, Pattern)]
+        self.assertGreater(len(patterns), 0)
+
+    def test_generate_corpus(self):
+        corpus, goldstandard = generate_corpus(self.terms, 5, 4, seed=2)
+        self.assertEqual(len({sentence.docid for sentence in corpus}), 5)
+        self.assertGreater(len(goldstandard), 0)
+        texts = dict()
+        for sentence in corpus:
+            texts.setdefault(sentence.docid, []).append(sentence)
+        for docid, goid, start, end, text in goldstandard:
+            sentence = next(s for s in texts[docid]
+                            if s.offset <= start < s.offset + len(s.original_text))
+            local = start - sentence.offset
+            self.assertEqual(sentence.original_text[local:end - sentence.offset], text)
+
+        half = generate_corpus(self.terms, 5, 4, seed=2, annotated_rate=0.5)[1]
+        self.assertLess(len(half), len(goldstandard))
+        self.assertTrue(set(half) <= set(goldstandard))
+        self.assertEqual(len(generate_corpus(self.terms, 5, 4, seed=2, annotated_rate=0)[1]), 0)
+
+
+class TestSuite(unittest.TestCase):
+
+    def test_run_scale(self):
+        result = run_scale(40, 3, 4, 4, 5)
+        for stage in ['godata', 'compression', 'train', 'train.fit',
+                      'process', 'process.classify']:
+            self.assertIn(stage, result['timings'])
+        self.assertEqual(result['params']['terms'], 40)
+        self.assertGreater(result['f1'], 0.5)
+
+    def test_run_inference(self):
+        result = run_inference('tiny', batch_sizes=[1, 64], n=3, repeat=1)
+        self.assertEqual([(row['batch_size'], row['engine']) for row in result['results']],
+                         [(1, 'sklearn'), (1, 'flat'), (64, 'sklearn'), (64, 'flat')])
+        self.assertGreater(result['params']['candidates'], 0)
+
+    def test_run_backends(self):
+        result = run_backends('small', ['logistic', 'sgd'])
+        rows = result['results']
+        self.assertEqual([row['backend'] for row in rows], ['logistic', 'sgd'])
+        for row in rows:
+            self.assertGreater(row['bytes'], 0)
+            self.assertGreater(row['f1'], 0.5)
+
+    def test_compare(self):
+        result = {'params': {'terms': 10},
+                  'timings': {'train': 1.0, 'process': 0.5, 'godata': 0.01}}
+        baseline = {'scales': {'tiny': result}}
+        results = {'scales': {'tiny': copy.deepcopy(result)}}
+        self.assertEqual(compare(results, baseline), [])
+
+        results['scales']['tiny']['timings'].update(train=2.0, godata=0.04)
+        self.assertEqual(compare(results, baseline),
+                         [('tiny', 'train', 1.0, 2.0, 2.0)])
+
+        results['scales']['tiny']['params'] = {'terms': 20}
+        self.assertEqual(compare(results, baseline), [])
+
+
+if __name__ == '__main__':
+    import sys
+    sys.exit(unittest.main())
@@ -0,0 +1,193 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from __future__ import (absolute_import, division,
+                        print_function, unicode_literals)
+from builtins import *
+
+"""
+test_cache
+----------------------------------
+
+Tests for `cache` module.
+"""
+
+import os
+import subprocess
+import sys
+import tempfile
+import unittest
+
+from ncgocr import GoData, NCGOCR, Corpus
+from ncgocr.cache import CandidateCache, ResultCache, fingerprint
+from ncgocr.instrument import Instrument
+from ncgocr.pattern_regex import regex_out
+
+from tests.test_ncgocr import GO_PATH, get_corpus, get_goldstandard
+
+PROCESS_SCRIPT = '''
+import sys
+from ncgocr import NCGOCR
+from ncgocr.cache import ResultCache
+from tests.test_ncgocr import get_corpus
+model = NCGOCR.load(sys.argv[1], mmap_mode=None)
+model.result_cache = ResultCache(path=sys.argv[2])
+model.process(get_corpus())
+model.result_cache.save()
+print(model.result_cache.hits, model.result_cache.misses, len(model.result_cache))
+'''
+
+
+class TestCandidateCache(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.godata = GoData(GO_PATH)
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.corpus = get_corpus()
+        self.goldstandard = get_goldstandard()
+        self.ncgocr = NCGOCR(self.godata, n=5)
+        self.ncgocr.train(self.corpus, self.goldstandard)
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def process(self, cache):
+        ncgocr = self.ncgocr
+        return cache.process(self.corpus, ncgocr.extractor, ncgocr.candidate_recognizer,
+                             [ncgocr.basic_Ie, ncgocr.boost_Ie], regex_out)
+
+    def test_roundtrip(self):
+        cache = CandidateCache(self.tmpdir.name)
+        grounds, candidates = self.process(cache)
+        cached_grounds, cached_candidates = self.process(cache)
+        self.assertEqual((cache.hits, cache.misses), (1, 1))
+        self.assertEqual([g.evidences for g in cached_grounds],
+                         [g.evidences for g in grounds])
+        self.assertEqual([repr(c) for c in cached_candidates],
+                         [repr(c) for c in candidates])
+        self.assertTrue(all(c.sentence is s.sentence
+                            for c, s in zip(cached_candidates, candidates)))
+
+    def test_fingerprint(self):
+        ncgocr = self.ncgocr
+        indexes = [ncgocr.basic_Ie, ncgocr.boost_Ie]
+        Im = ncgocr.candidate_recognizer.Im
+        key = fingerprint(self.corpus, indexes, Im, regex_out)
+        self.assertEqual(key, fingerprint(get_corpus(), indexes, Im, regex_out))
+        self.assertNotEqual(key, fingerprint(self.corpus[1:], indexes, Im, regex_out))
+        self.assertNotEqual(key, fingerprint(self.corpus, indexes[:1], Im, regex_out))
+
+    def test_evict(self):
+        cache = CandidateCache(self.tmpdir.name, max_bytes=0)
+        self.process(cache)
+        self.assertEqual(os.listdir(self.tmpdir.name), [])
+
+    def test_train(self):
+        cache = CandidateCache(self.tmpdir.name)
+        for i in range(2):
+            ncgocr = NCGOCR(self.godata, n=5, candidate_cache=cache)
+            ncgocr.train(self.corpus, self.goldstandard)
+        self.assertEqual((cache.hits, cache.misses), (1, 1))
+        self.assertGreater(len(ncgocr.process(self.corpus)), 0)
+
+    def test_train_instrument(self):
+        cache = CandidateCache(self.tmpdir.name)
+        stats = []
+        for i in range(2):
+            instrument = Instrument(callback=stats.append)
+            ncgocr = NCGOCR(self.godata, n=5, candidate_cache=cache, instrument=instrument)
+            ncgocr.train(self.corpus, self.goldstandard)
+        missed, hit = stats
+        self.assertEqual(missed['counts']['candidate_cache.misses'], 1)
+        self.assertEqual(hit['counts']['candidate_cache.hits'], 1)
+        for stage in ['candidate_cache', 'extract.basic', 'generate', 'fit']:
+            self.assertIn(stage, missed['timings'])
+        self.assertIn('candidate_cache', hit['timings'])
+        self.assertNotIn('extract.basic', hit['timings'])
+
+
+class TestResultCache(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.godata = GoData(GO_PATH)
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.corpus = get_corpus()
+        self.ncgocr = NCGOCR(self.godata, n=5)
+        self.ncgocr.train(self.corpus, get_goldstandard())
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_lru(self):
+        row = ('GO:0005634', 0, 7, 'nucleus')
+        size = ResultCache.ENTRY_BYTES + ResultCache.ROW_BYTES + 14
+        cache = ResultCache(max_bytes=2 * size)
+        cache.put('a', [row])
+        cache.put('b', [row])
+        self.assertEqual(cache.get('a'), (row,))
+        cache.put('c', [row])
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual(list(cache.entries), ['a', 'c'])
+        self.assertEqual(cache.nbytes, 2 * size)
+        self.assertEqual((cache.hits, cache.misses), (1, 1))
+        self.assertEqual(cache.hit_rate, 0.5)
+
+    def test_process(self):
+        expected = self.ncgocr.process(self.corpus)
+        cache = ResultCache()
+        self.ncgocr.result_cache = cache
+        self.assertEqual(self.ncgocr.process(self.corpus), expected)
+        self.assertEqual((cache.hits, cache.misses), (0, len(self.corpus)))
+        self.assertEqual(self.ncgocr.process(self.corpus), expected)
+        self.assertEqual(cache.hits, len(self.corpus))
+
+        # the same sentence at another offset in another document
+        sentence = self.corpus[0]
+        moved = Corpus.from_text('Some words. ' + sentence.original_text, 'moved')
+        shift = 12 - sentence.offset
+        self.assertEqual(self.ncgocr.process(moved[1:]),
+                         {('moved', goid, start + shift, end + shift, text)
+                          for docid, goid, start, end, text in expected
+                          if docid == sentence.docid and
+                          sentence.offset <= start < sentence.offset + len(sentence.text)})
+
+    def test_fingerprint(self):
+        key = self.ncgocr.fingerprint()
+        self.assertEqual(key, self.ncgocr.fingerprint())
+        self.ncgocr.add_gold(get_goldstandard())
+        self.ncgocr.classifier.set_params(n_estimators=6)
+        self.assertNotEqual(key, self.ncgocr.fingerprint())
+
+    def test_save(self):
+        path = os.path.join(self.tmpdir.name, 'results.pkl')
+        cache = ResultCache(path=path)
+        self.ncgocr.result_cache = cache
+        expected = self.ncgocr.process(self.corpus)
+        cache.save()
+        loaded = ResultCache(path=path)
+        self.assertEqual(loaded.entries, cache.entries)
+        self.ncgocr.result_cache = loaded
+        self.assertEqual(self.ncgocr.process(self.corpus), expected)
+        self.assertEqual(loaded.misses, 0)
+
+    def test_persist_across_processes(self):
+        model_path = os.path.join(self.tmpdir.name, 'model.bundle')
+        cache_path = os.path.join(self.tmpdir.name, 'results.pkl')
+        self.ncgocr.save(model_path)
+        self.assertNotIn('_fingerprint', self.ncgocr.__getstate__())
+        root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        counts = []
+        for run in range(2):
+            output = subprocess.check_output(
+                [sys.executable, '-c', PROCESS_SCRIPT, model_path, cache_path], cwd=root,
+                env=dict(os.environ, PYTHONPATH=root), stderr=subprocess.DEVNULL)
+            counts.append([int(value) for value in output.split()[-3:]])
+        sentences = len(self.corpus)
+        self.assertEqual(counts[0], [0, sentences, sentences])
+        self.assertEqual(counts[1], [sentences, 0, sentences])
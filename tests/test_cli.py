@@ -0,0 +1,104 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from __future__ import (absolute_import, division,
+                        print_function, unicode_literals)
+from builtins import *
+
+"""
+test_cli
+----------------------------------
+
+Tests for `cli` module.
+"""
+
+import io
+import json
+import os
+import tempfile
+import unittest
+from mock import patch
+
+from ncgocr import GoData, NCGOCR
+from ncgocr import cli
+
+from tests.test_ncgocr import GO_PATH, TEXTS, get_corpus, get_goldstandard
+
+
+class TestCli(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.tmpdir = tempfile.TemporaryDirectory()
+        cls.model_path = os.path.join(cls.tmpdir.name, 'model.bundle')
+        ncgocr = NCGOCR(GoData(GO_PATH), n=5)
+        ncgocr.train(get_corpus(), get_goldstandard())
+        ncgocr.save(cls.model_path)
+        cls.expected = ncgocr.process(get_corpus()).sorted_results()
+
+        cls.input_dir = os.path.join(cls.tmpdir.name, 'input')
+        os.makedirs(cls.input_dir)
+        for docid, text in TEXTS:
+            with io.open(os.path.join(cls.input_dir, docid + '.txt'), 'w') as f:
+                f.write(text)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.tmpdir.cleanup()
+
+    def run_cli(self, argv, stdin=''):
+        stdout, stderr = io.StringIO(), io.StringIO()
+        with patch('sys.stdin', io.StringIO(stdin)), \
+             patch('sys.stdout', stdout), patch('sys.stderr', stderr):
+            code = cli.main(argv)
+        return code, stdout.getvalue(), stderr.getvalue()
+
+    def parse_tsv(self, output):
+        rows = []
+        for line in output.splitlines():
+            docid, goid, start, end, text = line.split('\t')
+            rows.append((docid, goid, int(start), int(end), text))
+        return rows
+
+    def test_read_documents(self):
+        stdin = io.StringIO('doc1\tfirst text\nsecond text\n')
+        self.assertEqual(list(cli.read_documents(['-'], stdin)),
+                         [('doc1', 'first text'), ('2', 'second text')])
+        self.assertEqual(list(cli.read_documents([self.input_dir], None)), TEXTS)
+
+    def test_read_batches(self):
+        stdin = io.StringIO('doc1\tfirst text\nsecond text\n')
+        batches = list(cli.read_batches([self.input_dir, '-'], stdin, 2))
+        self.assertEqual([len(batch.doc_set()) for batch in batches], [2, 1, 2])
+        self.assertEqual(sorted(batches[0].doc_set() | batches[1].doc_set()),
+                         [docid for docid, text in TEXTS])
+        self.assertEqual(batches[2].doc_set(), {'doc1', '2'})
+
+    def test_batched(self):
+        self.assertEqual(list(cli.batched(range(5), 2)), [[0, 1], [2, 3], [4]])
+
+    def test_annotate_dir(self):
+        code, stdout, stderr = self.run_cli(['annotate', self.input_dir,
+                                             '-m', self.model_path, '-b', '2'])
+        self.assertEqual(code, 0)
+        self.assertEqual(sorted(self.parse_tsv(stdout)), sorted(self.expected))
+        self.assertIn('batch 2: 3 docs', stderr)
+        self.assertIn('docs/s', stderr)
+
+    def test_annotate_stdin_jsonl(self):
+        stdin = ''.join('{}\t{}\n'.format(docid, text) for docid, text in TEXTS)
+        code, stdout, stderr = self.run_cli(['annotate', '-m', self.model_path,
+                                             '-f', 'jsonl', '-q'], stdin)
+        rows = [json.loads(line) for line in stdout.splitlines()]
+        self.assertEqual(sorted(tuple(row[field] for field in cli.FIELDS) for row in rows),
+                         sorted(self.expected))
+        self.assertNotIn('batch 1', stderr)
+
+    def test_annotate_workers(self):
+        code, stdout, stderr = self.run_cli(['annotate', self.input_dir, '-m', self.model_path,
+                                             '-b', '1', '-w', '2'])
+        self.assertEqual(sorted(self.parse_tsv(stdout)), sorted(self.expected))
+
+    def test_no_command(self):
+        code, stdout, stderr = self.run_cli([])
+        self.assertEqual(code, 2)
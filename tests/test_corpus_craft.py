@@ -0,0 +1,156 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from __future__ import (absolute_import, division,
+                        print_function, unicode_literals)
+from builtins import *
+
+"""
+test_corpus_craft
+----------------------------------
+
+Tests for `corpus_craft` module.
+"""
+
+import io
+import os
+import shutil
+import tarfile
+import tempfile
+import unittest
+
+from txttk.corpus import Corpus
+
+from ncgocr.corpus_craft import parse_knowtator, read_goldstandard, TarSource, Craft
+
+KNOWTATOR = """<?xml version="1.0" encoding="UTF-8"?>
+<annotations textSource="{pmid}.txt">
+  <annotation>
+    <mention id="CRAFT_GO_Instance_1" />
+    <annotator id="CRAFT_GO_Instance_2">Mike Bada</annotator>
+    <span start="{start}" end="{end}" />
+    <spannedText>{text}</spannedText>
+  </annotation>
+  <classMention id="CRAFT_GO_Instance_1">
+    <mentionClass id="{goid}">{text}</mentionClass>
+  </classMention>
+  <annotation>
+    <mention id="CRAFT_GO_Instance_3" />
+    <span start="5" end="9" />
+    <spannedText>none</spannedText>
+  </annotation>
+  <classMention id="CRAFT_GO_Instance_3">
+    <mentionClass id="independent_continuant">none</mentionClass>
+  </classMention>
+</annotations>
+"""
+
+ROWS = [('11532192', 'GO:0005623', 12, 16, 'cell'),
+        ('11597317', 'GO:0006915', 0, 9, 'apoptosis'),
+        ('12079497', 'GO:0005634', 30, 37, 'nucleus')]
+
+
+class TestGoldstandard(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.filepaths = []
+        for pmid, goid, start, end, text in ROWS:
+            filepath = self.write(pmid, goid, start, end, text)
+            self.filepaths.append(filepath)
+        self.cache_path = os.path.join(self.tmpdir.name, 'goldstandard.npz')
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def write(self, pmid, goid, start, end, text):
+        filepath = os.path.join(self.tmpdir.name, pmid + '.txt.knowtator.xml')
+        with io.open(filepath, 'w', encoding='utf-8') as f:
+            f.write(KNOWTATOR.format(pmid=pmid, goid=goid, start=start, end=end, text=text))
+        return filepath
+
+    def test_parse_knowtator(self):
+        self.assertEqual(parse_knowtator(self.filepaths[0], '11532192'), ROWS[:1])
+
+    def test_read_goldstandard(self):
+        self.assertEqual(read_goldstandard(self.filepaths, workers=1), set(ROWS))
+        self.assertEqual(read_goldstandard(self.filepaths, workers=2, chunk_size=1),
+                         set(ROWS))
+
+    def test_cache(self):
+        goldstandard = read_goldstandard(self.filepaths, 1, cache_path=self.cache_path)
+        self.assertTrue(os.path.isfile(self.cache_path))
+        cached = read_goldstandard(self.filepaths, 1, cache_path=self.cache_path)
+        self.assertEqual(cached, goldstandard)
+        self.assertTrue(all(isinstance(row[2], int) for row in cached))
+
+        self.write('11532192', 'GO:0005623', 12, 17, 'cells')
+        updated = read_goldstandard(self.filepaths, 1, cache_path=self.cache_path)
+        self.assertIn(('11532192', 'GO:0005623', 12, 17, 'cells'), updated)
+        self.assertNotIn(ROWS[0], updated)
+
+
+class TestTarSource(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        root = os.path.join(self.tmpdir.name, 'craft-1.0')
+        self.texts = dict()
+        for i, (pmid, goid, start, end, text) in enumerate(ROWS):
+            content = 'The {} was seen.\nIt was {} again.'.format(text, text)
+            self.texts[pmid] = content
+            folder = ['go_bpmf', 'go_cc'][i % 2]
+            for path, data in [(('articles', 'txt', pmid + '.txt'), content),
+                               (('knowtator-xml', folder, pmid + '.txt.knowtator.xml'),
+                                KNOWTATOR.format(pmid=pmid, goid=goid, start=start,
+                                                 end=end, text=text)),
+                               (('articles', 'pdf', pmid + '.txt'), 'unwanted')]:
+                filepath = os.path.join(root, *path)
+                os.makedirs(os.path.dirname(filepath), exist_ok=True)
+                with io.open(filepath, 'w', encoding='utf-8') as f:
+                    f.write(data)
+        self.tarball_path = os.path.join(self.tmpdir.name, 'craft-1.0.tar.gz')
+        with tarfile.open(self.tarball_path, 'w:gz') as tar:
+            tar.add(root, 'craft-1.0')
+        shutil.rmtree(root)
+        self.source = TarSource(self.tarball_path)
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def expected_corpus(self):
+        corpus = Corpus('CRAFT')
+        for pmid, text in sorted(self.texts.items()):
+            corpus += Corpus.from_text(text, pmid)
+        return corpus
+
+    def assertSameCorpus(self, corpus, expected):
+        key = lambda s: (s.docid, s.offset, s.text)
+        self.assertEqual(sorted(map(key, corpus)), sorted(map(key, expected)))
+
+    def test_read_all(self):
+        corpus, goldstandard = self.source.read_all()
+        self.assertSameCorpus(corpus, self.expected_corpus())
+        self.assertEqual(goldstandard, set(ROWS))
+        self.assertSameCorpus(self.source.get_corpus(), self.expected_corpus())
+        self.assertEqual(self.source.get_goldstandard(), set(ROWS))
+
+    def test_index(self):
+        self.assertFalse(os.path.isfile(self.source.index_path))
+        index = self.source.index
+        self.assertEqual(len(index), 2 * len(ROWS))
+        self.assertTrue(os.path.isfile(self.source.index_path))
+        name = 'craft-1.0/articles/txt/11597317.txt'
+        self.assertEqual(self.source.read(name).decode('utf-8'), self.texts['11597317'])
+        self.assertEqual(TarSource(self.tarball_path).index, index)
+
+    def test_craft(self):
+        craft = Craft(self.tmpdir.name, extract=False)
+        self.assertEqual(craft.get_goldstandard(), set(ROWS))
+        self.assertSameCorpus(craft.get_corpus(), self.expected_corpus())
+        self.assertFalse(os.path.isdir(craft.craft_path))
+
+
+if __name__ == '__main__':
+    import sys
+    sys.exit(unittest.main())
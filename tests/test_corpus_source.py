@@ -0,0 +1,66 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from __future__ import (absolute_import, division,
+                        print_function, unicode_literals)
+from builtins import *
+
+"""
+test_corpus_source
+----------------------------------
+
+Tests for `corpus_source` module.
+"""
+
+import io
+import os
+import tempfile
+import unittest
+
+from txttk.corpus import Corpus
+
+from ncgocr.corpus_source import DirectorySource
+
+from tests.test_ncgocr import TEXTS
+
+
+def sentence_keys(sentences):
+    return sorted((s.docid, s.offset, s.text) for s in sentences)
+
+
+class TestDirectorySource(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        for docid, text in TEXTS:
+            with io.open(os.path.join(self.tmpdir.name, docid + '.txt'), 'w') as f:
+                f.write(text)
+        with io.open(os.path.join(self.tmpdir.name, 'notes.md'), 'w') as f:
+            f.write('Not a document.')
+        self.expected = sentence_keys(Corpus.from_dir(self.tmpdir.name, 'testing'))
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_paths(self):
+        source = DirectorySource(self.tmpdir.name)
+        self.assertEqual(sorted(docid for path, docid in source.paths()),
+                         [docid for docid, text in TEXTS])
+
+    def test_iter(self):
+        for workers in [1, 2]:
+            source = DirectorySource(self.tmpdir.name, workers=workers, chunk_size=1,
+                                     read_ahead=1)
+            self.assertEqual(sentence_keys(source), self.expected)
+
+    def test_documents_order(self):
+        source = DirectorySource(self.tmpdir.name, workers=2, chunk_size=2)
+        docids = [document[0].docid for document in source.documents()]
+        self.assertEqual(docids, [docid for path, docid in source.paths()])
+
+    def test_batches(self):
+        source = DirectorySource(self.tmpdir.name, 'testing', workers=1)
+        batches = list(source.batches(2))
+        self.assertEqual([len(b.doc_set()) for b in batches], [2, 1])
+        self.assertEqual(sentence_keys(s for b in batches for s in b), self.expected)
+        self.assertEqual(sentence_keys(source.to_corpus()), self.expected)
@@ -15,6 +15,8 @@ Tests for `extractor` module.
 import unittest
 
 from ncgocr import extractor as ex
+from ncgocr.concept import Entity
+from txttk.corpus import Sentence
 
 class TestFunctions(unittest.TestCase):
 
@@ -29,6 +31,12 @@ class TestFunctions(unittest.TestCase):
         result = ex._fit_border(text, span)
         self.assertEqual(result, True)
 
+    def test_leftmost_longest(self):
+        matches = [('membrane', 10), ('membrane potential', 10), ('potential', 19),
+                   ('cell', 0), ('cell membrane', 0)]
+        result = ex._leftmost_longest(matches)
+        self.assertEqual(result, [('cell membrane', 0), ('potential', 19)])
+
 
 class TextFunctions2(unittest.TestCase):
     def test_nearest_evidences(self):
@@ -40,3 +48,34 @@ class TextFunctions2(unittest.TestCase):
         result = ex.nearest_evidences(current_position, wanted_terms, positional_index)
         wanted = [2, 3]
         self.assertEqual(result, wanted)
+
+
+class TestLongestMatch(unittest.TestCase):
+    def setUp(self):
+        texts = ['membrane', 'membrane potential', 'potential', 'lost']
+        self.term_index = {text: {Entity(text, 'GO:0000001')} for text in texts}
+        self.sentence = Sentence('It lost its membrane potential.', 100, 'doc1')
+
+    def test_solid_extractor(self):
+        extractor = ex.SolidExtractor(self.term_index)
+        texts = [e.text for e in extractor.findall(self.sentence)]
+        self.assertEqual(sorted(texts),
+                         ['lost', 'membrane', 'membrane potential', 'potential'])
+
+        evidences, hits = extractor.scan(self.sentence, longest=True)
+        self.assertEqual([(e.text, e.start) for e in evidences],
+                         [('lost', 103), ('membrane potential', 112)])
+        self.assertEqual(hits, 4)
+
+        longest = ex.SolidExtractor(self.term_index, longest=True)
+        self.assertEqual(longest.findall(self.sentence), evidences)
+        self.assertEqual(len(longest.findall(self.sentence, longest=False)), 4)
+
+    def test_join_extractor(self):
+        solid = ex.SolidExtractor(self.term_index)
+        join = ex.JoinExtractor([solid], ['basic'], longest=['basic'])
+        self.assertEqual([e.text for e in join.findall(self.sentence)],
+                         ['lost', 'membrane potential'])
+        self.assertEqual(len(ex.JoinExtractor([solid], ['basic']).findall(self.sentence)), 4)
+        with self.assertRaises(ValueError):
+            ex.JoinExtractor([solid], ['basic'], longest=['boost'])
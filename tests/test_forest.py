@@ -0,0 +1,77 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from __future__ import (absolute_import, division,
+                        print_function, unicode_literals)
+from builtins import *
+
+"""
+test_forest
+----------------------------------
+
+Tests for `forest` module.
+"""
+
+import unittest
+
+import numpy as np
+import scipy.sparse as sp
+from sklearn.ensemble import RandomForestClassifier
+
+from ncgocr.forest import FlatForest
+
+
+class TestFlatForest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        rng = np.random.RandomState(0)
+        X = sp.random(400, 64, density=0.1, format='csr', random_state=rng)
+        X.data = np.round(X.data * 4 - 2, 1)
+        y = (X[:, :8].sum(axis=1).A1 + rng.normal(0, 0.3, 400) > 0).astype(int)
+        cls.classifier = RandomForestClassifier(n_estimators=7, random_state=0).fit(X, y)
+        cls.X = X
+
+    def test_predict(self):
+        forest = FlatForest.from_classifier(self.classifier)
+        self.assertEqual(forest.n_estimators, 7)
+        self.assertEqual(list(forest.predict(self.X)), list(self.classifier.predict(self.X)))
+        np.testing.assert_allclose(forest.predict_proba(self.X),
+                                   self.classifier.predict_proba(self.X))
+        np.testing.assert_array_equal(forest.apply(self.X), self.classifier.apply(self.X) +
+                                      forest.roots)
+        for size in [1, 3, 50]:
+            batch = self.X[:size]
+            self.assertEqual(list(forest.predict(batch)),
+                             list(self.classifier.predict(batch)))
+        dense = self.X[:20].toarray()
+        self.assertEqual(list(forest.predict(dense)), list(self.classifier.predict(dense)))
+        self.assertEqual(len(forest.predict(self.X[:0])), 0)
+
+    def test_apply(self):
+        rng = np.random.RandomState(1)
+        X = sp.random(300, 32, density=0.3, format='csr', random_state=rng)
+        X.data = np.round(X.data * 2 - 1, 2)
+        y = rng.randint(0, 3, 300)
+        for params in [{}, {'max_leaf_nodes': 20}, {'bootstrap': False, 'max_features': 1}]:
+            classifier = RandomForestClassifier(n_estimators=5, random_state=0, **params)
+            classifier.fit(X, y)
+            forest = FlatForest.from_classifier(classifier)
+            for batch in [X, X.toarray(), X[:1], sp.csr_matrix((2, 32))]:
+                np.testing.assert_array_equal(forest.apply(batch),
+                                              classifier.apply(batch) + forest.roots)
+        with self.assertRaises(ValueError):
+            forest.apply(X[:, :4])
+
+    def test_single_class(self):
+        classifier = RandomForestClassifier(n_estimators=3).fit(self.X, np.ones(400, dtype=int))
+        forest = FlatForest.from_classifier(classifier)
+        self.assertEqual(list(forest.predict(self.X[:5])), [1] * 5)
+
+    def test_arrays(self):
+        forest = FlatForest.from_classifier(self.classifier)
+        arrays = forest.to_arrays()
+        self.assertIn('forest_threshold', arrays)
+        again = FlatForest.from_arrays(arrays)
+        self.assertEqual(again.node_count, forest.node_count)
+        self.assertEqual(list(again.predict(self.X)), list(forest.predict(self.X)))
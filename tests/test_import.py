@@ -0,0 +1,73 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from __future__ import (absolute_import, division,
+                        print_function, unicode_literals)
+from builtins import *
+
+"""
+test_import
+----------------------------------
+
+Tests for the lazy imports of the `ncgocr` package.
+"""
+
+import importlib
+import json
+import subprocess
+import sys
+import unittest
+
+import ncgocr
+
+# seconds allowed for "import ncgocr" in a fresh interpreter
+IMPORT_BUDGET = 0.2
+
+HEAVY = ['sklearn', 'scipy', 'numpy', 'lxml', 'acora', 'intervaltree',
+         'joblib', 'urllib.request']
+
+SCRIPT = """
+import json, sys, time
+start = time.perf_counter()
+{}
+seconds = time.perf_counter() - start
+print(json.dumps({{'seconds': seconds, 'modules': sorted(sys.modules)}}))
+"""
+
+
+def run_import(statement):
+    output = subprocess.check_output([sys.executable, '-c', SCRIPT.format(statement)])
+    return json.loads(output.decode('utf-8'))
+
+
+class TestImport(unittest.TestCase):
+
+    def assertNotLoaded(self, modules):
+        loaded = [name for name in HEAVY if name in modules]
+        self.assertEqual(loaded, [])
+
+    def test_import_budget(self):
+        result = min((run_import('import ncgocr') for i in range(3)),
+                     key=lambda result: result['seconds'])
+        self.assertLess(result['seconds'], IMPORT_BUDGET)
+        self.assertNotLoaded(result['modules'])
+
+    def test_light_features(self):
+        result = run_import('from ncgocr import GoData, regex_out, regex_in, Craft, Corpus')
+        self.assertNotLoaded(result['modules'])
+        result = run_import('from ncgocr.cli import get_parser; get_parser()')
+        self.assertNotLoaded(result['modules'])
+
+    def test_public_names(self):
+        for name in ncgocr.__all__:
+            module = importlib.import_module(ncgocr._name2module[name])
+            self.assertIs(getattr(ncgocr, name), getattr(module, name))
+        self.assertIs(ncgocr.learning, importlib.import_module('ncgocr.learning'))
+        with self.assertRaises(AttributeError):
+            ncgocr.no_such_name
+        for name in ['OrderedDict', 'defaultdict', 'namedtuple', 'partial', 'copy']:
+            self.assertIn(name, ncgocr.__all__)
+
+
+if __name__ == '__main__':
+    sys.exit(unittest.main())
@@ -0,0 +1,82 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from __future__ import (absolute_import, division,
+                        print_function, unicode_literals)
+from builtins import *
+
+"""
+test_instrument
+----------------------------------
+
+Tests for `instrument` module.
+"""
+
+import json
+import unittest
+
+from txttk.corpus import Sentence
+
+from ncgocr import GoData, NCGOCR
+from ncgocr.instrument import Instrument
+
+from tests.test_ncgocr import GO_PATH, get_corpus, get_goldstandard
+
+
+class TestInstrument(unittest.TestCase):
+
+    def test_record(self):
+        instrument = Instrument(top_n=1)
+        instrument.add('stage', 0.5)
+        with instrument.stage('stage'):
+            pass
+        instrument.count('items', 2)
+        instrument.count('items')
+        instrument.sentence(Sentence('Fast.', 0, 'doc'), 0.1)
+        instrument.sentence(Sentence('Slow.', 5, 'doc'), 0.2)
+        instrument.sentence(Sentence('Fast.', 0, 'doc'), 0.2)
+        self.assertGreaterEqual(instrument.timings['stage'], 0.5)
+        self.assertEqual(instrument.counts['items'], 3)
+        slowest = instrument.slowest()
+        self.assertEqual([item[1:] for item in slowest], [('doc', 0, 'Fast.')])
+        self.assertAlmostEqual(slowest[0][0], 0.3)
+        stats = json.loads(instrument.to_json())
+        self.assertEqual(stats['slowest'][0]['offset'], 0)
+        instrument.reset()
+        self.assertEqual(instrument.stats()['counts'], {})
+
+
+class TestNcgocrInstrument(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.godata = GoData(GO_PATH)
+
+    def test_train_process(self):
+        corpus = get_corpus()
+        calls = []
+        instrument = Instrument(top_n=3, callback=calls.append)
+        ncgocr = NCGOCR(self.godata, n=5, instrument=instrument)
+        ncgocr.train(corpus, get_goldstandard())
+        self.assertIn('fit', instrument.timings)
+        instrument.reset()
+
+        result = ncgocr.process(corpus)
+        stats = calls[-1]
+        self.assertEqual(len(calls), 2)
+        self.assertEqual(stats['calls'], {'process': 1})
+        for stage in ['extract.basic', 'extract.pattern', 'extract.boost',
+                      'generate', 'measure', 'hash', 'classify']:
+            self.assertIn(stage, stats['timings'])
+        counts = stats['counts']
+        self.assertEqual(counts['sentences'], len(corpus))
+        self.assertGreater(counts['basic.hits'], 0)
+        self.assertGreater(counts['basic.evidences'], 0)
+        candidates = ncgocr.candidate_recognizer.process(ncgocr.extractor.process(corpus))
+        self.assertEqual(counts['candidates'], len(candidates))
+        self.assertGreater(counts['nonzeros'], 0)
+        self.assertGreaterEqual(counts['positives'], len(result))
+        self.assertEqual(len(stats['slowest']), 3)
+
+        ncgocr.instrument = None
+        self.assertEqual(ncgocr.process(corpus), result)
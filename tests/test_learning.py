@@ -15,6 +15,7 @@ Tests for `learning` module.
 import unittest
 from mock import MagicMock
 from collections import OrderedDict
+import numpy as np
 
 from ncgocr import learning
 from ncgocr.extractor import Entity, Pattern, Evidence, Grounds
@@ -85,3 +86,154 @@ class TestFeatureExtract(unittest.TestCase):
         wanted = OrderedDict([('OMIT=pattern', True),
                               ('SATURATION', 0.5)])
         self.assertEqual(result, wanted)
+
+    def test_measurement_cache(self):
+        from sklearn.feature_extraction import FeatureHasher
+        candidates = [self.c0, self.c1, self.c2, self.c0, self.c1]
+        hasher = FeatureHasher(n_features=1024)
+        wanted = hasher.transform(learning.bulk_measurements(candidates, self.godata))
+        cache = learning.MeasurementCache.from_hasher(self.godata, hasher, maxsize=2)
+        result = cache.transform(candidates)
+        self.assertTrue((result.toarray() == wanted.toarray()).all())
+
+        info = cache.cache_info()
+        self.assertEqual(info['concept'].misses, 2)
+        self.assertEqual(info['concept'].hits, 3)
+        self.assertEqual(info['bias'].misses, 5)
+        self.assertEqual(info['bias'].currsize, 2)
+        self.assertEqual(cache.hit_rate(), 3/10)
+
+
+class TestLabelMarker(unittest.TestCase):
+    def setUp(self):
+        import random
+        rand = random.Random(0)
+        goids = ['GO:0000001', 'GO:0000002', 'GO:0000003']
+        docids = ['doc0', 'doc1', 'doc2']
+        goldstandard = set()
+        for i in range(60):
+            start = rand.randrange(0, 200)
+            end = start + rand.randrange(1, 15)
+            goldstandard.add((rand.choice(docids[:2]), rand.choice(goids), start, end, 'text'))
+
+        candidates = []
+        for i in range(500):
+            start = rand.randrange(0, 210)
+            end = start + rand.randrange(0, 20)
+            term = Entity('text', 'GO:testing')
+            evidences = [Evidence(term, 'text', start, end)]
+            if rand.random() < 0.5:
+                evidences.append(Evidence(term, 'text', end, end + rand.randrange(0, 5)))
+            statement = Statement(rand.choice(goids) + '%000', evidences)
+            sentence = Sentence('text', 0, rand.choice(docids))
+            candidates.append(Candidate(statement, evidences, sentence))
+
+        self.label_marker = learning.LabelMarker(goldstandard)
+        self.candidates = candidates
+
+    def test_batch_mark(self):
+        wanted = self.label_marker.markall(self.candidates)
+        result = self.label_marker.batch_mark(self.candidates)
+        self.assertEqual(list(result), wanted)
+        self.assertGreater(sum(wanted), 0)
+
+    def test_process(self):
+        result = self.label_marker.process(self.candidates[:1])
+        self.assertEqual(len(result), 1)
+        result = self.label_marker.process([])
+        self.assertEqual(len(result), 0)
+
+
+class TestCascade(unittest.TestCase):
+    def setUp(self):
+        sentence = Sentence('testing patterning boost', 0, 'doc00')
+        entity = Entity('test', 'GO:testing')
+        boost = Entity('test', 'boost')
+        p0 = Pattern('pattern', 'annotator')
+        p1 = Pattern('regulate', 'annotator')
+        e0 = Evidence(entity, 'testing', 0, 7)
+        e1 = Evidence(p0, 'patterning', 8, 18)
+        e2 = Evidence(p1, 'regulate', 19, 24)
+        e3 = Evidence(boost, 'testing', 0, 7)
+        s0 = Statement('GO:0000001%000', [e0])
+        s1 = Statement('GO:0000002%000', [e1, e2, e2, e2])
+        s2 = Statement('GO:0000003%testing', [e3])
+        self.exact = Candidate(s0, [e0], sentence)
+        self.pattern_only = Candidate(s1, [e1], sentence)
+        self.saturated = Candidate(s1, [e1, e2, e2, e2], sentence)
+        self.boosted = Candidate(s2, [e3], sentence)
+
+    def test_fit_decide(self):
+        candidates = [self.exact] * 20 + [self.pattern_only] * 20 + [self.saturated] * 4
+        y = [1] * 19 + [0] + [0] * 20 + [1] * 4
+        cascade = learning.Cascade(precision=0.9, min_support=10).fit(candidates, y)
+        self.assertTrue(cascade.use_accept)
+        self.assertEqual(cascade.reject_below, 0.25)
+
+        result = cascade.decide([self.exact, self.pattern_only, self.saturated, self.boosted])
+        wanted = [learning.Cascade.ACCEPT, learning.Cascade.REJECT,
+                  learning.Cascade.UNDECIDED, learning.Cascade.UNDECIDED]
+        self.assertEqual(list(result), wanted)
+
+        strict = learning.Cascade(precision=0.99, min_support=10).fit(candidates, y)
+        self.assertFalse(strict.use_accept)
+        self.assertEqual(strict.reject_below, 0.25)
+
+    def test_effect(self):
+        cascade = learning.Cascade()
+        decisions = np.array([1, 0, -1, -1])
+        y_forest = np.array([1, 1, 0, 1])
+        y_true = np.array([1, 0, 0, 1])
+        result = cascade.effect(decisions, y_forest, y_true)
+        self.assertEqual(result['bypass'], 0.5)
+        self.assertEqual(result['forest_precision'], 2/3)
+        self.assertEqual(result['cascade_precision'], 1.0)
+        self.assertEqual(result['cascade_recall'], 1.0)
+
+
+class TestNegativeSampler(unittest.TestCase):
+    def setUp(self):
+        sentence = Sentence('testing', 0, 'doc00')
+        evidence = Evidence(Entity('test', 'GO:testing'), 'testing', 0, 7)
+        self.candidates = []
+        for statid in ['GO:0000001%000'] * 20 + ['GO:0000002%000'] * 10:
+            statement = Statement(statid, [evidence])
+            self.candidates.append(Candidate(statement, [evidence], sentence))
+        self.y = np.array([1] * 5 + [0] * 15 + [0] * 10)
+        concept = MagicMock()
+        concept.namespace = 'mocked'
+        self.godata = {'GO:0000001': concept, 'GO:0000002': concept}
+
+    def test_sample(self):
+        sampler = learning.NegativeSampler(ratio=0.2)
+        kept, left_out = sampler.sample(self.candidates, self.y, self.godata)
+        self.assertEqual(sorted(set(kept) | set(left_out)), list(range(30)))
+        self.assertTrue(set(range(5)) <= set(kept))
+        self.assertEqual(sum(1 for i in kept if 5 <= i < 20), 3)
+        self.assertEqual(sum(1 for i in kept if i >= 20), 2)
+        self.assertEqual(sampler.stats['strata'], 2)
+
+        weights = sampler.weights(self.y, kept)
+        self.assertEqual(list(weights[:5]), [1.0] * 5)
+        self.assertAlmostEqual(weights[self.y[kept] == 0].sum(), 25)
+
+        hard = left_out[:2]
+        weights = sampler.weights(self.y, kept, hard)
+        self.assertEqual(len(weights), len(kept) + 2)
+        self.assertAlmostEqual(weights.sum(), 5 + 25)
+        self.assertEqual(sampler.stats['hard'], 2)
+
+        again, _ = learning.NegativeSampler(ratio=0.2).sample(self.candidates, self.y,
+                                                               self.godata)
+        self.assertEqual(list(again), list(kept))
+
+    def test_stratify(self):
+        sampler = learning.NegativeSampler(ratio=0.2, stratify='namespace', reweight=False)
+        kept, left_out = sampler.sample(self.candidates, self.y, self.godata)
+        self.assertEqual(len(kept), 5 + 5)
+        self.assertEqual(sampler.stats['strata'], 1)
+        self.assertIsNone(sampler.weights(self.y, kept))
+        with self.assertRaises(ValueError):
+            learning.NegativeSampler(ratio=0)
+        with self.assertRaises(ValueError):
+            learning.NegativeSampler(stratify='goid')
@@ -12,12 +12,358 @@ test_ncgocr
 Tests for `ncgocr` module.
 """
 
+import gc
+import os
+import pickle
+import tempfile
+import tracemalloc
 import unittest
 
+import joblib
+
 from ncgocr import Craft, GoData, NCGOCR, Corpus
-from ncgocr.learning import evaluate
+from ncgocr.ncgocr import BUNDLE_FORMAT, BUNDLE_VERSION, CANDIDATE_BYTES, CLASSIFY_BYTES
+from ncgocr.benchmark.suite import SCALES, synthetic_data
+from ncgocr.concept import Pattern
+from ncgocr.learning import evaluate, Cascade, NegativeSampler
+from ncgocr.backends import LogisticBackend
+from ncgocr.corpus_source import DirectorySource
+from txttk.corpus import Annotation
+
+GO_PATH = 'tests/go_mini.obo'
+
+TEXTS = [
+    ('doc1', 'Apoptosis was observed in the cell. The mitochondrion lost its '
+             'membrane potential. Proteins bind to the nucleus.'),
+    ('doc2', 'Upregulation of apoptosis requires gene expression. Signal '
+             'transduction in mitochondria is rapid.'),
+    ('doc3', 'The protein binding assay showed apoptotic process in the cell '
+             'nucleus. Cell differentiation was normal.'),
+]
+
+GOLD = [
+    ('doc1', 'GO:0006915', 'Apoptosis'),
+    ('doc1', 'GO:0005623', 'cell'),
+    ('doc1', 'GO:0005739', 'mitochondrion'),
+    ('doc1', 'GO:0005634', 'nucleus'),
+    ('doc2', 'GO:0043065', 'Upregulation of apoptosis'),
+    ('doc2', 'GO:0010467', 'gene expression'),
+    ('doc2', 'GO:0007165', 'Signal transduction'),
+    ('doc2', 'GO:0005739', 'mitochondria'),
+    ('doc3', 'GO:0005515', 'protein binding'),
+    ('doc3', 'GO:0006915', 'apoptotic process'),
+    ('doc3', 'GO:0005634', 'cell nucleus'),
+    ('doc3', 'GO:0030154', 'Cell differentiation'),
+]
+
+def get_corpus():
+    corpus = Corpus('testing')
+    for docid, text in TEXTS:
+        corpus += Corpus.from_text(text, docid)
+    return corpus
+
+def get_goldstandard():
+    texts = dict(TEXTS)
+    goldstandard = Annotation()
+    for docid, goid, spanned_text in GOLD:
+        start = texts[docid].index(spanned_text)
+        end = start + len(spanned_text)
+        goldstandard.add((docid, goid, start, end, spanned_text))
+    return goldstandard
+
 
 class TestNcgocr(unittest.TestCase):
 
+    @classmethod
+    def setUpClass(cls):
+        cls.godata = GoData(GO_PATH)
+
+    def setUp(self):
+        self.corpus = get_corpus()
+        self.goldstandard = get_goldstandard()
+
     def test_something(self):
         pass
+
+    def test_train_process(self):
+        ncgocr = NCGOCR(self.godata, n=5)
+        ncgocr.train(self.corpus, self.goldstandard)
+        result = ncgocr.process(self.corpus)
+        report = evaluate(result, self.goldstandard, 'training')
+        self.assertGreater(report.f1(), 0.5)
+
+    def test_process_texts(self):
+        ncgocr = NCGOCR(self.godata, n=5)
+        ncgocr.train(self.corpus, self.goldstandard)
+        expected = ncgocr.process(self.corpus)
+        results = list(ncgocr.process_texts(TEXTS, batch_size=2))
+        self.assertEqual([docid for docid, annotation in results],
+                         [docid for docid, text in TEXTS])
+        merged = set()
+        for docid, annotation in results:
+            self.assertTrue(all(item[0] == docid for item in annotation))
+            merged |= annotation
+        self.assertEqual(merged, set(expected))
+
+        repeated = list(ncgocr.process_texts([TEXTS[0], TEXTS[0], ('empty', '')]))
+        self.assertEqual(repeated[0], repeated[1])
+        self.assertEqual(repeated[2], ('empty', Annotation()))
+
+    def test_measurement_cache(self):
+        ncgocr = NCGOCR(self.godata, n=5, cache_size=100)
+        ncgocr.train(self.corpus, self.goldstandard)
+        plain = NCGOCR(self.godata, n=5)
+        plain.train(self.corpus, self.goldstandard)
+        candidates = ncgocr.candidate_recognizer.process(ncgocr.extractor.process(self.corpus))
+        self.assertTrue((ncgocr.featurize(candidates) == plain.featurize(candidates)).all())
+        self.assertGreater(ncgocr.measurement_cache.hit_rate(), 0)
+
+    def test_process_source(self):
+        ncgocr = NCGOCR(self.godata, n=5)
+        ncgocr.train(self.corpus, self.goldstandard)
+        expected = ncgocr.process(self.corpus)
+        with tempfile.TemporaryDirectory() as tmpdir:
+            for docid, text in TEXTS:
+                with open(os.path.join(tmpdir, docid + '.txt'), 'w') as f:
+                    f.write(text)
+            source = DirectorySource(tmpdir, workers=1)
+            self.assertEqual(ncgocr.process(source, batch_size=2), expected)
+            # the first batch is annotated before the others are read
+            batches = ncgocr.process_batches(source.batches(1))
+            batch, result = next(batches)
+            self.assertEqual(len(batch.doc_set()), 1)
+            self.assertTrue(all(item[0] in batch.doc_set() for item in result))
+            batches.close()
+
+    def test_cascade(self):
+        cascade = Cascade(precision=0.5, min_support=1)
+        ncgocr = NCGOCR(self.godata, n=5, cascade=cascade)
+        ncgocr.train(self.corpus, self.goldstandard)
+        self.assertIn('cascade_recall', cascade.stats)
+        self.assertTrue(ncgocr.classifier.oob_score)
+        self.assertGreater(cascade.stats['held_out'], 0)
+        result = ncgocr.process(self.corpus)
+        self.assertGreater(cascade.stats['bypassed'], 0)
+        self.assertEqual(cascade.stats['processed'],
+                         len(ncgocr.candidate_recognizer.process(ncgocr.extractor.process(self.corpus))))
+        self.assertGreater(len(result), 0)
+
+    def test_cascade_held_out(self):
+        cascade = Cascade(precision=0.5, min_support=1)
+        ncgocr = NCGOCR(self.godata, backend=LogisticBackend(), cascade=cascade)
+        ncgocr.train(self.corpus, self.goldstandard, keep_features=True)
+        held, y_pred = ncgocr._held_out_predict(ncgocr.training_X, ncgocr.training_y)
+        self.assertEqual(cascade.stats['held_out'], len(ncgocr.training_y))
+        self.assertTrue(held.all())
+        # the folds are predicted by classifiers which did not see them
+        self.assertEqual(len(y_pred), len(ncgocr.training_y))
+
+    def test_save_load(self):
+        ncgocr = NCGOCR(self.godata, n=5, cache_size=100)
+        ncgocr.train(self.corpus, self.goldstandard)
+        expected = ncgocr.process(self.corpus)
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, 'model.bundle')
+            ncgocr.save(path)
+            loaded = NCGOCR.load(path)
+            self.assertGreaterEqual(loaded.load_time, 0)
+            self.assertEqual(loaded.measurement_cache.concept_cache.maxsize, 100)
+            self.assertEqual(set(loaded.process(self.corpus)), set(expected))
+        state = ncgocr.__getstate__()
+        self.assertFalse({'e0', 'e2', 'extractor'} & set(state))
+        self.assertEqual(loaded.extractor.names, ['basic', 'pattern', 'boost'])
+
+        untrained = NCGOCR(self.godata, n=5)
+        copied = pickle.loads(pickle.dumps(untrained))
+        self.assertFalse(hasattr(copied, 'extractor'))
+        self.assertIsNotNone(copied.e0)
+
+    def test_load_not_bundle(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, 'other.pickle')
+            joblib.dump({'format': 'other'}, path)
+            with self.assertRaises(ValueError):
+                NCGOCR.load(path)
+            joblib.dump({'format': BUNDLE_FORMAT, 'version': BUNDLE_VERSION - 1}, path)
+            with self.assertRaises(ValueError):
+                NCGOCR.load(path)
+
+    def test_boost(self):
+        ncgocr = NCGOCR(self.godata, n=5)
+        counts = ncgocr.boost(self.goldstandard)
+        self.assertEqual(counts['rows'], len(self.goldstandard))
+        self.assertGreater(counts['Im'], 0)
+        self.assertEqual(counts['Ie'], sum(len(v) for v in ncgocr.boost_Ie.values()))
+
+        repeated = {('other' + item[0],) + item[1:] for item in self.goldstandard}
+        counts = ncgocr.boost(repeated | self.goldstandard)
+        self.assertEqual((counts['Ie'], counts['Im']), (0, 0))
+        self.assertLess(counts['pairs'], counts['rows'])
+
+        for goid, terms in ncgocr.goid2terms.items():
+            singles = [s for s in self.godata[goid].statements if len(s.evidences) == 1]
+            self.assertEqual(len(terms), len(singles))
+
+    def test_add_gold(self):
+        first = {item for item in self.goldstandard if item[0] != 'doc3'}
+        later = {item for item in self.goldstandard if item[0] == 'doc3'}
+        ncgocr = NCGOCR(self.godata, n=5)
+        ncgocr.train(self.corpus, first, keep_features=True)
+        basic_Ie = ncgocr.basic_Ie
+        rows = ncgocr.training_X.shape[0]
+        doc3 = Corpus('doc3', [s for s in self.corpus if s.docid == 'doc3'])
+        counts = ncgocr.add_gold(later, doc3)
+        self.assertGreater(counts['texts'], 0)
+        doc3_candidates = ncgocr.candidate_recognizer.process(ncgocr.extractor.process(doc3))
+        self.assertEqual(counts['refitted'], rows + len(doc3_candidates))
+        self.assertIs(ncgocr.basic_Ie, basic_Ie)
+
+        full = NCGOCR(self.godata, n=5)
+        full.build(self.goldstandard)
+        self.assertEqual(dict(ncgocr.boost_Ie), dict(full.boost_Ie))
+        self.assertEqual(dict(ncgocr.boost_Im), dict(full.boost_Im))
+        self.assertEqual({k: v for k, v in ncgocr.candidate_recognizer.Im.items() if v},
+                         {k: v for k, v in full.candidate_recognizer.Im.items() if v})
+        self.assertEqual(set(ncgocr.extractor.process(self.corpus)[-1].evidences),
+                         set(full.extractor.process(self.corpus)[-1].evidences))
+
+    def test_memory_budget(self):
+        ncgocr = NCGOCR(self.godata, n=5)
+        ncgocr.train(self.corpus, self.goldstandard)
+        expected = ncgocr.process(self.corpus)
+        candidates = ncgocr.candidate_recognizer.process(ncgocr.extractor.process(self.corpus))
+
+        row_bytes = ncgocr.row_bytes()
+        self.assertEqual(row_bytes, CANDIDATE_BYTES + 12 * ncgocr.vectorizer.n_features)
+        ncgocr.memory_budget = CLASSIFY_BYTES + 3 * row_bytes
+        self.assertEqual(ncgocr.process(self.corpus), expected)
+        stats = ncgocr.memory_stats
+        self.assertEqual(stats['candidates'], len(candidates))
+        self.assertEqual(stats['flushes'], -(-len(candidates) // 3))
+        self.assertLessEqual(stats['peak_bytes'], ncgocr.memory_budget)
+
+        ncgocr.memory_budget = 2**30
+        self.assertEqual(ncgocr.process(self.corpus), expected)
+        self.assertEqual(ncgocr.memory_stats['flushes'], 1)
+
+        ncgocr.memory_budget = CLASSIFY_BYTES + row_bytes
+        self.assertEqual(ncgocr.process(self.corpus), expected)
+        self.assertEqual(ncgocr.memory_stats['flushes'], len(candidates))
+        ncgocr.memory_budget = CLASSIFY_BYTES + row_bytes - 1
+        with self.assertRaises(ValueError):
+            ncgocr.process(self.corpus)
+
+    def test_memory_budget_traced(self):
+        godata, seconds, training, testing = synthetic_data(*SCALES['small'], seed=0)
+        godata.compression(0.5)
+        ncgocr = NCGOCR(godata, n=5)
+        ncgocr.train(*training)
+
+        def traced_bytes():
+            ncgocr.process(testing[0])
+            gc.collect()
+            tracemalloc.start()
+            try:
+                result = ncgocr.process(testing[0])
+                current, peak = tracemalloc.get_traced_memory()
+            finally:
+                tracemalloc.stop()
+            # the results are kept, the rest was taken while processing
+            return peak - current
+
+        unbounded = traced_bytes()
+        for flat_forest in [False, True]:
+            ncgocr.flat_forest = flat_forest
+            for rows in [3, 50]:
+                ncgocr.memory_budget = CLASSIFY_BYTES + rows * ncgocr.row_bytes()
+                self.assertLess(ncgocr.memory_budget, unbounded)
+                self.assertLessEqual(traced_bytes(), ncgocr.memory_budget)
+            ncgocr.memory_budget = None
+
+    def test_longest_match(self):
+        ncgocr = NCGOCR(self.godata, n=5, longest_match=['basic', 'boost'])
+        ncgocr.train(self.corpus, self.goldstandard)
+        plain = NCGOCR(self.godata, n=5)
+        plain.train(self.corpus, self.goldstandard)
+        self.assertNotEqual(ncgocr.fingerprint(), plain.fingerprint())
+
+        for sentence in self.corpus:
+            spans = sorted({(e.start, e.end) for e in ncgocr.e0.findall(sentence, longest=True)})
+            self.assertTrue(all(end <= start for (_, end), (start, _)
+                                in zip(spans, spans[1:])))
+            self.assertLessEqual(set(ncgocr.extractor.findall(sentence)),
+                                 set(plain.extractor.findall(sentence)))
+        result = ncgocr.process(self.corpus)
+        report = evaluate(result, self.goldstandard, 'training')
+        self.assertGreater(report.f1(), 0.5)
+        with self.assertRaises(ValueError):
+            NCGOCR(self.godata, n=5, longest_match=['boost2']).train(self.corpus,
+                                                                      self.goldstandard)
+
+    def test_sampler(self):
+        plain = NCGOCR(self.godata, n=5)
+        plain.train(self.corpus, self.goldstandard)
+        candidates = plain.candidate_recognizer.process(plain.extractor.process(self.corpus))
+
+        sampler = NegativeSampler(ratio=0.3, hard_negatives=True)
+        ncgocr = NCGOCR(self.godata, n=5, sampler=sampler, cascade=Cascade())
+        ncgocr.train(self.corpus, self.goldstandard, keep_features=True)
+        stats = sampler.stats
+        self.assertEqual(stats['candidates'], len(candidates))
+        self.assertLess(stats['sampled'], stats['negatives'])
+        self.assertEqual(ncgocr.training_X.shape[0],
+                         stats['candidates'] - stats['negatives'] + stats['sampled'] + stats['hard'])
+        self.assertEqual(len(ncgocr.training_w), ncgocr.training_X.shape[0])
+        report = evaluate(ncgocr.process(self.corpus), self.goldstandard, 'training')
+        self.assertGreater(report.f1(), 0.5)
+
+    def test_flat_forest(self):
+        ncgocr = NCGOCR(self.godata, n=5, flat_forest=True)
+        ncgocr.train(self.corpus, self.goldstandard)
+        expected = ncgocr.process(self.corpus)
+        engine = ncgocr.engine()
+        self.assertEqual(engine.n_estimators, 5)
+        ncgocr.flat_forest = False
+        self.assertIsNone(ncgocr.engine())
+        self.assertEqual(ncgocr.process(self.corpus), expected)
+
+    def test_reprocess(self):
+        first = {item for item in self.goldstandard if item[0] != 'doc3'}
+        later = {item for item in self.goldstandard if item[0] == 'doc3'}
+        ncgocr = NCGOCR(self.godata, n=5)
+        ncgocr.train(self.corpus, first)
+        previous = ncgocr.process(self.corpus)
+        counts = ncgocr.add_gold(later)
+        self.assertGreater(len(counts['Ie_keys']), 0)
+
+        result = ncgocr.reprocess(self.corpus, previous, counts['Ie_keys'], counts['Im_keys'])
+        self.assertEqual(result, ncgocr.process(self.corpus))
+        stats = ncgocr.reprocess_stats
+        self.assertEqual(stats['documents'], 3)
+        self.assertLess(stats['affected'], 3)
+
+        self.assertEqual(ncgocr.reprocess(self.corpus, previous), previous)
+        self.assertEqual(ncgocr.reprocess_stats['sentences'], 0)
+
+        pattern = next(term for term in ncgocr.candidate_recognizer.Im
+                       if isinstance(term, Pattern))
+        affected = ncgocr.affected_documents(self.corpus, changed_Im=[pattern])
+        self.assertEqual(affected, {sentence.docid for sentence in self.corpus
+                                    if any(e.term == pattern
+                                           for e in ncgocr.e1.findall(sentence))})
+
+    def test_add_gold_without_features(self):
+        first = {item for item in self.goldstandard if item[0] != 'doc3'}
+        ncgocr = NCGOCR(self.godata, n=5)
+        ncgocr.train(self.corpus, first)
+        boost_Ie = {text: set(terms) for text, terms in ncgocr.boost_Ie.items()}
+        boost_Im = {term: set(statements) for term, statements in ncgocr.boost_Im.items()}
+        Im = {term: set(statements) for term, statements in ncgocr.candidate_recognizer.Im.items()}
+        extractor = ncgocr.extractor
+        with self.assertRaises(ValueError):
+            ncgocr.add_gold(self.goldstandard, self.corpus)
+        self.assertEqual(dict(ncgocr.boost_Ie), boost_Ie)
+        self.assertEqual(dict(ncgocr.boost_Im), boost_Im)
+        self.assertEqual(dict(ncgocr.candidate_recognizer.Im), Im)
+        self.assertIs(ncgocr.extractor, extractor)
+        self.assertGreater(len(ncgocr.add_gold(self.goldstandard)['Ie_keys']), 0)
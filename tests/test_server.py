@@ -0,0 +1,148 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from __future__ import (absolute_import, division,
+                        print_function, unicode_literals)
+from builtins import *
+
+"""
+test_server
+----------------------------------
+
+Tests for `server` module.
+"""
+
+import asyncio
+import json
+import unittest
+
+from ncgocr import GoData, NCGOCR
+from ncgocr.server import AnnotationServer
+
+from tests.test_ncgocr import GO_PATH, TEXTS, get_corpus, get_goldstandard
+
+
+async def request(port, method, target, payload=None):
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    body = b'' if payload is None else json.dumps(payload).encode('utf-8')
+    head = '{} {} HTTP/1.1\r\nHost: localhost\r\nConnection: close\r\nContent-Length: {}\r\n\r\n'
+    writer.write(head.format(method, target, len(body)).encode('latin-1') + body)
+    await writer.drain()
+    response = await reader.read()
+    writer.close()
+    head, sep, content = response.partition(b'\r\n\r\n')
+    status = int(head.split(b' ')[1])
+    return status, json.loads(content.decode('utf-8'))
+
+
+async def raw_request(port, data):
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    writer.write(data)
+    await writer.drain()
+    response = await reader.read()
+    writer.close()
+    return int(response.split(b' ')[1]) if response else None
+
+
+class TestServer(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.model = NCGOCR(GoData(GO_PATH), n=5)
+        cls.model.train(get_corpus(), get_goldstandard())
+        expected = dict()
+        for docid, goid, start, end, text in cls.model.process(get_corpus()):
+            expected.setdefault(docid, set()).add((goid, start, end, text))
+        cls.expected = expected
+
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+
+    def tearDown(self):
+        self.loop.close()
+
+    def run_with_server(self, client, **kwargs):
+        async def _run():
+            server = AnnotationServer(self.model, **kwargs)
+            await server.start(port=0)
+            try:
+                return await client(server.port), server
+            finally:
+                await server.close()
+        return self.loop.run_until_complete(_run())
+
+    def test_annotate_batched(self):
+        async def client(port):
+            requests = [request(port, 'POST', '/annotate', {'docid': docid, 'text': text})
+                        for docid, text in TEXTS * 3]
+            return await asyncio.gather(*requests)
+
+        responses, server = self.run_with_server(client, max_batch_size=4, max_wait=0.2)
+        for status, response in responses:
+            self.assertEqual(status, 200)
+            annotations = {tuple(a) for a in response['annotations']}
+            self.assertEqual(annotations, self.expected.get(response['docid'], set()))
+        stats = server.batcher.stats()
+        self.assertEqual(stats['requests'], 9)
+        self.assertLess(stats['batches'], 9)
+        self.assertGreater(stats['latency_p99_ms'], 0)
+
+    def test_stats_and_errors(self):
+        async def client(port):
+            return [await request(port, 'GET', '/stats'),
+                    await request(port, 'POST', '/annotate', {'docid': 'x'}),
+                    await request(port, 'GET', '/annotate'),
+                    await request(port, 'GET', '/nowhere')]
+
+        responses, server = self.run_with_server(client)
+        self.assertEqual([status for status, response in responses], [200, 400, 405, 404])
+        self.assertEqual(responses[0][1]['queue_depth'], 0)
+
+    def test_malformed_requests(self):
+        async def client(port):
+            requests = [b'GARBAGE\r\n\r\n',
+                        b'POST /annotate HTTP/1.1\r\nContent-Length: ten\r\n\r\n',
+                        b'POST /annotate HTTP/1.1\r\nContent-Length: -1\r\n\r\n',
+                        b'POST /annotate HTTP/1.1\r\nContent-Length: 100\r\n\r\n',
+                        b'GET /stats HTTP/1.1\r\nConnection: close\r\n\r\n']
+            return [await raw_request(port, data) for data in requests]
+
+        responses, server = self.run_with_server(client, max_body_size=10)
+        self.assertEqual(responses, [400, 400, 400, 413, 200])
+
+    def test_invalid_in_batch(self):
+        async def client(port):
+            requests = [request(port, 'POST', '/annotate', {'docid': docid, 'text': text})
+                        for docid, text in TEXTS]
+            requests.insert(1, request(port, 'POST', '/annotate', {'docid': 'bad', 'text': 5}))
+            requests.append(request(port, 'POST', '/annotate', None))
+            requests.append(request(port, 'POST', '/annotate', [TEXTS[0][1]]))
+            return await asyncio.gather(*requests)
+
+        responses, server = self.run_with_server(client, max_batch_size=8, max_wait=0.2)
+        self.assertEqual([status for status, response in responses], [200, 400, 200, 200, 400, 400])
+        for status, response in responses:
+            if status == 200:
+                annotations = {tuple(a) for a in response['annotations']}
+                self.assertEqual(annotations, self.expected.get(response['docid'], set()))
+
+    def test_failure_in_batch(self):
+        async def client(port):
+            batcher = server.batcher
+            calls = [batcher.annotate(docid, text) for docid, text in TEXTS]
+            calls.insert(1, batcher.annotate('bad', 5))
+            return await asyncio.gather(*calls, return_exceptions=True)
+
+        async def _run():
+            await server.start(port=0)
+            try:
+                return await client(server.port)
+            finally:
+                await server.close()
+
+        server = AnnotationServer(self.model, max_batch_size=8, max_wait=0.2)
+        results = self.loop.run_until_complete(_run())
+        self.assertIsInstance(results[1], TypeError)
+        for (docid, text), rows in zip(TEXTS, results[:1] + results[2:]):
+            self.assertEqual({tuple(row[1:]) for row in rows}, self.expected.get(docid, set()))
+        self.assertEqual(server.batcher.stats()['batches'], 1)
@@ -0,0 +1,106 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from __future__ import (absolute_import, division,
+                        print_function, unicode_literals)
+from builtins import *
+
+"""
+test_shared
+----------------------------------
+
+Tests for `shared` module.
+"""
+
+import multiprocessing
+import os
+import tempfile
+import unittest
+
+import numpy as np
+
+from ncgocr import GoData, NCGOCR, Entity, Corpus
+from ncgocr.benchmark.suite import SCALES, synthetic_data
+from ncgocr.cli import load_model
+from ncgocr.shared import (StringTable, SharedForest, export_shared, attach_shared,
+                           rss_increase)
+
+from tests.test_ncgocr import GO_PATH, get_corpus, get_goldstandard
+
+
+class TestStringTable(unittest.TestCase):
+
+    def test_find(self):
+        table, ids = StringTable.build(['nucleus', 'cell', 'apoptosis', 'cell', 'ß-cell'])
+        self.assertEqual(len(table), 4)
+        for text, i in ids.items():
+            self.assertEqual(table[i], text)
+            self.assertEqual(table.find(text), i)
+        self.assertEqual(table.find('mitochondrion'), -1)
+        self.assertEqual(table.find(''), -1)
+
+
+class TestShared(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.godata = GoData(GO_PATH)
+        cls.corpus = get_corpus()
+        cls.model = NCGOCR(cls.godata, n=5)
+        cls.model.train(cls.corpus, get_goldstandard())
+        cls.tmpdir = tempfile.TemporaryDirectory()
+        cls.directory = os.path.join(cls.tmpdir.name, 'shared')
+        export_shared(cls.model, cls.directory)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.tmpdir.cleanup()
+
+    def setUp(self):
+        self.shared = attach_shared(self.directory)
+
+    def test_process(self):
+        self.assertEqual(self.shared.process(self.corpus), self.model.process(self.corpus))
+
+    def test_indexes(self):
+        model, shared = self.model, self.shared
+        self.assertEqual({k: set(v) for k, v in shared.basic_Ie.items()},
+                         {k: v for k, v in model.basic_Ie.items() if v})
+        Im = model.candidate_recognizer.Im
+        self.assertEqual({k: {s.statid for s in v}
+                          for k, v in shared.candidate_recognizer.Im.items()},
+                         {k: {s.statid for s in v} for k, v in Im.items() if v})
+        self.assertEqual(shared.candidate_recognizer.Im[Entity('no such term', 'x')], frozenset())
+        self.assertEqual(shared.godata['GO:0005634'].namespace,
+                         self.godata['GO:0005634'].namespace)
+
+    def test_forest(self):
+        model = self.model
+        candidates = model.candidate_recognizer.process(model.extractor.process(self.corpus))
+        X = model.featurize(candidates)
+        forest = SharedForest(SharedForest.export(model.classifier))
+        self.assertTrue(np.allclose(forest.predict_proba(X), model.classifier.predict_proba(X)))
+        self.assertTrue((forest.predict(X) == model.classifier.predict(X)).all())
+        self.assertTrue(isinstance(self.shared.classifier.feature, np.memmap))
+
+    def test_load_model(self):
+        self.assertIsInstance(load_model(self.directory).classifier, SharedForest)
+
+    @unittest.skipUnless(os.path.exists('/proc/self/status') and
+                         'fork' in multiprocessing.get_all_start_methods(),
+                         'requires /proc and fork')
+    def test_rss_increase(self):
+        godata, seconds, training, testing = synthetic_data(*SCALES['small'])
+        model = NCGOCR(godata, n=5)
+        model.train(*training)
+        directory = os.path.join(self.tmpdir.name, 'small')
+        export_shared(model, directory)
+        corpus = Corpus('testing', testing[0][:40])
+        unshared, _ = rss_increase(attach_shared, directory, corpus)
+        inherited, _ = rss_increase(attach_shared, directory, corpus, inherit=True)
+        # a worker forked with the model does not build its automata again
+        self.assertLess(inherited, unshared / 4)
+
+if __name__ == '__main__':
+    import sys
+    sys.exit(unittest.main())
@@ -0,0 +1,97 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from __future__ import (absolute_import, division,
+                        print_function, unicode_literals)
+from builtins import *
+
+"""
+test_sweep
+----------------------------------
+
+Tests for `sweep` module.
+"""
+
+import unittest
+
+from ncgocr import GoData
+from ncgocr.backends import LogisticBackend
+from ncgocr.learning import NegativeSampler
+from ncgocr.sweep import grid, document_folds, sweep
+
+from tests.test_ncgocr import GO_PATH, get_corpus, get_goldstandard
+
+
+class CountingBackend(LogisticBackend):
+    n_values = []
+
+    def classifier(self, n):
+        CountingBackend.n_values.append(n)
+        return super(CountingBackend, self).classifier(n)
+
+
+class TestSweep(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.godata = GoData(GO_PATH)
+
+    def setUp(self):
+        self.corpus = get_corpus()
+        self.goldstandard = get_goldstandard()
+
+    def test_grid(self):
+        configs = grid(n=[5, 10], use_boost=[True, False])
+        self.assertEqual(len(configs), 4)
+        self.assertEqual({c['n_features'] for c in configs}, {1024})
+        with self.assertRaises(KeyError):
+            grid(depth=[1])
+
+    def test_document_folds(self):
+        folds = document_folds(self.corpus, self.goldstandard, k=3, seed=1)
+        self.assertEqual(len(folds), 3)
+        for fold in folds:
+            testing_docs = fold.testing_corpus.doc_set()
+            self.assertEqual(len(testing_docs), 1)
+            self.assertFalse(testing_docs & fold.training_corpus.doc_set())
+            self.assertEqual({item[0] for item in fold.testing_gold}, testing_docs)
+            self.assertEqual(len(fold.training_gold) + len(fold.testing_gold),
+                             len(self.goldstandard))
+        with self.assertRaises(ValueError):
+            document_folds(self.corpus, self.goldstandard, k=4)
+
+        goldstandard = set(self.goldstandard) | {('no_such_doc', 'GO:0000001', 0, 4, 'text')}
+        for fold in document_folds(self.corpus, goldstandard, k=3, seed=1):
+            self.assertEqual(len(fold.training_gold) + len(fold.testing_gold),
+                             len(self.goldstandard))
+
+    def test_sweep(self):
+        configs = grid(n=[3, 5], n_features=[256, 1024])
+        results = sweep(self.godata, self.corpus, self.goldstandard, configs,
+                        k=3, processes=1)
+        self.assertEqual(len(results), 4)
+        for result in results:
+            self.assertEqual(len(result.fold_reports), 3)
+            gold_count = len(result.report.tp) + len(result.report.fn)
+            self.assertEqual(gold_count, len(self.goldstandard))
+        scores = [result.report.f1() for result in results]
+        self.assertEqual(scores, sorted(scores, reverse=True))
+
+    def test_sweep_pool(self):
+        configs = grid(use_boost=[True, False])
+        serial = sweep(self.godata, self.corpus, self.goldstandard, configs,
+                       k=3, processes=1)
+        parallel = sweep(self.godata, self.corpus, self.goldstandard, configs,
+                         k=3, processes=2)
+        self.assertEqual(sorted(r.report.f1() for r in serial),
+                         sorted(r.report.f1() for r in parallel))
+
+    def test_sweep_options(self):
+        sampler = NegativeSampler(ratio=0.5)
+        results = sweep(self.godata, self.corpus, self.goldstandard, grid(n=[3, 5]),
+                        k=3, processes=1, backend=CountingBackend(), sampler=sampler)
+        self.assertEqual(len(results), 2)
+        # one model extracts per fold, then one per config is trained
+        self.assertEqual(sorted(CountingBackend.n_values), [3] * 3 + [5] * 3 + [10] * 3)
+        # the sampler of every model is a copy
+        self.assertEqual(sampler.stats, {})